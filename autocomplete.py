@@ -0,0 +1,61 @@
+# autocomplete.py
+import heapq
+from bisect import bisect_left
+
+
+class AutocompleteIndex:
+    """Sorted prefix index over names, ranked by usage.
+
+    Names are kept sorted by their lowercase form, so the names starting with
+    the typed text are one contiguous slice found by binary search. Matches are
+    ranked by usage count (how often the name was prescribed), then
+    alphabetically. When few names start with the text, names that merely
+    contain it are added after them.
+    """
+
+    def __init__(self, names=()):
+        self._keys = sorted((name.lower(), name) for name in set(names) if name)
+        self.usage = {}  # name -> count
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, name):
+        if not name:
+            return
+        key = (name.lower(), name)
+        position = bisect_left(self._keys, key)
+        if position == len(self._keys) or self._keys[position] != key:
+            self._keys.insert(position, key)
+
+    def remove(self, name):
+        if not name:
+            return
+        key = (name.lower(), name)
+        position = bisect_left(self._keys, key)
+        if position < len(self._keys) and self._keys[position] == key:
+            del self._keys[position]
+
+    def set_usage(self, usage):
+        self.usage = dict(usage)
+
+    def complete(self, text, limit=30):
+        """Return up to limit names for the typed text, most used first"""
+        text = text.strip().lower()
+        rank = lambda key: (-self.usage.get(key[1], 0), key[0])
+
+        if not text:
+            return [name for _, name in heapq.nsmallest(limit, self._keys, key=rank)]
+
+        # First priority: the contiguous run of names starting with the text
+        start = bisect_left(self._keys, (text,))
+        end = start
+        while end < len(self._keys) and self._keys[end][0].startswith(text):
+            end += 1
+        matches = [name for _, name in heapq.nsmallest(limit, self._keys[start:end], key=rank)]
+
+        # Second priority: names containing the text (if few starting matches)
+        if len(matches) < 5:
+            contains = [key for key in self._keys[:start] + self._keys[end:] if text in key[0]]
+            matches += [name for _, name in heapq.nsmallest(limit - len(matches), contains, key=rank)]
+        return matches
@@ -0,0 +1,104 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def run_in_background(widget, work, on_done=None, on_error=None, poll_ms=50):
+    """Run work() on a worker thread and hand the result back to the Tk thread.
+
+    Tk is not thread safe, so the worker must never touch widgets. The result
+    (or the exception) is delivered to on_done / on_error from widget.after.
+    """
+    outcome = {}
+
+    def worker():
+        try:
+            outcome["result"] = work()
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+
+    def poll():
+        if thread.is_alive():
+            widget.after(poll_ms, poll)
+            return
+        if "error" in outcome:
+            if on_error:
+                on_error(outcome["error"])
+            else:
+                print(f"Background task failed: {outcome['error']}")
+        elif on_done:
+            on_done(outcome.get("result"))
+
+    widget.after(poll_ms, poll)
+    return thread
+
+
+class WorkerPool:
+    """A few worker threads whose results are handed back to the Tk thread.
+
+    submit() queues work() and returns at once; on_done / on_error are called
+    from widget.after when it finishes, like run_in_background. cancel() drops
+    the queued jobs and stops delivering results, so a window can call it as
+    it closes and no callback touches its destroyed widgets.
+    """
+
+    def __init__(self, widget, max_workers=None, poll_ms=50):
+        self.widget = widget
+        self.poll_ms = poll_ms
+        self.cancelled = False
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or min(4, os.cpu_count() or 1))
+        self._pending = []  # (future, on_done, on_error)
+        self._polling = False
+
+    def submit(self, work, on_done=None, on_error=None):
+        if self.cancelled:
+            return None
+        future = self._executor.submit(work)
+        self._pending.append((future, on_done, on_error))
+        if not self._polling:
+            self._polling = True
+            self.widget.after(self.poll_ms, self._poll)
+        return future
+
+    def pending(self):
+        return len(self._pending)
+
+    def _poll(self):
+        if self.cancelled:
+            return
+        jobs, self._pending, finished = self._pending, [], []
+        for job in jobs:
+            (finished if job[0].done() else self._pending).append(job)
+        try:
+            for future, on_done, on_error in finished:
+                if self.cancelled:
+                    return
+                self._deliver(future, on_done, on_error)
+        finally:
+            if self._pending and not self.cancelled:
+                self.widget.after(self.poll_ms, self._poll)
+            else:
+                self._polling = False
+
+    def _deliver(self, future, on_done, on_error):
+        """Hand one result to its callback; a failing callback does not stop the others"""
+        try:
+            error = future.exception()
+            if error is not None:
+                if on_error:
+                    on_error(error)
+                else:
+                    print(f"Background task failed: {error}")
+            elif on_done:
+                on_done(future.result())
+        except Exception as e:
+            print(f"Background task callback failed: {e}")
+
+    def cancel(self):
+        """Drop queued jobs; a job already running finishes but is not delivered"""
+        self.cancelled = True
+        self._pending = []
+        self._executor.shutdown(wait=False, cancel_futures=True)
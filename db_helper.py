@@ -1,10 +1,33 @@
+import re
 import sqlite3
 from datetime import datetime
+from records import (Patient, PatientName, Checkup, Prescription, Medicine, QueueEntry, Visit,
+                     Icd10Code, StockLevel, StockEntry, RecallHit, row_factory)
+
+# The medicine a prescription row is linked to: its brand and generic ignoring
+# case, else the only product of its brand; NULL when that would be a guess
+MEDICINE_LINK = """COALESCE(
+    (SELECT CASE WHEN COUNT(*) = 1 THEN MIN(m.id) END FROM medicine m
+     WHERE m.brand = {row}.brand COLLATE NOCASE AND m.generic = {row}.generic COLLATE NOCASE),
+    (SELECT CASE WHEN COUNT(*) = 1 THEN MIN(m.id) END FROM medicine m
+     WHERE m.brand = {row}.brand COLLATE NOCASE))"""
+
+def escape_like(text):
+    """Escape LIKE wildcards so text matches literally (use with ESCAPE '\\')"""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
 
 class DatabaseHelper:
+    # Database files whose tables and indexes were already checked by this process
+    _prepared_paths = set()
+    # Database files that have the ICD-10 full-text index (needs FTS5)
+    _fts_paths = set()
+
     def __init__(self, db_path='Login.db'):
         self.db_path = db_path
-        self.create_tables()
+        if db_path not in DatabaseHelper._prepared_paths:
+            self.create_tables()
+            self.upgrade_schema()
+            DatabaseHelper._prepared_paths.add(db_path)
 
     def create_tables(self):
         conn = self.get_connection()
@@ -44,6 +67,299 @@ class DatabaseHelper:
             print(f"Database error in create_tables: {e}")
         finally:
             conn.close()
+
+    def upgrade_schema(self):
+        """Create the indexes (and later additions) the lookups below rely on"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            # Patient name lookups: NOCASE for prefix LIKE searches, BINARY for exact matches
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_patients_name_nocase ON Patients(name COLLATE NOCASE)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_patients_name ON Patients(name)")
+            
+            # Older databases lack the quantity and administration columns
+            cursor.execute("PRAGMA table_info(medicine)")
+            column_names = [col[1] for col in cursor.fetchall()]
+            if 'quantity' not in column_names:
+                cursor.execute("ALTER TABLE medicine ADD COLUMN quantity TEXT DEFAULT ''")
+            if 'administration' not in column_names:
+                cursor.execute("ALTER TABLE medicine ADD COLUMN administration TEXT DEFAULT ''")
+            
+            # Change log for the medicine catalog cache: every write to the medicine
+            # table appends the medicine id, and the newest row id is the catalog version
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS MedicineChanges (
+                    version INTEGER PRIMARY KEY AUTOINCREMENT,
+                    medicine_id INTEGER
+                )
+            """)
+            for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_medicine_{event.lower()}
+                    AFTER {event} ON medicine
+                    BEGIN
+                        INSERT INTO MedicineChanges (medicine_id) VALUES ({row}.id);
+                    END
+                """)
+            
+            # ICD-10 catalog, searched by code prefix or by words of the description
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS Icd10Codes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    code TEXT NOT NULL UNIQUE,
+                    description TEXT NOT NULL
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_icd10_code_nocase ON Icd10Codes(code COLLATE NOCASE)")
+            
+            # Coded diagnoses per checkup; (code, checkup_id) serves the per-code reports
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS CheckupDiagnosisCodes (
+                    checkup_id INTEGER NOT NULL,
+                    code TEXT NOT NULL,
+                    PRIMARY KEY (checkup_id, code),
+                    FOREIGN KEY (checkup_id) REFERENCES Checkups(id)
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_diagnosis_codes_code ON CheckupDiagnosisCodes(code, checkup_id)")
+            
+            # Stock: an append-only ledger of receipts, dispenses and corrections, and
+            # the running total per medicine, which a trigger updates in the same
+            # transaction as every ledger row
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS StockLedger (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    medicine_id INTEGER NOT NULL,
+                    change INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    reference TEXT,
+                    note TEXT,
+                    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (medicine_id) REFERENCES medicine(id)
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_stock_ledger_medicine ON StockLedger(medicine_id, id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_stock_ledger_reference ON StockLedger(reference)")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS MedicineStock (
+                    medicine_id INTEGER PRIMARY KEY,
+                    on_hand INTEGER NOT NULL DEFAULT 0,
+                    reorder_level INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_medicine_stock_shortfall ON MedicineStock(on_hand - reorder_level)")
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_stock_ledger_insert
+                AFTER INSERT ON StockLedger
+                BEGIN
+                    INSERT INTO MedicineStock (medicine_id, on_hand, updated_at)
+                    VALUES (NEW.medicine_id, NEW.change, NEW.created_at)
+                    ON CONFLICT (medicine_id) DO UPDATE
+                    SET on_hand = on_hand + NEW.change, updated_at = NEW.created_at;
+                END
+            """)
+            
+            # Prescriptions point at the medicine they were written for, and carry the
+            # plain visit day, so recall searches are index range reads. A row links to
+            # the product with its brand and generic (ignoring case), or to the only
+            # product with its brand; it stays unlinked rather than guess between two.
+            cursor.execute("PRAGMA table_info(Prescriptions)")
+            prescription_columns = [col[1] for col in cursor.fetchall()]
+            if 'medicine_id' not in prescription_columns:
+                cursor.execute("ALTER TABLE Prescriptions ADD COLUMN medicine_id INTEGER")
+                cursor.execute("ALTER TABLE Prescriptions ADD COLUMN visit_day TEXT")
+                cursor.execute("UPDATE Prescriptions SET visit_day = DATE(last_checkup_date)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_prescriptions_medicine_day ON Prescriptions(medicine_id, visit_day)")
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_prescriptions_unlinked
+                ON Prescriptions(brand COLLATE NOCASE) WHERE medicine_id IS NULL
+            """)
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_prescriptions_link_medicine'")
+            if not cursor.fetchone():
+                # Rows the earlier exact-match rule left unlinked, or gave the first
+                # product of a brand several products share, are linked again
+                cursor.execute("DROP TRIGGER IF EXISTS trg_prescriptions_link")
+                cursor.execute(f"""
+                    UPDATE Prescriptions SET medicine_id = {MEDICINE_LINK.format(row="Prescriptions")}
+                    WHERE medicine_id IS NULL OR medicine_id IN (
+                        SELECT m.id FROM medicine m
+                        WHERE m.brand = Prescriptions.brand AND m.generic != Prescriptions.generic
+                          AND (SELECT COUNT(*) FROM medicine other WHERE other.brand = m.brand) > 1)
+                """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_prescriptions_link_medicine
+                AFTER INSERT ON Prescriptions
+                WHEN NEW.medicine_id IS NULL OR NEW.visit_day IS NULL
+                BEGIN
+                    UPDATE Prescriptions
+                    SET medicine_id = COALESCE(NEW.medicine_id, {MEDICINE_LINK.format(row="NEW")}),
+                        visit_day = COALESCE(NEW.visit_day, DATE(NEW.last_checkup_date))
+                    WHERE id = NEW.id;
+                END
+            """)
+            # Rows written for a brand added to (or renamed in) the catalog later
+            for event in ("INSERT", "UPDATE OF brand, generic"):
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_medicine_link_{event.split()[0].lower()}
+                    AFTER {event} ON medicine
+                    BEGIN
+                        UPDATE Prescriptions
+                        SET medicine_id = {MEDICINE_LINK.format(row="Prescriptions")}
+                        WHERE medicine_id IS NULL AND brand = NEW.brand COLLATE NOCASE;
+                    END
+                """)
+            
+            # Lab images point at content-addressed files (see image_store.py) by their
+            # SHA-256; ImageBlobs counts the rows using each file, kept by triggers
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS LabImages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    patient_id INTEGER,
+                    checkup_id INTEGER,
+                    file_path TEXT,
+                    upload_date TEXT,
+                    sha256 TEXT,
+                    dhash TEXT,
+                    FOREIGN KEY (patient_id) REFERENCES Patients(id),
+                    FOREIGN KEY (checkup_id) REFERENCES Checkups(id)
+                )
+            """)
+            cursor.execute("PRAGMA table_info(LabImages)")
+            lab_image_columns = [col[1] for col in cursor.fetchall()]
+            if 'sha256' not in lab_image_columns:
+                cursor.execute("ALTER TABLE LabImages ADD COLUMN sha256 TEXT")
+            # Perceptual hash (hex dHash, see perceptual_hash.py) for near-duplicate checks
+            if 'dhash' not in lab_image_columns:
+                cursor.execute("ALTER TABLE LabImages ADD COLUMN dhash TEXT")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_lab_images_patient ON LabImages(patient_id, sha256)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_lab_images_sha256 ON LabImages(sha256)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_lab_images_file_path ON LabImages(file_path)")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS ImageBlobs (
+                    sha256 TEXT PRIMARY KEY,
+                    file_path TEXT NOT NULL,
+                    size INTEGER,
+                    ref_count INTEGER NOT NULL DEFAULT 0,
+                    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                    original_size INTEGER,
+                    original_path TEXT,
+                    pixels INTEGER,
+                    original_pixels INTEGER
+                )
+            """)
+            # What transcoding on import saved: bytes on disk and pixels to decode
+            cursor.execute("PRAGMA table_info(ImageBlobs)")
+            blob_columns = [col[1] for col in cursor.fetchall()]
+            for column, column_type in (("original_size", "INTEGER"), ("original_path", "TEXT"),
+                                        ("pixels", "INTEGER"), ("original_pixels", "INTEGER")):
+                if column not in blob_columns:
+                    cursor.execute(f"ALTER TABLE ImageBlobs ADD COLUMN {column} {column_type}")
+            blob_add = "UPDATE ImageBlobs SET ref_count = ref_count + 1 WHERE sha256 = NEW.sha256;"
+            blob_remove = "UPDATE ImageBlobs SET ref_count = ref_count - 1 WHERE sha256 = OLD.sha256;"
+            triggers = {
+                "INSERT": blob_add,
+                "DELETE": blob_remove,
+                "UPDATE OF sha256": blob_remove + blob_add,
+            }
+            for event, body in triggers.items():
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_lab_images_blob_{event.split()[0].lower()}
+                    AFTER {event} ON LabImages
+                    BEGIN
+                        {body}
+                    END
+                """)
+            
+            # Medicine picker: paged by brand, filtered by brand or generic prefix
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_medicine_brand_nocase ON medicine(brand COLLATE NOCASE)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_medicine_generic_nocase ON medicine(generic COLLATE NOCASE)")
+            
+            # How often each brand and generic was prescribed, for ranking autocomplete.
+            # Seeded once from the existing prescriptions, then kept current by triggers.
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'MedicineUsage'")
+            if not cursor.fetchone():
+                cursor.execute("""
+                    CREATE TABLE MedicineUsage (
+                        kind TEXT NOT NULL,
+                        name TEXT NOT NULL,
+                        uses INTEGER NOT NULL DEFAULT 0,
+                        PRIMARY KEY (kind, name)
+                    )
+                """)
+                for kind in ("brand", "generic"):
+                    cursor.execute(f"""
+                        INSERT INTO MedicineUsage (kind, name, uses)
+                        SELECT '{kind}', {kind}, COUNT(*) FROM Prescriptions
+                        WHERE {kind} IS NOT NULL AND {kind} != ''
+                        GROUP BY {kind}
+                    """)
+            usage_add = """
+                INSERT INTO MedicineUsage (kind, name, uses)
+                SELECT '{kind}', NEW.{kind}, 1 WHERE NEW.{kind} IS NOT NULL AND NEW.{kind} != ''
+                ON CONFLICT (kind, name) DO UPDATE SET uses = uses + 1;
+            """
+            usage_remove = """
+                UPDATE MedicineUsage SET uses = uses - 1 WHERE kind = '{kind}' AND name = OLD.{kind};
+            """
+            triggers = {
+                "INSERT": usage_add,
+                "DELETE": usage_remove,
+                "UPDATE OF brand, generic": usage_remove + usage_add,
+            }
+            for event, body in triggers.items():
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_prescriptions_usage_{event.split()[0].lower()}
+                    AFTER {event} ON Prescriptions
+                    BEGIN
+                        {body.format(kind="brand")}
+                        {body.format(kind="generic")}
+                    END
+                """)
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Database error in upgrade_schema: {e}")
+            conn.rollback()
+        finally:
+            conn.close()
+        self.create_icd10_search()
+    
+    def create_icd10_search(self):
+        """Full-text index over the ICD-10 descriptions, if this SQLite has FTS5"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS Icd10Search
+                USING fts5(code, description, content='Icd10Codes', content_rowid='id')
+            """)
+            # Keep the external-content index in step with Icd10Codes
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_icd10_insert AFTER INSERT ON Icd10Codes BEGIN
+                    INSERT INTO Icd10Search (rowid, code, description) VALUES (NEW.id, NEW.code, NEW.description);
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_icd10_delete AFTER DELETE ON Icd10Codes BEGIN
+                    INSERT INTO Icd10Search (Icd10Search, rowid, code, description)
+                    VALUES ('delete', OLD.id, OLD.code, OLD.description);
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_icd10_update AFTER UPDATE ON Icd10Codes BEGIN
+                    INSERT INTO Icd10Search (Icd10Search, rowid, code, description)
+                    VALUES ('delete', OLD.id, OLD.code, OLD.description);
+                    INSERT INTO Icd10Search (rowid, code, description) VALUES (NEW.id, NEW.code, NEW.description);
+                END
+            """)
+            conn.commit()
+            DatabaseHelper._fts_paths.add(self.db_path)
+        except sqlite3.OperationalError as e:
+            # No FTS5 in this SQLite build; search_icd10 falls back to LIKE
+            print(f"ICD-10 full-text search unavailable: {e}")
+            conn.rollback()
+        finally:
+            conn.close()
         
     def update_queue_status(self, queue_id, status):
         """Update a queue entry's status (waiting/completed/cancelled)"""
@@ -64,6 +380,7 @@ class DatabaseHelper:
         """Get all patients in today's queue"""
         conn = self.get_connection()
         cursor = conn.cursor()
+        cursor.row_factory = row_factory(QueueEntry)
         try:
             today = datetime.now().strftime('%Y-%m-%d')
             cursor.execute('''
@@ -101,25 +418,136 @@ class DatabaseHelper:
     def get_medicines(self):
         conn = self.get_connection()
         cursor = conn.cursor()
+        cursor.row_factory = row_factory(Medicine)
         try:
-            # Check if the quantity and administration columns exist
-            cursor.execute("PRAGMA table_info(medicine)")
-            columns = cursor.fetchall()
-            column_names = [col[1] for col in columns]
-            
-            # If columns don't exist, alter the table to add them
-            if 'quantity' not in column_names:
-                cursor.execute("ALTER TABLE medicine ADD COLUMN quantity TEXT DEFAULT ''")
-            if 'administration' not in column_names:
-                cursor.execute("ALTER TABLE medicine ADD COLUMN administration TEXT DEFAULT ''")
-            
-            # Get all medicine data including new fields
+            # The quantity and administration columns are added by upgrade_schema
+            cursor.execute("SELECT id, brand, generic, quantity, administration FROM medicine")
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Database error in get_medicines: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def get_medicine_snapshot(self):
+        """Get (catalog version, all medicines) read in one transaction"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            cursor.execute("SELECT COALESCE(MAX(version), 0) FROM MedicineChanges")
+            version = cursor.fetchone()[0]
+            cursor.row_factory = row_factory(Medicine)
             cursor.execute("SELECT id, brand, generic, quantity, administration FROM medicine")
             medicines = cursor.fetchall()
             conn.commit()
-            return medicines
+            return version, medicines
         except sqlite3.Error as e:
-            print(f"Database error in get_medicines: {e}")
+            print(f"Database error in get_medicine_snapshot: {e}")
+            return None, []
+        finally:
+            conn.close()
+
+    def get_medicine_catalog_version(self):
+        """Get the current medicine catalog version (newest change log entry)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT COALESCE(MAX(version), 0) FROM MedicineChanges")
+            return cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return None
+        finally:
+            conn.close()
+
+    def get_medicine_changes(self, since_version):
+        """Get (catalog version, changed medicines, ids of deleted medicines) since a version"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            cursor.execute("""
+                SELECT version, medicine_id FROM MedicineChanges
+                WHERE version > ? ORDER BY version
+            """, (since_version,))
+            changes = cursor.fetchall()
+            if not changes:
+                conn.commit()
+                return since_version, [], []
+            
+            changed_ids = sorted(set(medicine_id for _, medicine_id in changes))
+            placeholders = ",".join("?" * len(changed_ids))
+            cursor.row_factory = row_factory(Medicine)
+            cursor.execute(f"""
+                SELECT id, brand, generic, quantity, administration FROM medicine
+                WHERE id IN ({placeholders})
+            """, changed_ids)
+            medicines = cursor.fetchall()
+            conn.commit()
+            
+            found = set(med.id for med in medicines)
+            deleted_ids = [medicine_id for medicine_id in changed_ids if medicine_id not in found]
+            return changes[-1][0], medicines, deleted_ids
+        except sqlite3.Error as e:
+            print(f"Database error in get_medicine_changes: {e}")
+            return since_version, [], []
+        finally:
+            conn.close()
+
+    def get_medicine_usage(self):
+        """Return {'brand': {name: uses}, 'generic': {name: uses}}"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        usage = {"brand": {}, "generic": {}}
+        try:
+            cursor.execute("SELECT kind, name, uses FROM MedicineUsage WHERE uses > 0")
+            for kind, name, uses in cursor.fetchall():
+                usage.setdefault(kind, {})[name] = uses
+        except sqlite3.Error as e:
+            print(f"Database error in get_medicine_usage: {e}")
+        finally:
+            conn.close()
+        return usage
+
+    def _medicine_filter(self, text):
+        """WHERE clause and parameters for a brand/generic prefix filter"""
+        text = (text or "").strip()
+        if not text:
+            return "", ()
+        pattern = escape_like(text) + "%"
+        return "WHERE brand LIKE ? ESCAPE '\\' OR generic LIKE ? ESCAPE '\\'", (pattern, pattern)
+
+    def count_medicines(self, text=""):
+        """Count medicines whose brand or generic name starts with text"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            where, params = self._medicine_filter(text)
+            cursor.execute(f"SELECT COUNT(*) FROM medicine {where}", params)
+            return cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Database error in count_medicines: {e}")
+            return 0
+        finally:
+            conn.close()
+
+    def get_medicines_page(self, text="", offset=0, limit=100):
+        """Get one page of medicines ordered by brand, optionally filtered by prefix"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.row_factory = row_factory(Medicine)
+        try:
+            where, params = self._medicine_filter(text)
+            cursor.execute(f"""
+                SELECT id, brand, generic, quantity, administration
+                FROM medicine {where}
+                ORDER BY brand COLLATE NOCASE, id
+                LIMIT ? OFFSET ?
+            """, params + (limit, offset))
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Database error in get_medicines_page: {e}")
             return []
         finally:
             conn.close()
@@ -228,16 +656,75 @@ class DatabaseHelper:
     def get_patients(self):
         conn = self.get_connection()
         cursor = conn.cursor()
+        cursor.row_factory = row_factory(PatientName)
         cursor.execute("SELECT id, name FROM Patients ORDER BY name")
         patients = cursor.fetchall()
         conn.close()
         return patients
 
+    def search_patients(self, text, limit=20):
+        """Return up to limit PatientName rows matching text, names starting with it first"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.row_factory = row_factory(PatientName)
+        try:
+            text = text.strip()
+            if not text:
+                cursor.execute("""
+                    SELECT id, name FROM Patients
+                    ORDER BY name COLLATE NOCASE LIMIT ?
+                """, (limit,))
+                return cursor.fetchall()
+            
+            pattern = escape_like(text)
+            
+            # First priority: names that start with the typed text (uses the NOCASE index)
+            cursor.execute("""
+                SELECT id, name FROM Patients
+                WHERE name LIKE ? ESCAPE '\\'
+                ORDER BY name COLLATE NOCASE LIMIT ?
+            """, (pattern + "%", limit))
+            matches = cursor.fetchall()
+            
+            # Second priority: names containing the typed text (if few starting matches)
+            if len(matches) < 5:
+                cursor.execute("""
+                    SELECT id, name FROM Patients
+                    WHERE name LIKE ? ESCAPE '\\' AND name NOT LIKE ? ESCAPE '\\'
+                    ORDER BY name COLLATE NOCASE LIMIT ?
+                """, ("%" + pattern + "%", pattern + "%", limit - len(matches)))
+                matches += cursor.fetchall()
+            
+            matches.sort(key=lambda row: row.name.lower())
+            return matches
+        except sqlite3.Error as e:
+            print(f"Database error in search_patients: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def get_patient_id(self, name):
+        """Resolve a patient name to its id, or None if there is no such patient"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT id FROM Patients WHERE name = ? LIMIT 1", (name,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return None
+        finally:
+            conn.close()
+
     def get_patient_details(self, patient_id):
         conn = self.get_connection()
         cursor = conn.cursor()
+        cursor.row_factory = row_factory(Patient)
         cursor.execute("""
-            SELECT * FROM Patients 
+            SELECT id, name, address, birthdate, cell, civil_status,
+                   occupation, referred, gender, phone
+            FROM Patients 
             WHERE id = ?
         """, (patient_id,))
         patient = cursor.fetchone()
@@ -289,8 +776,11 @@ class DatabaseHelper:
     def get_patient_by_name(self, name):
         conn = self.get_connection()
         cursor = conn.cursor()
+        cursor.row_factory = row_factory(Patient)
         cursor.execute("""
-            SELECT * FROM Patients 
+            SELECT id, name, address, birthdate, cell, civil_status,
+                   occupation, referred, gender, phone
+            FROM Patients 
             WHERE name = ?
         """, (name,))
         patient = cursor.fetchone()
@@ -384,7 +874,16 @@ class DatabaseHelper:
                 WHERE patient_id = ?
             """, (patient_id,))
             
-            # Delete checkups for the patient
+            # Delete the lab image rows; the files are removed once no one else uses
+            # them (see image_reconcile.release_files)
+            cursor.execute("DELETE FROM LabImages WHERE patient_id = ?", (patient_id,))
+            cursor.execute("DELETE FROM ImageBlobs WHERE ref_count <= 0")
+            
+            # Delete the diagnosis codes and the checkups for the patient
+            cursor.execute("""
+                DELETE FROM CheckupDiagnosisCodes 
+                WHERE checkup_id IN (SELECT id FROM Checkups WHERE patient_id = ?)
+            """, (patient_id,))
             cursor.execute("""
                 DELETE FROM Checkups 
                 WHERE patient_id = ?
@@ -407,10 +906,476 @@ class DatabaseHelper:
         finally:
             conn.close()
 
+    def get_visit_history(self):
+        """Return every visit as a Visit: its findings and the prescriptions saved with it.
+
+        Prescriptions are tied to their checkup by patient and visit date, the same
+        way the rest of the application pairs them.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        visits = {}
+        try:
+            cursor.execute("""
+                SELECT patient_id, DATE(last_checkup_date), findings
+                FROM Checkups
+                ORDER BY id
+            """)
+            for patient_id, visit_date, findings in cursor:
+                visits[(patient_id, visit_date)] = Visit(patient_id, visit_date, (findings or "").strip(), [])
+            
+            cursor.execute("""
+                SELECT patient_id, DATE(last_checkup_date), brand, generic, quantity, administration
+                FROM Prescriptions
+                ORDER BY id
+            """)
+            for patient_id, visit_date, brand, generic, quantity, administration in cursor:
+                visit = visits.get((patient_id, visit_date))
+                if visit is None:
+                    visit = visits[(patient_id, visit_date)] = Visit(patient_id, visit_date, "", [])
+                visit.prescriptions.append(Prescription(brand, generic, quantity, administration))
+        except sqlite3.Error as e:
+            print(f"Database error in get_visit_history: {e}")
+        finally:
+            conn.close()
+        return [visit._replace(prescriptions=tuple(visit.prescriptions)) for visit in visits.values()]
+
+    def import_icd10_codes(self, codes):
+        """Insert or update (code, description) pairs in one transaction; returns the count"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.executemany("""
+                INSERT INTO Icd10Codes (code, description) VALUES (?, ?)
+                ON CONFLICT (code) DO UPDATE SET description = excluded.description
+                WHERE description != excluded.description
+            """, codes)
+            conn.commit()
+            cursor.execute("SELECT COUNT(*) FROM Icd10Codes")
+            return cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Database error in import_icd10_codes: {e}")
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def count_icd10_codes(self):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT COUNT(*) FROM Icd10Codes")
+            return cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Database error in count_icd10_codes: {e}")
+            return 0
+        finally:
+            conn.close()
+
+    def search_icd10(self, text, limit=20):
+        """Return Icd10Code rows by code prefix (e.g. 'J45') or by description words"""
+        text = text.strip()
+        if not text:
+            return []
+        conn = self.get_connection()
+        conn.row_factory = row_factory(Icd10Code)
+        cursor = conn.cursor()
+        try:
+            if re.match(r"^[A-Za-z][0-9]", text) and " " not in text:
+                # Codes are stored dotted (J45.9); accept them typed without the dot too
+                code = text.upper()
+                if len(code) > 3 and "." not in code:
+                    code = code[:3] + "." + code[3:]
+                cursor.execute("""
+                    SELECT code, description FROM Icd10Codes
+                    WHERE code LIKE ? ESCAPE '\\'
+                    ORDER BY code COLLATE NOCASE
+                    LIMIT ?
+                """, (escape_like(code) + "%", limit))
+            elif self.db_path in DatabaseHelper._fts_paths:
+                words = re.findall(r"\w+", text)
+                query = " ".join(f'"{word}"*' for word in words)
+                cursor.execute("""
+                    SELECT code, description FROM Icd10Search
+                    WHERE Icd10Search MATCH ?
+                    ORDER BY rank
+                    LIMIT ?
+                """, (query, limit))
+            else:
+                words = re.findall(r"\w+", text)
+                conditions = " AND ".join("description LIKE ? ESCAPE '\\'" for _ in words) or "1"
+                cursor.execute(f"""
+                    SELECT code, description FROM Icd10Codes
+                    WHERE {conditions}
+                    ORDER BY code
+                    LIMIT ?
+                """, [f"%{escape_like(word)}%" for word in words] + [limit])
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Database error in search_icd10: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def get_checkup_codes(self, checkup_id):
+        """Return the ICD-10 codes stored for a checkup"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT code FROM CheckupDiagnosisCodes WHERE checkup_id = ? ORDER BY rowid",
+                           (checkup_id,))
+            return [row[0] for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Database error in get_checkup_codes: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def set_checkup_codes(self, checkup_id, codes):
+        """Replace the ICD-10 codes of a checkup"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("DELETE FROM CheckupDiagnosisCodes WHERE checkup_id = ?", (checkup_id,))
+            cursor.executemany("INSERT OR IGNORE INTO CheckupDiagnosisCodes (checkup_id, code) VALUES (?, ?)",
+                               [(checkup_id, code) for code in codes])
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Database error in set_checkup_codes: {e}")
+            conn.rollback()
+        finally:
+            conn.close()
+
+    def get_diagnosis_code_counts(self, start_date=None, end_date=None):
+        """Return (code, description, visits) for coded diagnoses, most frequent first"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT d.code, COALESCE(i.description, ''), COUNT(*) AS visits
+                FROM CheckupDiagnosisCodes d
+                JOIN Checkups c ON c.id = d.checkup_id
+                LEFT JOIN Icd10Codes i ON i.code = d.code
+                WHERE (? IS NULL OR DATE(c.last_checkup_date) >= ?)
+                  AND (? IS NULL OR DATE(c.last_checkup_date) <= ?)
+                GROUP BY d.code
+                ORDER BY visits DESC, d.code
+            """, (start_date, start_date, end_date, end_date))
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Database error in get_diagnosis_code_counts: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def save_visit_prescriptions(self, patient_id, visit_date, prescriptions):
+        """Replace a visit's prescriptions and post the matching stock dispenses.
+
+        Runs as one transaction. Dispenses are never edited: re-saving a visit
+        posts the difference from the prescriptions it replaces (a further
+        dispense, or a reversal when less is given now).
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        reference = f"visit:{patient_id}:{str(visit_date)[:10]}"
+        try:
+            cursor.execute("BEGIN")
+            cursor.execute("""
+                SELECT generic, brand, quantity FROM Prescriptions
+                WHERE patient_id = ? AND DATE(last_checkup_date) = DATE(?)
+            """, (patient_id, visit_date))
+            previous = cursor.fetchall()
+            cursor.execute("""
+                DELETE FROM Prescriptions 
+                WHERE patient_id = ? AND DATE(last_checkup_date) = DATE(?)
+            """, (patient_id, visit_date))
+            cursor.executemany("""
+                INSERT INTO Prescriptions (patient_id, generic, brand, quantity, 
+                administration, last_checkup_date)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [(patient_id, rx.generic, rx.brand, rx.quantity, rx.administration, visit_date)
+                  for rx in prescriptions])
+            
+            # What this visit should have taken from stock, per medicine
+            wanted = self._stock_quantities(cursor, [(rx.generic, rx.brand, rx.quantity) for rx in prescriptions])
+            
+            # What its previous prescriptions took. Not read from the ledger: visits
+            # saved before it have no dispenses on record
+            dispensed = self._stock_quantities(cursor, previous)
+            
+            entries = []
+            for medicine_id in set(wanted) | set(dispensed):
+                difference = wanted.get(medicine_id, 0) - dispensed.get(medicine_id, 0)
+                if difference:
+                    kind = "dispense" if difference > 0 else "reversal"
+                    entries.append((medicine_id, -difference, kind, reference))
+            cursor.executemany("""
+                INSERT INTO StockLedger (medicine_id, change, kind, reference)
+                VALUES (?, ?, ?, ?)
+            """, entries)
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Database error in save_visit_prescriptions: {e}")
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _stock_quantities(self, cursor, prescriptions):
+        """{medicine_id: quantity} of (generic, brand, quantity) rows; free-text quantities count as none"""
+        quantities = {}
+        for generic, brand, quantity in prescriptions:
+            try:
+                quantity = int(str(quantity).strip())
+            except ValueError:
+                continue  # Free-text quantity; nothing to dispense
+            cursor.execute("""
+                SELECT id FROM medicine WHERE brand = ?
+                ORDER BY generic = ? DESC LIMIT 1
+            """, (brand, generic))
+            row = cursor.fetchone()
+            if row and quantity > 0:
+                quantities[row[0]] = quantities.get(row[0], 0) + quantity
+        return quantities
+
+    def post_stock(self, medicine_id, change, kind, note=""):
+        """Append a ledger row (receipt, adjustment, ...); the stock total follows"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                INSERT INTO StockLedger (medicine_id, change, kind, note)
+                VALUES (?, ?, ?, ?)
+            """, (medicine_id, change, kind, note))
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Database error in post_stock: {e}")
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def record_stock_count(self, medicine_id, counted, note=""):
+        """Post the adjustment that makes the stock total equal a physical count.
+
+        The difference is taken from the current total inside the insert, so a
+        dispense posted since the list was read is not overwritten.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                INSERT INTO StockLedger (medicine_id, change, kind, note)
+                SELECT ?, difference, 'adjustment', ?
+                FROM (SELECT ? - COALESCE((SELECT on_hand FROM MedicineStock WHERE medicine_id = ?), 0)
+                      AS difference)
+                WHERE difference != 0
+            """, (medicine_id, note, counted, medicine_id))
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Database error in record_stock_count: {e}")
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def set_reorder_level(self, medicine_id, level):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                INSERT INTO MedicineStock (medicine_id, reorder_level) VALUES (?, ?)
+                ON CONFLICT (medicine_id) DO UPDATE SET reorder_level = excluded.reorder_level
+            """, (medicine_id, level))
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Database error in set_reorder_level: {e}")
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def get_stock_level(self, medicine_id):
+        """Return the units on hand (0 if the medicine was never stocked)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT on_hand FROM MedicineStock WHERE medicine_id = ?", (medicine_id,))
+            row = cursor.fetchone()
+            return row[0] if row else 0
+        except sqlite3.Error as e:
+            print(f"Database error in get_stock_level: {e}")
+            return 0
+        finally:
+            conn.close()
+
+    def _stock_filter(self, text, low_only):
+        conditions, params = [], []
+        if text.strip():
+            pattern = escape_like(text.strip()) + "%"
+            conditions.append("(m.brand LIKE ? ESCAPE '\\' OR m.generic LIKE ? ESCAPE '\\')")
+            params += [pattern, pattern]
+        if low_only:
+            conditions.append("s.on_hand - s.reorder_level <= 0")
+        return ("WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+    def count_stock(self, text="", low_only=False):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        where, params = self._stock_filter(text, low_only)
+        try:
+            # Low stock starts from the shortfall index; the full list from the medicines
+            if low_only:
+                cursor.execute(f"SELECT COUNT(*) FROM MedicineStock s JOIN medicine m ON m.id = s.medicine_id {where}", params)
+            else:
+                cursor.execute(f"SELECT COUNT(*) FROM medicine m LEFT JOIN MedicineStock s ON s.medicine_id = m.id {where}", params)
+            return cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Database error in count_stock: {e}")
+            return 0
+        finally:
+            conn.close()
+
+    def get_stock_page(self, text="", offset=0, limit=100, low_only=False):
+        """Return one page of StockLevel rows; low_only lists the shortfalls, worst first"""
+        conn = self.get_connection()
+        conn.row_factory = row_factory(StockLevel)
+        cursor = conn.cursor()
+        where, params = self._stock_filter(text, low_only)
+        try:
+            if low_only:
+                cursor.execute(f"""
+                    SELECT m.id, m.brand, m.generic, s.on_hand, s.reorder_level
+                    FROM MedicineStock s JOIN medicine m ON m.id = s.medicine_id
+                    {where}
+                    ORDER BY s.on_hand - s.reorder_level, m.id
+                    LIMIT ? OFFSET ?
+                """, params + [limit, offset])
+            else:
+                cursor.execute(f"""
+                    SELECT m.id, m.brand, m.generic, COALESCE(s.on_hand, 0), COALESCE(s.reorder_level, 0)
+                    FROM medicine m LEFT JOIN MedicineStock s ON s.medicine_id = m.id
+                    {where}
+                    ORDER BY m.brand COLLATE NOCASE, m.id
+                    LIMIT ? OFFSET ?
+                """, params + [limit, offset])
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Database error in get_stock_page: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def get_low_stock(self):
+        """Return StockLevel rows at or below their reorder level"""
+        return self.get_stock_page(offset=0, limit=-1, low_only=True)
+
+    def get_stock_ledger(self, medicine_id, limit=50):
+        """Return the newest ledger rows of a medicine"""
+        conn = self.get_connection()
+        conn.row_factory = row_factory(StockEntry)
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT id, change, kind, reference, note, created_at FROM StockLedger
+                WHERE medicine_id = ?
+                ORDER BY id DESC
+                LIMIT ?
+            """, (medicine_id, limit))
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Database error in get_stock_ledger: {e}")
+            return []
+        finally:
+            conn.close()
+
+    _RECALL_QUERY = """
+        SELECT p.id, p.visit_day, COALESCE(pt.name, ''), COALESCE(NULLIF(pt.phone, ''), pt.cell, ''),
+               p.brand, p.generic, p.quantity
+        FROM Prescriptions p
+        LEFT JOIN Patients pt ON pt.id = p.patient_id
+        WHERE p.medicine_id IN ({ids}) AND p.visit_day BETWEEN ? AND ?
+        ORDER BY p.visit_day, p.id
+    """
+
+    def count_recall_hits(self, medicine_ids, start_day, end_day):
+        """Number of prescriptions of these medicines between two days (YYYY-MM-DD)"""
+        if not medicine_ids:
+            return 0
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"""
+                SELECT COUNT(*) FROM Prescriptions
+                WHERE medicine_id IN ({",".join("?" * len(medicine_ids))}) AND visit_day BETWEEN ? AND ?
+            """, list(medicine_ids) + [start_day, end_day])
+            return cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Database error in count_recall_hits: {e}")
+            return 0
+        finally:
+            conn.close()
+
+    def count_unlinked_prescriptions(self, kind, name, start_day, end_day):
+        """Prescriptions naming a brand or generic (ignoring case) that no medicine is linked to.
+
+        A recall by medicine id cannot find these, so the count is shown with it.
+        """
+        column = "brand" if kind == "brand" else "generic"
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"""
+                SELECT COUNT(*) FROM Prescriptions
+                WHERE medicine_id IS NULL AND {column} = ? COLLATE NOCASE AND visit_day BETWEEN ? AND ?
+            """, (name, start_day, end_day))
+            return cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Database error in count_unlinked_prescriptions: {e}")
+            return 0
+        finally:
+            conn.close()
+
+    def get_recall_page(self, medicine_ids, start_day, end_day, offset=0, limit=100):
+        """Return one page of RecallHit rows: who received these medicines, and when"""
+        if not medicine_ids:
+            return []
+        conn = self.get_connection()
+        conn.row_factory = row_factory(RecallHit)
+        cursor = conn.cursor()
+        try:
+            cursor.execute(self._RECALL_QUERY.format(ids=",".join("?" * len(medicine_ids))) + " LIMIT ? OFFSET ?",
+                           list(medicine_ids) + [start_day, end_day, limit, offset])
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Database error in get_recall_page: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def iter_recall_hits(self, medicine_ids, start_day, end_day, chunk_size=1000):
+        """Yield every RecallHit in chunks, for exporting without loading them all"""
+        if not medicine_ids:
+            return
+        conn = self.get_connection()
+        conn.row_factory = row_factory(RecallHit)
+        cursor = conn.cursor()
+        try:
+            cursor.execute(self._RECALL_QUERY.format(ids=",".join("?" * len(medicine_ids))),
+                           list(medicine_ids) + [start_day, end_day])
+            while True:
+                chunk = cursor.fetchmany(chunk_size)
+                if not chunk:
+                    break
+                yield from chunk
+        finally:
+            conn.close()
+
     def get_patient_checkups(self, patient_id):
         """Get all checkups for a specific patient ordered by date"""
         conn = self.get_connection()
         cursor = conn.cursor()
+        cursor.row_factory = row_factory(Checkup)
         try:
             cursor.execute("""
                 SELECT id, findings, lab_ids, dateOfVisit, last_checkup_date, blood_pressure 
@@ -430,6 +1395,7 @@ class DatabaseHelper:
         """Get prescriptions for a specific checkup date"""
         conn = self.get_connection()
         cursor = conn.cursor()
+        cursor.row_factory = row_factory(Prescription)
         try:
             # Modified query to get only prescriptions for specific date
             cursor.execute("""
@@ -449,6 +1415,7 @@ class DatabaseHelper:
         """Get a checkup record for a specific patient and date"""
         conn = self.get_connection()
         cursor = conn.cursor()
+        cursor.row_factory = row_factory(Checkup)
         try:
             cursor.execute("""
                 SELECT id, findings, lab_ids, dateOfVisit, last_checkup_date, blood_pressure
@@ -544,6 +1511,297 @@ class DatabaseHelper:
         finally:
             conn.close()
 
+    def add_lab_checkup(self, checkup_data, images):
+        """Create a checkup and attach stored images to it, in one transaction.
+
+        checkup_data is as for add_checkup; images are the entries of the import
+        pipeline (dicts with sha256, stored_path, dhash and the sizes). The
+        ImageBlobs row of a new file is created here and the reference counts
+        are kept by the LabImages triggers.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                INSERT INTO Checkups (patient_id, findings, lab_ids, dateOfVisit, 
+                last_checkup_date)
+                VALUES (?, ?, ?, ?, ?)
+            """, checkup_data[:5])
+            checkup_id = cursor.lastrowid
+            patient_id = checkup_data[0]
+            current_date = datetime.now().strftime('%Y-%m-%d')
+            cursor.executemany("""
+                INSERT OR IGNORE INTO ImageBlobs
+                    (sha256, file_path, size, original_size, original_path, pixels, original_pixels)
+                VALUES (:sha256, :stored_path, :size, :original_size, :original_path, :pixels, :original_pixels)
+            """, images)
+            cursor.executemany("""
+                INSERT INTO LabImages (patient_id, checkup_id, file_path, upload_date, sha256, dhash)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [(patient_id, checkup_id, image["stored_path"], current_date, image["sha256"], image["dhash"])
+                  for image in images])
+            conn.commit()
+            return checkup_id
+        except sqlite3.Error as e:
+            print(f"Database error in add_lab_checkup: {e}")
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def get_patient_image_hashes(self, patient_id):
+        """Return {sha256: file_path} of the patient's hashed lab images"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT sha256, file_path FROM LabImages
+                WHERE patient_id = ? AND sha256 IS NOT NULL
+            """, (patient_id,))
+            return dict(cursor.fetchall())
+        except sqlite3.Error as e:
+            print(f"Database error in get_patient_image_hashes: {e}")
+            return {}
+        finally:
+            conn.close()
+
+    def get_unhashed_lab_images(self, patient_id):
+        """(id, file_path) of the patient's images saved before content hashing"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT id, file_path FROM LabImages
+                WHERE patient_id = ? AND sha256 IS NULL
+            """, (patient_id,))
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Database error in get_unhashed_lab_images: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def set_lab_image_hashes(self, hashes):
+        """Record the content hash of older images, given as (sha256, id) pairs"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.executemany("UPDATE LabImages SET sha256 = ? WHERE id = ?", hashes)
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Database error in set_lab_image_hashes: {e}")
+            conn.rollback()
+        finally:
+            conn.close()
+
+    def get_lab_image_dhashes(self, patient_id):
+        """(id, file_path, dhash) of every lab image of a patient; dhash is None if not computed yet"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT id, file_path, dhash FROM LabImages WHERE patient_id = ?", (patient_id,))
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Database error in get_lab_image_dhashes: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def set_lab_image_dhashes(self, hashes):
+        """Record the perceptual hash of older images, given as (dhash, id) pairs"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.executemany("UPDATE LabImages SET dhash = ? WHERE id = ?", hashes)
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Database error in set_lab_image_dhashes: {e}")
+            conn.rollback()
+        finally:
+            conn.close()
+
+    def get_lab_image_batch(self, after_id=0, limit=200):
+        """(id, file_path, sha256) of the lab images after after_id, in id order"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT id, file_path, sha256 FROM LabImages
+                WHERE id > ? ORDER BY id LIMIT ?
+            """, (after_id, limit))
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Database error in get_lab_image_batch: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def relocate_lab_images(self, moves):
+        """Point every row using a moved file at its new path, in one transaction.
+
+        moves are (old_path, new_path, sha256, size) tuples. The file's
+        ImageBlobs row is created if it has none, and rows saved before content
+        hashing get the hash. The reference counts of the moved blobs are then
+        counted again: a hash recorded before its blob row existed was never
+        counted by the triggers.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.executemany("""
+                INSERT OR IGNORE INTO ImageBlobs (sha256, file_path, size, original_size) VALUES (?, ?, ?, ?)
+            """, [(sha256, new_path, size, size) for _, new_path, sha256, size in moves])
+            cursor.executemany("UPDATE ImageBlobs SET file_path = ? WHERE sha256 = ?",
+                               [(new_path, sha256) for _, new_path, sha256, _ in moves])
+            cursor.executemany("UPDATE LabImages SET file_path = ?, sha256 = ? WHERE file_path = ?",
+                               [(new_path, sha256, old_path) for old_path, new_path, sha256, _ in moves])
+            cursor.executemany("""
+                UPDATE ImageBlobs
+                SET ref_count = (SELECT COUNT(*) FROM LabImages WHERE sha256 = ImageBlobs.sha256)
+                WHERE sha256 = ?
+            """, [(sha256,) for sha256 in {sha256 for _, _, sha256, _ in moves}])
+            conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Database error in relocate_lab_images: {e}")
+            conn.rollback()
+            return False
+        finally:
+            conn.close()
+
+    def get_image_references(self):
+        """Return ((id, file_path) of every LabImages row, paths of every referenced blob, hashes in use).
+
+        Blob paths include the cold storage originals. A hash is in use if a
+        lab image row has it or its blob is still referenced.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT id, file_path FROM LabImages WHERE file_path IS NOT NULL")
+            rows = cursor.fetchall()
+            cursor.execute("SELECT file_path, original_path FROM ImageBlobs WHERE ref_count > 0")
+            blob_paths = {path for pair in cursor.fetchall() for path in pair if path}
+            cursor.execute("""
+                SELECT sha256 FROM LabImages WHERE sha256 IS NOT NULL
+                UNION
+                SELECT sha256 FROM ImageBlobs WHERE ref_count > 0
+            """)
+            hashes = {row[0] for row in cursor.fetchall()}
+            return rows, blob_paths, hashes
+        except sqlite3.Error as e:
+            print(f"Database error in get_image_references: {e}")
+            return None
+        finally:
+            conn.close()
+
+    def get_referenced_hashes(self, hashes):
+        """The subset of content hashes that a lab image row or a referenced blob still uses"""
+        hashes = list(hashes)
+        if not hashes:
+            return set()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            placeholders = ",".join("?" * len(hashes))
+            cursor.execute(f"""
+                SELECT sha256 FROM LabImages WHERE sha256 IN ({placeholders})
+                UNION
+                SELECT sha256 FROM ImageBlobs WHERE ref_count > 0 AND sha256 IN ({placeholders})
+            """, hashes * 2)
+            return {row[0] for row in cursor.fetchall()}
+        except sqlite3.Error as e:
+            print(f"Database error in get_referenced_hashes: {e}")
+            return set(hashes)  # Treat everything as in use, so nothing is deleted
+        finally:
+            conn.close()
+
+    def get_referenced_paths(self, paths):
+        """The subset of paths that a lab image row or a referenced blob still uses"""
+        paths = list(paths)
+        if not paths:
+            return set()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            placeholders = ",".join("?" * len(paths))
+            cursor.execute(f"""
+                SELECT file_path FROM LabImages WHERE file_path IN ({placeholders})
+                UNION
+                SELECT file_path FROM ImageBlobs WHERE ref_count > 0 AND file_path IN ({placeholders})
+                UNION
+                SELECT original_path FROM ImageBlobs WHERE ref_count > 0 AND original_path IN ({placeholders})
+            """, paths * 3)
+            return {row[0] for row in cursor.fetchall()}
+        except sqlite3.Error as e:
+            print(f"Database error in get_referenced_paths: {e}")
+            return set(paths)  # Treat everything as in use, so nothing is deleted
+        finally:
+            conn.close()
+
+    def delete_lab_image_rows(self, image_ids):
+        """Delete lab image rows by id (e.g. rows whose file is gone) and the blobs left unused"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.executemany("DELETE FROM LabImages WHERE id = ?", [(image_id,) for image_id in image_ids])
+            cursor.execute("DELETE FROM ImageBlobs WHERE ref_count <= 0")
+            conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Database error in delete_lab_image_rows: {e}")
+            conn.rollback()
+            return False
+        finally:
+            conn.close()
+
+    def delete_unreferenced_blobs(self):
+        """Drop ImageBlobs rows no lab image uses any more; their files become orphans.
+
+        The reference counts are counted again first, so a count that went
+        wrong never drops a blob that is still in use.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                UPDATE ImageBlobs
+                SET ref_count = (SELECT COUNT(*) FROM LabImages WHERE sha256 = ImageBlobs.sha256)
+                WHERE ref_count != (SELECT COUNT(*) FROM LabImages WHERE sha256 = ImageBlobs.sha256)
+            """)
+            cursor.execute("DELETE FROM ImageBlobs WHERE ref_count <= 0")
+            conn.commit()
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            print(f"Database error in delete_unreferenced_blobs: {e}")
+            conn.rollback()
+            return 0
+        finally:
+            conn.close()
+
+    def delete_lab_image(self, patient_id, file_path):
+        """Delete a patient's image rows; return True if no row uses the file any more.
+
+        A stored file whose reference count drops to zero also loses its
+        ImageBlobs row, so the caller can delete the file itself.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("DELETE FROM LabImages WHERE patient_id = ? AND file_path = ?",
+                           (patient_id, file_path))
+            cursor.execute("DELETE FROM ImageBlobs WHERE file_path = ? AND ref_count <= 0", (file_path,))
+            cursor.execute("SELECT 1 FROM LabImages WHERE file_path = ? LIMIT 1", (file_path,))
+            unreferenced = cursor.fetchone() is None
+            conn.commit()
+            return unreferenced
+        except sqlite3.Error as e:
+            print(f"Database error in delete_lab_image: {e}")
+            conn.rollback()
+            return False
+        finally:
+            conn.close()
+
     def get_patient_lab_images(self, patient_id):
         """Get all lab images associated with a patient"""
         conn = self.get_connection()
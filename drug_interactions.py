@@ -0,0 +1,138 @@
+# drug_interactions.py
+import csv
+import os
+import re
+from typing import NamedTuple
+
+INTERACTIONS_PATH = "drug_interactions.csv"
+
+# Words in a generic name that describe the form or strength, not the drug
+FORM_WORDS = {
+    "tab", "tabs", "tablet", "tablets", "cap", "caps", "capsule", "capsules", "mg", "mcg", "g",
+    "ml", "iu", "syrup", "susp", "suspension", "drops", "cream", "ointment", "inj", "injection",
+    "sr", "er", "xr", "mr", "od", "film", "coated", "forte", "plus",
+}
+
+# A strength such as '500', '2' (of 2.5) or '500mg'; letters-and-digits names like 'b12' are kept
+STRENGTH = re.compile(r"^\d+(mg|mcg|g|ml|iu)?$")
+
+
+class Interaction(NamedTuple):
+    drug_a: str
+    drug_b: str
+    severity: str
+    description: str
+
+
+class InteractionChecker:
+    """Known interacting drug pairs, checked against the current prescription.
+
+    Every ingredient name gets a small integer id and each interacting pair is
+    stored once under (lower id, higher id), so checking two drugs is a set of
+    dictionary lookups. A generic like 'ORPHENADINE + PARACETAMOL 50/650 MG'
+    is split into its ingredients, and all of them are checked.
+    """
+
+    def __init__(self):
+        self._ids = {}         # ingredient name -> id
+        self._pairs = {}       # (id, id) -> Interaction
+        self._generics = {}    # generic name -> ingredient ids, parsed once
+        self.loaded = False
+        self.problem = None    # Why checks are off, if the file is missing or unreadable
+
+    def load(self, path=INTERACTIONS_PATH):
+        """Read the local interaction file (drug, drug, severity, description per row).
+
+        Safe to call from a worker thread: the lookup tables are built aside and
+        swapped in at the end.
+        """
+        ids, pairs = {}, {}
+        problem = None
+        if os.path.exists(path):
+            try:
+                with open(path, newline="", encoding="utf-8-sig") as f:
+                    for row in csv.reader(f):
+                        if len(row) < 2 or row[0].strip().lower() in ("drug_a", "drug a", "drug1"):
+                            continue
+                        severity = row[2].strip() if len(row) > 2 else ""
+                        description = row[3].strip() if len(row) > 3 else ""
+                        first = ids.setdefault(self.ingredient_name(row[0]), len(ids))
+                        second = ids.setdefault(self.ingredient_name(row[1]), len(ids))
+                        pairs[(min(first, second), max(first, second))] = Interaction(
+                            row[0].strip(), row[1].strip(), severity, description)
+            except (OSError, UnicodeDecodeError, csv.Error) as e:
+                print(f"Could not read {path}: {e}")
+                ids, pairs = {}, {}
+                problem = f"{os.path.basename(path)} could not be read"
+        else:
+            problem = f"{os.path.basename(path)} not found"
+        if problem:
+            print(f"Interaction checks are off: {problem}")
+        self._ids, self._pairs, self._generics = ids, pairs, {}
+        self.problem = problem
+        self.loaded = True
+        return len(pairs)
+
+    def off_notice(self):
+        """A line telling the user interaction checks are off, or "" when they run"""
+        return f"Interaction checks are off: {self.problem}" if self.loaded and self.problem else ""
+
+    @staticmethod
+    def ingredient_name(text):
+        """The drug part of a name: 'Vitamin B12 500 mcg tab' -> 'vitamin b12'"""
+        words = re.findall(r"[a-z0-9]+", text.lower())
+        return " ".join(word for word in words
+                        if word not in FORM_WORDS and not STRENGTH.match(word))
+
+    def ingredient_ids(self, generic):
+        ids = self._generics.get(generic)
+        if ids is None:
+            ids = set()
+            for part in re.split(r"[+&]| and ", generic or "", flags=re.IGNORECASE):
+                ingredient_id = self._ids.get(self.ingredient_name(part))
+                if ingredient_id is not None:
+                    ids.add(ingredient_id)
+            self._generics[generic] = ids
+        return ids
+
+    def check_pair(self, generic_a, generic_b):
+        """Return the interactions between two generics"""
+        found = []
+        for first in self.ingredient_ids(generic_a):
+            for second in self.ingredient_ids(generic_b):
+                interaction = self._pairs.get((min(first, second), max(first, second)))
+                if interaction:
+                    found.append(interaction)
+        return found
+
+    def check_new(self, generic, others):
+        """Interactions between a drug being added and the drugs already listed"""
+        found = []
+        for other in others:
+            found.extend(self.check_pair(generic, other))
+        return found
+
+    def check_all(self, generics):
+        """Interactions between any two drugs of a list"""
+        found = []
+        generics = list(generics)
+        for index, generic in enumerate(generics):
+            found.extend(self.check_new(generic, generics[:index]))
+        return found
+
+
+def describe_interactions(interactions):
+    """One warning line per interaction, e.g. '⚠ WARFARIN + ASPIRIN (major): bleeding risk'"""
+    lines = []
+    for interaction in interactions:
+        line = f"⚠ {interaction.drug_a} + {interaction.drug_b}"
+        if interaction.severity:
+            line += f" ({interaction.severity})"
+        if interaction.description:
+            line += f": {interaction.description}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+# Shared by the main window and the medication window; filled in by load()
+interaction_checker = InteractionChecker()
@@ -0,0 +1,93 @@
+# findings_index.py
+import math
+import re
+from collections import Counter
+
+# Words that say nothing about the diagnosis
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is",
+    "it", "no", "not", "of", "on", "or", "pt", "the", "to", "was", "with",
+}
+
+
+def tokenize(text):
+    return [word for word in re.findall(r"[a-z0-9]+", (text or "").lower())
+            if len(word) > 1 and word not in STOP_WORDS]
+
+
+class FindingsIndex:
+    """TF-IDF similarity search over the findings of past visits.
+
+    Stored as a sparse inverted index (word -> {visit: weight}) rather than a
+    matrix, so a query only touches the visits sharing a word with it and a
+    saved visit only updates its own postings. Visit vectors are length
+    normalized log term frequencies; IDF is applied at query time from the
+    current document frequencies, so it never goes stale as visits are added.
+    """
+
+    def __init__(self):
+        self._postings = {}  # word -> {visit key: weight}
+        self._terms = {}     # visit key -> words of that visit
+        self._visits = {}    # visit key -> Visit
+
+    def __len__(self):
+        return len(self._visits)
+
+    @classmethod
+    def build(cls, visits):
+        index = cls()
+        for visit in visits:
+            index.update_visit(visit)
+        return index
+
+    def update_visit(self, visit):
+        """Index a saved visit, replacing an earlier save of it"""
+        visit_key = (visit.patient_id, visit.visit_date)
+        for word in self._terms.pop(visit_key, ()):
+            postings = self._postings[word]
+            del postings[visit_key]
+            if not postings:
+                del self._postings[word]
+        self._visits.pop(visit_key, None)
+
+        weights = self._weigh(tokenize(visit.findings))
+        if not weights:
+            return
+        self._visits[visit_key] = visit
+        self._terms[visit_key] = tuple(weights)
+        for word, weight in weights.items():
+            self._postings.setdefault(word, {})[visit_key] = weight
+
+    def similar(self, findings, limit=5, exclude=None):
+        """Return [(score, Visit)] for the past visits most similar to the findings"""
+        query = self._weigh(tokenize(findings))
+        total = len(self._visits)
+        scores = Counter()
+        for word, query_weight in query.items():
+            postings = self._postings.get(word)
+            if not postings:
+                continue
+            idf = math.log((1 + total) / (1 + len(postings))) + 1
+            for visit_key, weight in postings.items():
+                scores[visit_key] += idf * idf * query_weight * weight
+        scores.pop(exclude, None)
+        return [(score, self._visits[visit_key]) for visit_key, score in scores.most_common(limit)]
+
+    def suggest_drugs(self, findings, limit=10, exclude=None):
+        """Return [(Prescription, score)] prescribed in the most similar visits, best first"""
+        best = {}
+        for score, visit in self.similar(findings, exclude=exclude):
+            for rx in visit.prescriptions:
+                drug = (rx.brand, rx.generic)
+                if drug in best:
+                    best[drug] = (best[drug][0], best[drug][1] + score)
+                else:
+                    best[drug] = (rx, score)
+        return sorted(best.values(), key=lambda item: -item[1])[:limit]
+
+    @staticmethod
+    def _weigh(words):
+        counts = Counter(words)
+        weights = {word: 1 + math.log(count) for word, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        return {word: weight / norm for word, weight in weights.items()} if norm else {}
@@ -0,0 +1,128 @@
+# icd10_lookup.py
+import csv
+import re
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+from db_helper import DatabaseHelper
+from background import run_in_background
+
+IMPORT_PROMPT = "No ICD-10 codes yet - select to import a code file..."
+
+
+def read_icd10_file(path):
+    """Read (code, description) pairs from a local ICD-10 file.
+
+    Accepts a CSV or tab separated file with the code in the first column and
+    the description in the second, or the CMS 'codes' text file (code, spaces,
+    description). Header lines and rows without a valid code are skipped.
+    Codes are stored dotted, e.g. J459 -> J45.9.
+    """
+    codes = []
+    with open(path, encoding="utf-8-sig", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if "\t" in line:
+                fields = line.split("\t")
+            elif "," in line.split(" ", 1)[0] or line.startswith('"'):
+                fields = next(csv.reader([line]))
+            else:
+                fields = line.split(None, 1)
+            if len(fields) < 2:
+                continue
+            code = fields[0].strip().upper()
+            if not re.match(r"^[A-Z][0-9][0-9A-Z](\.?[0-9A-Z]{1,4})?$", code):
+                continue
+            if len(code) > 3 and "." not in code:
+                code = code[:3] + "." + code[3:]
+            codes.append((code, fields[1].strip()))
+    return codes
+
+
+class Icd10Lookup(tk.Frame):
+    """ICD-10 code picker for the diagnosis: type a code or words, pick from the list"""
+
+    def __init__(self, parent, bg="#e6f7ff", **kwargs):
+        super().__init__(parent, bg=bg, **kwargs)
+        self.db = None  # Created on first search; the helper upgrades the schema
+        self.codes = []
+        self._search_job = None
+
+        tk.Label(self, text="ICD-10:", bg=bg).pack(side=tk.LEFT)
+        self.search_var = tk.StringVar()
+        self.search_box = ttk.Combobox(self, textvariable=self.search_var, width=28)
+        self.search_box.pack(side=tk.LEFT, padx=5)
+        self.search_box.bind("<KeyRelease>", self.on_search_key)
+        self.search_box.bind("<<ComboboxSelected>>", self.on_code_selected)
+
+        clear_button = tk.Button(self, text="Clear", padx=5, pady=0, command=self.clear)
+        clear_button.pack(side=tk.RIGHT)
+        self.codes_label = tk.Label(self, text="", bg=bg, anchor="w", font=("Arial", 9, "bold"))
+        self.codes_label.pack(side=tk.LEFT, fill=tk.X, expand=True)
+
+    def on_search_key(self, event=None):
+        """Search shortly after typing stops"""
+        if event is not None and event.keysym in ('Up', 'Down', 'Left', 'Right', 'Return', 'Escape'):
+            return
+        if self._search_job:
+            self.after_cancel(self._search_job)
+        self._search_job = self.after(150, self.search)
+
+    def search(self):
+        self._search_job = None
+        text = self.search_var.get()
+        if self.db is None:
+            self.db = DatabaseHelper()
+        matches = self.db.search_icd10(text)
+        if matches:
+            self.search_box['values'] = [f"{match.code}  {match.description}" for match in matches]
+        elif text.strip() and not self.db.count_icd10_codes():
+            self.search_box['values'] = [IMPORT_PROMPT]
+        else:
+            self.search_box['values'] = ["No matches found"]
+
+    def on_code_selected(self, event=None):
+        selected = self.search_var.get()
+        self.search_var.set("")
+        if selected == IMPORT_PROMPT:
+            self.import_codes()
+            return
+        code = selected.split("  ", 1)[0]
+        if re.match(r"^[A-Z][0-9]", code) and code not in self.codes:
+            self.codes.append(code)
+            self.show_codes()
+
+    def set_codes(self, codes):
+        self.codes = list(codes)
+        self.show_codes()
+
+    def clear(self):
+        self.set_codes([])
+
+    def show_codes(self):
+        self.codes_label.config(text=", ".join(self.codes))
+
+    def import_codes(self):
+        """Load an ICD-10 code file into the database on a worker thread"""
+        path = filedialog.askopenfilename(
+            title="Select ICD-10 Code File",
+            filetypes=[("Code files", "*.csv *.txt *.tsv"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        self.codes_label.config(text="Importing ICD-10 codes...")
+        run_in_background(
+            self,
+            lambda: DatabaseHelper().import_icd10_codes(read_icd10_file(path)),
+            on_done=self.finish_import,
+            on_error=self.fail_import,
+        )
+
+    def finish_import(self, count):
+        self.show_codes()
+        messagebox.showinfo("ICD-10", f"{count} ICD-10 codes available.")
+
+    def fail_import(self, error):
+        self.show_codes()
+        messagebox.showerror("ICD-10", f"Could not import the code file: {error}")
@@ -0,0 +1,187 @@
+# image_cache.py
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from PIL import Image
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "image_cache")
+
+# Named rendition sizes (the image is fitted inside, keeping its proportions)
+THUMBNAIL = (160, 120)
+PREVIEW = (800, 600)
+
+# hashes.json is rewritten after this many new hashes, or this many seconds
+HASH_WRITE_BATCH = 50
+HASH_WRITE_SECONDS = 10
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Hash a file in chunks, so large scans are never read into memory at once"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RenditionCache:
+    """On-disk cache of resized copies (renditions) of lab images.
+
+    Renditions are keyed by the SHA-256 of the source file and the target size,
+    so the same scan attached twice is rendered once, and an edited file gets
+    new renditions. Source hashes are remembered per path with the file's size
+    and mtime, so a cache hit does not re-read the original; they are written
+    to disk in batches (flush() writes the rest). When the cache grows past
+    max_bytes the least recently used renditions (oldest mtime; a hit touches
+    the file) are deleted, and so are the hashes no rendition uses any more.
+    Safe to use from worker threads.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=200 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._total_bytes = None  # Measured on first use
+        self._hash_file = os.path.join(cache_dir, "hashes.json")
+        self._hashes = None       # path -> [size, mtime_ns, sha256]
+        self._unsaved = 0         # Hashes added since hashes.json was written
+        self._saved_at = time.monotonic()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def source_hash(self, path):
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        with self._lock:
+            if self._hashes is None:
+                self._hashes = self._read_hashes()
+            known = self._hashes.get(key)
+        if known and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return known[2]
+        digest = file_sha256(path)
+        with self._lock:
+            self._hashes[key] = [stat.st_size, stat.st_mtime_ns, digest]
+            self._unsaved += 1
+            if self._unsaved >= HASH_WRITE_BATCH or time.monotonic() - self._saved_at > HASH_WRITE_SECONDS:
+                self._write_hashes()
+        return digest
+
+    def flush(self):
+        """Write hashes not saved yet"""
+        with self._lock:
+            if self._unsaved:
+                self._write_hashes()
+
+    def rendition_path(self, digest, size):
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}_{size[0]}x{size[1]}.img")
+
+    def get(self, path, size=PREVIEW):
+        """Return the path of a cached rendition, rendering it on a miss"""
+        digest = self.source_hash(path)
+        rendition = self.rendition_path(digest, size)
+        if os.path.exists(rendition):
+            with self._lock:
+                self.hits += 1
+            os.utime(rendition)  # Mark as recently used
+            return rendition
+        with self._lock:
+            self.misses += 1
+        return self.render(path, size, digest)
+
+    def render(self, path, size=PREVIEW, digest=None):
+        """Write the rendition of path at size (fitted inside it) and return its path"""
+        digest = digest or self.source_hash(path)
+        rendition = self.rendition_path(digest, size)
+        os.makedirs(os.path.dirname(rendition), exist_ok=True)
+        with Image.open(path) as source:
+            source.draft("RGB", size)  # Lets JPEG decode at a reduced scale
+            image = source.convert("RGBA" if source.mode in ("RGBA", "LA", "P") else "RGB")
+        image.thumbnail(size, Image.Resampling.LANCZOS)
+        temp_path = f"{rendition}.{threading.get_ident()}.tmp"
+        # JPEG for scans and photos, PNG when there is transparency to keep
+        if image.mode == "RGBA":
+            image.save(temp_path, "PNG")
+        else:
+            image.save(temp_path, "JPEG", quality=90)
+        os.replace(temp_path, rendition)
+        self._added(os.path.getsize(rendition))
+        return rendition
+
+    def prepare(self, path, sizes=(THUMBNAIL, PREVIEW)):
+        """Render every standard size for a newly imported file"""
+        digest = self.source_hash(path)
+        for size in sizes:
+            if not os.path.exists(self.rendition_path(digest, size)):
+                self.render(path, size, digest)
+
+    def stats(self):
+        total = self._total_bytes or 0
+        return f"Cache: {self.hits} hits, {self.misses} misses, {total / (1024 * 1024):.1f} MB"
+
+    def _added(self, size):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._renditions())
+            else:
+                self._total_bytes += size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Delete least recently used renditions until the cache is 90% of its budget"""
+        target = self.max_bytes * 0.9
+        live = set()  # Digests that still have a rendition
+        for path, size, _ in sorted(self._renditions(), key=lambda item: item[2]):
+            if self._total_bytes <= target:
+                live.add(os.path.basename(path).split("_")[0])
+                continue
+            try:
+                os.remove(path)
+                self._total_bytes -= size
+            except OSError:
+                live.add(os.path.basename(path).split("_")[0])
+        if self._hashes is not None:
+            stale = [key for key, (_, _, digest) in self._hashes.items() if digest not in live]
+            for key in stale:
+                del self._hashes[key]
+            if stale:
+                self._write_hashes()
+
+    def _renditions(self):
+        """(path, bytes, mtime) of every rendition file"""
+        for folder in os.scandir(self.cache_dir):
+            if folder.is_dir():
+                for entry in os.scandir(folder.path):
+                    if entry.name.endswith(".img"):
+                        stat = entry.stat()
+                        yield entry.path, stat.st_size, stat.st_mtime
+
+    def _read_hashes(self):
+        try:
+            with open(self._hash_file, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_hashes(self):
+        temp_path = f"{self._hash_file}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self._hashes, f)
+        os.replace(temp_path, self._hash_file)
+        self._unsaved = 0
+        self._saved_at = time.monotonic()
+
+
+_cache = None
+
+def get_rendition_cache():
+    """Return the process-wide rendition cache"""
+    global _cache
+    if _cache is None:
+        _cache = RenditionCache()
+        atexit.register(_cache.flush)
+    return _cache
@@ -0,0 +1,88 @@
+# image_migration.py
+# Moves lab images saved in older layouts (patient_images/patient_<id>/..., or
+# the flat store/<sha256>.ext) into the fan-out store, and stores their paths
+# relative to the image root. Rows with an absolute path from another machine
+# or an older application folder are found by their part below the image root
+# folder. Safe to run while the application is open:
+#   python image_migration.py
+import os
+import shutil
+from db_helper import DatabaseHelper
+from image_cache import file_sha256
+from image_store import ImageStore
+
+
+def migrate_image_layout(db=None, store=None, batch_size=200, progress=print):
+    """Move images into the fan-out layout in batches; returns (moved, skipped).
+
+    Each batch copies (or hard links) its files to their new place, commits
+    the new paths for every row using them in one transaction, and only then
+    deletes the old files, so an interruption at any point leaves every row
+    pointing at a file that exists. Running it again picks up where it
+    stopped. Rows whose file is missing are left alone and counted as skipped.
+    """
+    db = db or DatabaseHelper()
+    store = store or ImageStore()
+    moved = skipped = 0
+    last_id = 0
+    while True:
+        rows = db.get_lab_image_batch(last_id, batch_size)
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        moves, seen = [], set()
+        for _, file_path, sha256 in rows:
+            if file_path in seen or store.in_layout(file_path):
+                continue
+            seen.add(file_path)
+            source = store.locate(file_path)
+            if not os.path.exists(source):
+                skipped += 1
+                continue
+            digest = sha256 or file_sha256(source)
+            target = store.layout_path(digest, os.path.splitext(source)[1].lower())
+            if not os.path.exists(target):
+                place_copy(source, target)
+            moves.append((file_path, store.relative(target), digest, os.path.getsize(target)))
+
+        if moves and not db.relocate_lab_images(moves):
+            raise RuntimeError("Could not update the image paths; no old files were removed")
+        for old_path, new_path, _, _ in moves:
+            source = store.locate(old_path)
+            if source != store.resolve(new_path) and source.startswith(store.image_root + os.sep):
+                try:
+                    os.remove(source)
+                except OSError as e:
+                    print(f"Warning: Could not remove {source}: {e}")
+        moved += len(moves)
+        progress(f"Moved {moved} image(s), skipped {skipped}")
+
+    remove_empty_folders(store.image_root)
+    return moved, skipped
+
+
+def place_copy(source, target):
+    """Put a copy of source at target: a hard link when possible, else a file copy"""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temp_path = f"{target}.migrate.tmp"
+    try:
+        os.link(source, temp_path)
+    except OSError:
+        shutil.copy2(source, temp_path)
+    os.replace(temp_path, target)
+
+
+def remove_empty_folders(image_root):
+    """Drop the per-patient folders the migration emptied"""
+    for entry in os.scandir(image_root):
+        if entry.is_dir() and entry.name.startswith("patient_"):
+            try:
+                os.rmdir(entry.path)
+            except OSError:
+                pass  # Not empty
+
+
+if __name__ == "__main__":
+    moved, skipped = migrate_image_layout()
+    print(f"Done: {moved} image(s) moved, {skipped} skipped because the file is missing")
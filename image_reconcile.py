@@ -0,0 +1,218 @@
+# image_reconcile.py
+# Checks the image store against LabImages: rows whose file is gone, and files
+# no row uses. At startup it only reports; from the command line,
+#   python image_reconcile.py [--repair] [--collect]
+# --repair deletes the rows whose file is gone, and --collect deletes the
+# unused files.
+import glob
+import os
+import re
+import sys
+import time
+from typing import NamedTuple
+from db_helper import DatabaseHelper
+from image_store import ImageStore
+from import_pipeline import ImportJournal, JOURNAL_DIR
+
+# Files younger than this are left alone: an import may be about to commit them
+GRACE_SECONDS = 60 * 60
+
+
+class ReconcileReport(NamedTuple):
+    scanned: int          # Files found under the image root (and cold storage)
+    dangling_rows: list   # (id, file_path) of LabImages rows whose file is missing
+    orphan_files: list    # (path key, bytes) of files nothing refers to
+    orphan_bytes: int
+
+
+def scan_files(store):
+    """{path key: (bytes, mtime)} of every image file, in a single os.scandir walk.
+
+    Keys are what the database holds: relative to the image root inside it,
+    absolute outside it (cold storage).
+    """
+    files = {}
+    stack = [store.image_root]
+    if store.settings["cold_storage"]:
+        stack.append(os.path.abspath(store.settings["cold_storage"]))
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.path != os.path.abspath(JOURNAL_DIR):
+                            stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat()
+                        files[store.relative(entry.path)] = (stat.st_size, stat.st_mtime)
+        except OSError as e:
+            print(f"Could not scan image folder: {e}")
+    return files
+
+
+def match_key(file_path, store):
+    """The form of a path two spellings of the same file agree on.
+
+    Older absolute rows, possibly with another drive letter case or from
+    before the application folder moved, match by their part below the
+    image root folder (see ImageStore.legacy_relative).
+    """
+    key = store.relative(store.resolve(file_path))
+    if os.path.isabs(key) or re.match(r"^[A-Za-z]:[\\/]", key):
+        key = store.legacy_relative(key) or key
+    return os.path.normcase(key)
+
+
+def journaled_paths(store):
+    """Stored files of imports that were interrupted before they committed"""
+    paths = set()
+    for journal_path in glob.glob(os.path.join(JOURNAL_DIR, "patient_*.jsonl")):
+        patient_id = os.path.basename(journal_path)[len("patient_"):-len(".jsonl")]
+        _, stored = ImportJournal(patient_id).read()
+        paths.update(match_key(entry["stored_path"], store) for entry in stored.values())
+    return paths
+
+
+def reconcile(db=None, store=None):
+    """Diff the files on disk against LabImages and ImageBlobs; changes nothing on disk"""
+    db = db or DatabaseHelper()
+    store = store or ImageStore()
+    db.delete_unreferenced_blobs()
+    files = scan_files(store)
+    references = db.get_image_references()
+    if references is None:
+        return ReconcileReport(len(files), [], [], 0)  # Without the rows nothing can be told apart
+    rows, blob_paths, hashes = references
+
+    present = {match_key(key, store) for key in files}
+    referenced, dangling = set(), []
+    for image_id, file_path in rows:
+        key = match_key(file_path, store)
+        referenced.add(key)
+        # Rows outside the walked folders are checked one by one
+        if key not in present and not os.path.exists(store.resolve(file_path)):
+            dangling.append((image_id, file_path))
+    referenced.update(match_key(path, store) for path in blob_paths)
+    referenced.update(journaled_paths(store))
+
+    cutoff = time.time() - GRACE_SECONDS
+    orphans = [(key, size) for key, (size, mtime) in files.items()
+               if is_store_file(key, store) and mtime < cutoff
+               and match_key(key, store) not in referenced and content_hash(key) not in hashes]
+    return ReconcileReport(len(files), dangling, orphans, sum(size for _, size in orphans))
+
+
+def content_hash(key):
+    """The SHA-256 a store or cold storage file is named by"""
+    return os.path.splitext(os.path.basename(key))[0]
+
+
+def is_store_file(key, store):
+    """Only the content store and cold storage are ever collected.
+
+    Both hold files named by their hash; anything else there (a copy still
+    being written, say), and the older per-patient folders, are left alone.
+    """
+    if os.path.isabs(key):
+        cold_storage = store.settings["cold_storage"]
+        if not (cold_storage and key.startswith(os.path.abspath(cold_storage) + os.sep)):
+            return False
+        return bool(re.match(r"^[0-9a-f]{64}\.\w+$", os.path.basename(key)))
+    return store.in_layout(key)
+
+
+def collect_garbage(orphans, db=None, store=None, batch_size=100, pause=0.1, progress=print):
+    """Delete orphan files in batches; returns (files removed, bytes freed).
+
+    Every batch is checked against the database again, by content hash, and
+    files touched since the scan are kept, so an import running meanwhile is
+    safe. The pause between batches keeps the disk free for the application.
+    """
+    db = db or DatabaseHelper()
+    store = store or ImageStore()
+    removed = freed = 0
+    cutoff = time.time() - GRACE_SECONDS
+    for start in range(0, len(orphans), batch_size):
+        batch = orphans[start:start + batch_size]
+        in_use = db.get_referenced_hashes([content_hash(key) for key, _ in batch])
+        for key, size in batch:
+            path = store.resolve(key)
+            if not is_store_file(key, store) or content_hash(key) in in_use:
+                continue
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                os.remove(path)
+                removed += 1
+                freed += size
+            except OSError:
+                pass  # Already gone or locked; the next run tries again
+        progress(f"Image store: removed {removed} orphan file(s), {freed / (1024 * 1024):.1f} MB")
+        time.sleep(pause)
+    return removed, freed
+
+
+def release_files(record_paths, db=None, store=None):
+    """Delete the files of removed lab image rows that nothing else uses any more.
+
+    Store files are shared by content: an import running meanwhile may have
+    found the same content and not committed yet. They go through the same
+    checks as collect_garbage, so one touched within the grace period is
+    left for a later collection.
+    """
+    db = db or DatabaseHelper()
+    store = store or ImageStore()
+    in_use = db.get_referenced_paths(record_paths)
+    shared = []
+    for record_path in record_paths:
+        path = store.resolve(record_path)
+        if record_path in in_use or not path.startswith(store.image_root + os.sep):
+            continue
+        key = store.relative(path)
+        if is_store_file(key, store):
+            try:
+                shared.append((key, os.path.getsize(path)))
+            except OSError:
+                pass  # Already gone
+            continue
+        try:
+            os.remove(path)
+            print(f"Deleted image file: {path}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Warning: Could not delete file {path}: {e}")
+    if shared:
+        collect_garbage(shared, db, store, pause=0, progress=lambda text: None)
+
+
+def maintain_image_store(repair=False, collect=False, progress=None):
+    """Reconcile, then delete dangling rows and collect orphans only if asked (runs on a worker)"""
+    db, store = DatabaseHelper(), ImageStore()
+    report = reconcile(db, store)
+    if repair and report.dangling_rows:
+        db.delete_lab_image_rows([image_id for image_id, _ in report.dangling_rows])
+    if collect:
+        collect_garbage(report.orphan_files, db, store, progress=progress or (lambda text: None))
+    return report
+
+
+def describe_report(report, repaired=False, collected=False):
+    lines = [f"Image store: {report.scanned} file(s) checked"]
+    if report.dangling_rows:
+        action = "removed" if repaired else "left in place (run image_reconcile.py --repair to remove)"
+        lines.append(f"{len(report.dangling_rows)} lab image row(s) point at missing files, {action}")
+    if report.orphan_files:
+        action = "collected" if collected else "kept (run image_reconcile.py --collect to delete)"
+        lines.append(f"{len(report.orphan_files)} unused file(s), "
+                     f"{report.orphan_bytes / (1024 * 1024):.1f} MB, {action}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    repair = "--repair" in sys.argv
+    collect = "--collect" in sys.argv
+    report = maintain_image_store(repair, collect, progress=print)
+    print(describe_report(report, repair, collect))
+    for image_id, file_path in report.dangling_rows[:50]:
+        print(f"  missing: row {image_id} {file_path}")
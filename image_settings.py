@@ -0,0 +1,33 @@
+# image_settings.py
+import json
+import os
+
+IMAGE_SETTINGS_PATH = "image_settings.json"
+
+# Used for every key the settings file leaves out; without a file, images are
+# stored exactly as imported
+DEFAULT_SETTINGS = {
+    "transcode": False,          # Store a re-encoded working copy instead of the original
+    "format": "JPEG",            # JPEG or WEBP
+    "quality": 85,
+    "max_size": [2400, 2400],    # The working copy is fitted inside this
+    "cold_storage": None,        # Folder for the untouched originals, or None to not keep them
+    "image_root": None,          # Where patient images live; None for patient_images next to the app
+}
+
+
+def load_image_settings(path=IMAGE_SETTINGS_PATH):
+    """Read the optional image settings file, e.g. {"transcode": true, "quality": 80}"""
+    settings = dict(DEFAULT_SETTINGS)
+    if os.path.exists(path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                settings.update(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Could not read {path}, using the default image settings: {e}")
+    settings["format"] = str(settings["format"]).upper()
+    if settings["format"] not in ("JPEG", "WEBP"):
+        print(f"Unsupported image format {settings['format']}; using JPEG")
+        settings["format"] = "JPEG"
+    settings["max_size"] = tuple(settings["max_size"])
+    return settings
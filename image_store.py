@@ -0,0 +1,177 @@
+# image_store.py
+import os
+import re
+import shutil
+import threading
+from typing import NamedTuple
+from PIL import Image, ImageOps
+from image_cache import file_sha256
+from image_settings import load_image_settings
+
+IMAGE_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "patient_images")
+
+EXTENSIONS = {"JPEG": ".jpg", "WEBP": ".webp"}
+
+# The folder older rows hold absolute paths under, from another machine or app folder
+LEGACY_ROOT_NAME = "patient_images"
+
+
+class StoredImage(NamedTuple):
+    sha256: str              # Of the imported original
+    path: str                # The file the viewer uses
+    copied: bool             # False if the content was already in the store
+    size: int
+    original_size: int
+    original_path: str       # Copy in cold storage, if one is kept
+    pixels: int
+    original_pixels: int
+
+
+def image_pixels(path):
+    """Width x height from the file header, without decoding the image"""
+    try:
+        with Image.open(path) as image:
+            return image.width * image.height
+    except Exception:
+        return None
+
+
+def transcode(source_path, target_path, image_format, quality, max_size):
+    """Write a re-encoded copy of an image, fitted inside max_size"""
+    with Image.open(source_path) as source:
+        source.draft("RGB", (max(max_size), max(max_size)))  # JPEG decodes at a reduced scale
+        image = ImageOps.exif_transpose(source)  # Keep phone photos upright; EXIF is dropped
+        if image.mode in ("RGBA", "LA", "P"):
+            # Flatten transparency onto white, as the sheet would be printed
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        else:
+            image = image.convert("RGB")
+    image.thumbnail(max_size, Image.Resampling.LANCZOS)
+    if image_format == "WEBP":
+        image.save(target_path, "WEBP", quality=quality, method=4)
+    else:
+        image.save(target_path, "JPEG", quality=quality, optimize=True)
+
+
+class ImageStore:
+    """Lab image files stored once, named by the SHA-256 of their content.
+
+    The same scan attached to several checkups or patients is a single file;
+    LabImages rows point at it and ImageBlobs counts those rows, so the file
+    is only deleted when nothing refers to it any more. Files fan out over
+    two levels of folders by their leading hex digits (store/ab/cd/abcd...),
+    so no folder grows past a few hundred entries. The database keeps paths
+    relative to the image root (see relative() and resolve()), so the root
+    can be moved, and set in image_settings.json, without rewriting rows.
+
+    With transcoding on (see image_settings.py) the stored file is a
+    size-capped JPEG or WebP working copy, still named by the hash of the
+    original, and the original can be kept in a cold storage folder. Safe to
+    use from worker threads.
+    """
+
+    def __init__(self, image_root=None, settings=None):
+        self.settings = settings if settings is not None else load_image_settings()
+        self.image_root = os.path.abspath(image_root or self.settings["image_root"] or IMAGE_ROOT)
+        self.root = os.path.join(self.image_root, "store")
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, digest, source_path):
+        if self.settings["transcode"]:
+            extension = EXTENSIONS[self.settings["format"]]
+        else:
+            extension = os.path.splitext(source_path)[1].lower()
+        return self.layout_path(digest, extension)
+
+    def layout_path(self, digest, extension):
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}{extension}")
+
+    def relative(self, path):
+        """The path to store in the database: relative to the image root when inside it"""
+        path = os.path.abspath(path)
+        if path.startswith(self.image_root + os.sep):
+            return os.path.relpath(path, self.image_root).replace(os.sep, "/")
+        return path
+
+    def resolve(self, stored_path):
+        """The file a database path refers to; older rows hold absolute paths"""
+        if os.path.isabs(stored_path) or re.match(r"^[A-Za-z]:[\\/]", stored_path):
+            return stored_path
+        return os.path.join(self.image_root, *stored_path.split("/"))
+
+    def legacy_relative(self, stored_path):
+        """The part of an absolute path below an image root folder, or None.
+
+        Older rows hold absolute paths, possibly from another machine or from
+        before the application folder moved; that part still names the file.
+        """
+        parts = re.split(r"[\\/]", stored_path)
+        names = {LEGACY_ROOT_NAME, os.path.basename(self.image_root).lower()}
+        for index in range(len(parts) - 2, -1, -1):
+            if parts[index].lower() in names:
+                return "/".join(parts[index + 1:])
+        return None
+
+    def locate(self, stored_path):
+        """The file a database path refers to, finding older absolute paths under this root"""
+        path = self.resolve(stored_path)
+        if path == stored_path and not os.path.exists(path):
+            relative = self.legacy_relative(stored_path)
+            if relative and os.path.exists(self.resolve(relative)):
+                return self.resolve(relative)
+        return path
+
+    def in_layout(self, stored_path):
+        """True for a relative path already in the store's fan-out layout"""
+        return bool(re.match(r"^store/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$", stored_path))
+
+    def add(self, source_path, digest=None):
+        """Store a file and return a StoredImage.
+
+        A file whose content is already in the store is not copied again.
+        """
+        digest = digest or file_sha256(source_path)
+        stored_path = self.path_for(digest, source_path)
+        copied = not os.path.exists(stored_path)
+        if copied:
+            os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+            temp_path = f"{stored_path}.{threading.get_ident()}.tmp"
+            if self.settings["transcode"] and self.needs_transcode(source_path):
+                transcode(source_path, temp_path, self.settings["format"],
+                          self.settings["quality"], self.settings["max_size"])
+            else:
+                shutil.copy2(source_path, temp_path)
+            os.replace(temp_path, stored_path)
+        else:
+            os.utime(stored_path)  # Recently used, so orphan collection waits for the commit
+        original_path = self.keep_original(source_path, digest)
+        pixels = image_pixels(stored_path)
+        original_pixels = image_pixels(source_path) if self.settings["transcode"] else pixels
+        return StoredImage(digest, stored_path, copied, os.path.getsize(stored_path),
+                           os.path.getsize(source_path), original_path, pixels, original_pixels)
+
+    def needs_transcode(self, source_path):
+        """False for a file already in the working format and within the size cap"""
+        try:
+            with Image.open(source_path) as image:
+                max_width, max_height = self.settings["max_size"]
+                return not (image.format == self.settings["format"]
+                            and image.width <= max_width and image.height <= max_height)
+        except Exception:
+            return False  # Not an image Pillow can read; store it as it is
+
+    def keep_original(self, source_path, digest):
+        """Copy the untouched original to cold storage, if configured"""
+        cold_storage = self.settings["cold_storage"]
+        if not (self.settings["transcode"] and cold_storage):
+            return None
+        original_path = os.path.join(cold_storage, f"{digest}{os.path.splitext(source_path)[1].lower()}")
+        if not os.path.exists(original_path):
+            os.makedirs(cold_storage, exist_ok=True)
+            temp_path = f"{original_path}.{threading.get_ident()}.tmp"
+            shutil.copy2(source_path, temp_path)
+            os.replace(temp_path, original_path)
+        return original_path
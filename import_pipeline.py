@@ -0,0 +1,176 @@
+# import_pipeline.py
+import json
+import os
+import time
+from image_cache import THUMBNAIL
+from image_store import ImageStore
+from perceptual_hash import dhash, to_hex
+
+JOURNAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "patient_images", "import_journal")
+
+
+class ImportJournal:
+    """The files of a patient's unfinished import, as JSON lines.
+
+    The first line lists the source files; one line follows per file stored.
+    The journal is removed once the checkup is committed, so after a crash
+    or a closed window it tells which files to reopen, and the files already
+    stored (same path, size and mtime) are not hashed or copied again.
+    """
+
+    def __init__(self, patient_id, journal_dir=JOURNAL_DIR):
+        self.path = os.path.join(journal_dir, f"patient_{patient_id}.jsonl")
+        os.makedirs(journal_dir, exist_ok=True)
+
+    def read(self):
+        """Return (source paths, {source path: stored entry}) of an unfinished import"""
+        sources, stored = [], {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # A line cut short by the interruption
+                    if "sources" in entry:
+                        sources = entry["sources"]
+                    else:
+                        stored[entry["source"]] = entry
+        except OSError:
+            pass
+        return sources, stored
+
+    def start(self, sources):
+        self._append({"sources": sources})
+
+    def record(self, entry):
+        self._append(entry)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _append(self, entry):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+
+class ImportPipeline:
+    """Saves a batch of scans to a patient's record in two stages.
+
+    1. Every file is hashed, copied into the content store and given its
+       thumbnail on the worker pool, several files at a time; images saved
+       before content and perceptual hashing are hashed alongside.
+    2. commit() writes the checkup and all image rows in one transaction.
+
+    Progress (files, MB/s, images/s) goes to on_progress on the Tk thread,
+    and every stored file is journaled, so an interrupted import resumes.
+    """
+
+    def __init__(self, pool, db, cache, patient_id, store=None):
+        self.pool = pool
+        self.db = db
+        self.cache = cache
+        self.patient_id = patient_id
+        self.store = store or ImageStore()
+        self.journal = ImportJournal(patient_id)
+
+    def run(self, sources, on_progress, on_done, on_error):
+        """Store sources, given as (path, dhash or None); on_done gets the stored entries.
+
+        An entry is a dict with source, source_mtime_ns, sha256, stored_path,
+        dhash (hex), copied, and the size and pixel counts of the original and
+        of the stored file.
+        """
+        _, journaled = self.journal.read()
+        self.journal.start([path for path, _ in sources])
+        entries, failures = [], []
+        total = len(sources)
+        started = time.monotonic()
+        progress = {"files": 0, "bytes": 0, "jobs": total + 1}
+
+        def report():
+            elapsed = max(time.monotonic() - started, 0.001)
+            on_progress(f"Saving images: {progress['files']}/{total}, "
+                        f"{progress['bytes'] / (1024 * 1024) / elapsed:.1f} MB/s, "
+                        f"{progress['files'] / elapsed:.1f} images/s")
+
+        def finished(entry=None, error=None):
+            if error is not None:
+                failures.append(error)
+            elif entry is not None:
+                if not entry.pop("resumed", False):
+                    self.journal.record(entry)
+                    progress["bytes"] += entry["original_size"]
+                entries.append(entry)
+                progress["files"] += 1
+                report()
+            progress["jobs"] -= 1
+            if progress["jobs"]:
+                return
+            if failures:
+                on_error(failures[0])
+            else:
+                on_done(entries)
+
+        report()
+        self.pool.submit(self.hash_older_images, on_done=finished,
+                         on_error=lambda error: finished(error=error))
+        for path, value in sources:
+            entry = self.resumable(journaled.get(path))
+            if entry:
+                finished(entry)
+                continue
+            self.pool.submit(
+                lambda path=path, value=value: self.store_file(path, value),
+                on_done=finished,
+                on_error=lambda error: finished(error=error),
+            )
+
+    def resumable(self, entry):
+        """The journaled entry of a file stored by an interrupted run, if still valid"""
+        if not entry or not os.path.exists(entry["stored_path"]):
+            return None
+        try:
+            stat = os.stat(entry["source"])
+        except OSError:
+            return None
+        if (stat.st_size, stat.st_mtime_ns) != (entry["original_size"], entry["source_mtime_ns"]):
+            return None
+        return dict(entry, resumed=True)
+
+    def store_file(self, path, value=None):
+        """Hash, store (transcoding if configured) and render one file (runs on a worker)"""
+        mtime_ns = os.stat(path).st_mtime_ns
+        stored = self.store.add(path, self.cache.source_hash(path))
+        # Renditions are keyed by content, and a saved image is opened from the
+        # stored copy, which differs from the source when it was transcoded
+        self.cache.prepare(stored.path)
+        if value is None:
+            value = dhash(self.cache.get(stored.path, THUMBNAIL))
+        entry = stored._asdict()
+        entry.update(stored_path=entry.pop("path"), source=path, source_mtime_ns=mtime_ns, dhash=to_hex(value))
+        return entry
+
+    def hash_older_images(self):
+        """Record the SHA-256 of images saved before the content store (runs on a worker)"""
+        hashes = []
+        for image_id, record_path in self.db.get_unhashed_lab_images(self.patient_id):
+            path = self.store.locate(record_path)
+            if os.path.exists(path):
+                hashes.append((self.cache.source_hash(path), image_id))
+        if hashes:
+            self.db.set_lab_image_hashes(hashes)
+
+    def commit(self, checkup_data, images):
+        """Write the checkup and its image rows in one transaction, then drop the journal"""
+        # Rows keep paths relative to the image root, so the root can move
+        images = [dict(image, stored_path=self.store.relative(image["stored_path"])) for image in images]
+        checkup_id = self.db.add_lab_checkup(checkup_data, images)
+        self.journal.clear()
+        return checkup_id
+
+    def abandon(self):
+        self.journal.clear()
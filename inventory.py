@@ -0,0 +1,142 @@
+# inventory.py
+import tkinter as tk
+from tkinter import ttk, messagebox, simpledialog
+from db_helper import DatabaseHelper
+from virtual_list import VirtualList
+
+
+class InventoryWindow(tk.Toplevel):
+    """Stock on hand per medicine, with receipts, counts and the ledger history.
+
+    Levels come from the MedicineStock running totals, so the list and the
+    low-stock view are paged indexed reads; the ledger is only read for the
+    medicine that is selected.
+    """
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("Medicine Inventory")
+        self.geometry("900x600")
+        self.configure(bg="#e6f7ff")
+        self.db = DatabaseHelper()
+        self._filter_job = None
+
+        # Search and low stock filter
+        filter_frame = tk.Frame(self, bg="#e6f7ff")
+        filter_frame.pack(side="top", fill="x", padx=10, pady=5)
+        tk.Label(filter_frame, text="Search:", bg="#e6f7ff").pack(side="left")
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(filter_frame, textvariable=self.search_var, width=30)
+        search_entry.pack(side="left", padx=5)
+        search_entry.bind("<KeyRelease>", self.on_search_key)
+        self.low_only_var = tk.BooleanVar()
+        tk.Checkbutton(filter_frame, text="Low stock only", variable=self.low_only_var,
+                       bg="#e6f7ff", command=self.apply_filter).pack(side="left", padx=10)
+
+        # Stock actions
+        button_frame = tk.Frame(self, bg="#e6f7ff")
+        button_frame.pack(side="bottom", fill="x", padx=10, pady=5)
+        tk.Button(button_frame, text="Receive Stock", bg="#2ecc71", fg="white", padx=10, pady=5,
+                  command=self.receive_stock).pack(side="left", padx=5)
+        tk.Button(button_frame, text="Record Count", bg="#3498db", fg="white", padx=10, pady=5,
+                  command=self.record_count).pack(side="left", padx=5)
+        tk.Button(button_frame, text="Set Reorder Level", bg="#3498db", fg="white", padx=10, pady=5,
+                  command=self.set_reorder_level).pack(side="left", padx=5)
+        tk.Button(button_frame, text="Close", bg="#e74c3c", fg="white", padx=10, pady=5,
+                  command=self.destroy).pack(side="right", padx=5)
+
+        # Ledger of the selected medicine
+        ledger_frame = tk.LabelFrame(self, text="Stock History", bg="#e6f7ff")
+        ledger_frame.pack(side="bottom", fill="x", padx=10, pady=5)
+        self.ledger_tree = ttk.Treeview(ledger_frame, columns=("Date", "Change", "Kind", "Reference", "Note"),
+                                        show="headings", height=6)
+        for column, width in (("Date", 140), ("Change", 70), ("Kind", 90), ("Reference", 180), ("Note", 250)):
+            self.ledger_tree.heading(column, text=column)
+            self.ledger_tree.column(column, width=width)
+        self.ledger_tree.pack(fill="x", padx=5, pady=5)
+
+        # Stock levels, paged from the database
+        self.stock_list = VirtualList(
+            self,
+            columns=("ID", "Brand", "Generic", "OnHand", "Reorder"),
+            headings=("ID", "Brand Name", "Generic Name", "On Hand", "Reorder Level"),
+            fetch_page=lambda offset, limit: self.db.get_stock_page(
+                self.search_var.get(), offset, limit, self.low_only_var.get()),
+            count_rows=lambda: self.db.count_stock(self.search_var.get(), self.low_only_var.get()),
+        )
+        self.stock_list.pack(side="top", fill="both", expand=True, padx=10)
+        self.stock_list.tree.column("ID", width=50)
+        self.stock_list.tree.bind("<<TreeviewSelect>>", self.on_select, add="+")
+
+        self.stock_list.refresh()
+        search_entry.focus_set()
+
+    def on_search_key(self, event=None):
+        """Re-run the filter shortly after typing stops"""
+        if self._filter_job:
+            self.after_cancel(self._filter_job)
+        self._filter_job = self.after(150, self.apply_filter)
+
+    def apply_filter(self):
+        self._filter_job = None
+        self.stock_list.refresh()
+
+    def on_select(self, event=None):
+        stock = self.stock_list.selected_row()
+        self.ledger_tree.delete(*self.ledger_tree.get_children())
+        if stock:
+            for entry in self.db.get_stock_ledger(stock.medicine_id):
+                change = f"+{entry.change}" if entry.change > 0 else str(entry.change)
+                self.ledger_tree.insert("", tk.END, values=(entry.created_at, change, entry.kind,
+                                                            entry.reference or "", entry.note or ""))
+
+    def selected_stock(self):
+        stock = self.stock_list.selected_row()
+        if not stock:
+            messagebox.showwarning("Inventory", "Please select a medicine first.", parent=self)
+        return stock
+
+    def receive_stock(self):
+        stock = self.selected_stock()
+        if not stock:
+            return
+        quantity = simpledialog.askinteger("Receive Stock", f"Units of {stock.brand} received:",
+                                           minvalue=1, parent=self)
+        if quantity:
+            note = simpledialog.askstring("Receive Stock", "Note (supplier, batch...):", parent=self) or ""
+            self.post(stock, quantity, "receipt", note)
+
+    def record_count(self):
+        """Post an adjustment so the stock matches a physical count"""
+        stock = self.selected_stock()
+        if not stock:
+            return
+        counted = simpledialog.askinteger("Record Count", f"Units of {stock.brand} counted on the shelf:",
+                                          minvalue=0, parent=self)
+        if counted is None:
+            return
+        try:
+            self.db.record_stock_count(stock.medicine_id, counted, f"Counted {counted}")
+        except Exception as e:
+            messagebox.showerror("Inventory", f"Could not record stock: {e}", parent=self)
+            return
+        self.stock_list.reload()
+
+    def set_reorder_level(self):
+        stock = self.selected_stock()
+        if not stock:
+            return
+        level = simpledialog.askinteger("Reorder Level", f"Reorder {stock.brand} at or below:",
+                                        minvalue=0, initialvalue=stock.reorder_level, parent=self)
+        if level is not None:
+            self.db.set_reorder_level(stock.medicine_id, level)
+            self.stock_list.reload()
+
+    def post(self, stock, change, kind, note):
+        try:
+            self.db.post_stock(stock.medicine_id, change, kind, note)
+        except Exception as e:
+            messagebox.showerror("Inventory", f"Could not record stock: {e}", parent=self)
+            return
+        self.stock_list.reload()
+        self.on_select()
@@ -3,9 +3,127 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from PIL import Image, ImageTk
 import os
-import shutil
+from collections import OrderedDict
 from datetime import datetime
 from db_helper import DatabaseHelper
+from background import WorkerPool
+from image_cache import get_rendition_cache, PREVIEW, THUMBNAIL
+from image_store import ImageStore
+from perceptual_hash import BKTree, dhash, to_hex, DUPLICATE_DISTANCE
+from import_pipeline import ImportPipeline, ImportJournal
+from image_reconcile import release_files
+
+class ImageTab:
+    """One notebook tab: a placeholder until the image is shown (or after it is unloaded)"""
+    
+    def __init__(self, notebook, file_path, record_path=None):
+        self.file_path = file_path
+        self.record_path = record_path  # LabImages.file_path, for images already saved
+        self.photo = None  # PhotoImage while decoded
+        self.view = None   # Canvas and scrollbars while decoded
+        self.loading = False    # A worker is decoding the preview
+        self.preparing = False  # A worker is rendering the renditions of a new import
+        self.dhash = None         # Perceptual hash, computed at import
+        self.duplicate_of = None  # Saved or imported image this one looks like
+        self.frame = ttk.Frame(notebook)
+        self.placeholder = tk.Label(self.frame, text="Loading image...", bg="white", fg="#7f8c8d")
+        self.placeholder.pack(fill=tk.BOTH, expand=True)
+    
+    def show(self, photo):
+        """Replace the placeholder with a scrollable canvas holding the image"""
+        self.photo = photo
+        self.placeholder.pack_forget()
+        self.view = ttk.Frame(self.frame)
+        self.view.pack(fill=tk.BOTH, expand=True)
+        canvas = tk.Canvas(self.view, bg="white")
+        h_scroll = ttk.Scrollbar(self.view, orient=tk.HORIZONTAL, command=canvas.xview)
+        v_scroll = ttk.Scrollbar(self.view, orient=tk.VERTICAL, command=canvas.yview)
+        canvas.configure(xscrollcommand=h_scroll.set, yscrollcommand=v_scroll.set)
+        h_scroll.pack(side=tk.BOTTOM, fill=tk.X)
+        v_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        canvas.create_image(0, 0, anchor="nw", image=photo)
+        canvas.configure(scrollregion=(0, 0, photo.width(), photo.height()))
+    
+    def unload(self):
+        """Free the decoded image; it is decoded again when the tab is next selected"""
+        if self.view is not None:
+            self.view.destroy()
+            self.view = None
+        self.photo = None
+        self.placeholder.config(text="Loading image...", fg="#7f8c8d")
+        self.placeholder.pack(fill=tk.BOTH, expand=True)
+    
+    def memory_bytes(self):
+        """Approximate size of the decoded image held by Tk"""
+        return self.photo.width() * self.photo.height() * 4 if self.photo else 0
+    
+    def show_progress(self, message):
+        if self.photo is None:
+            self.placeholder.config(text=message)
+    
+    def show_error(self, message):
+        self.placeholder.config(text=message, fg="#e74c3c")
+
+
+class ViewerMemory:
+    """Decoded images of every open Lab Charts window, kept under a memory budget.
+
+    Each shown tab is charged its width x height x 4 bytes. When the total goes
+    past max_bytes the least recently viewed tabs are unloaded back to their
+    placeholder (never one that is on screen); selecting such a tab decodes it
+    again from the rendition cache, which is cheap.
+    """
+    
+    def __init__(self, max_bytes=96 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self._tabs = OrderedDict()  # ImageTab -> bytes, least recently viewed first
+    
+    def add(self, tab):
+        self.release(tab)
+        self._tabs[tab] = tab.memory_bytes()
+        self.used_bytes += self._tabs[tab]
+        self._evict()
+    
+    def touch(self, tab):
+        if tab in self._tabs:
+            self._tabs.move_to_end(tab)
+    
+    def release(self, tab):
+        """Stop counting a tab that was unloaded, deleted or closed"""
+        self.used_bytes -= self._tabs.pop(tab, 0)
+    
+    def stats(self):
+        return (f"Images in memory: {self.used_bytes / (1024 * 1024):.1f} of "
+                f"{self.max_bytes / (1024 * 1024):.0f} MB")
+    
+    def _evict(self):
+        for tab in list(self._tabs)[:-1]:  # The newest stays even if it alone is over budget
+            if self.used_bytes <= self.max_bytes:
+                break
+            if tab.frame.winfo_ismapped():
+                continue  # On screen in some window
+            self.release(tab)
+            tab.unload()
+
+
+# Shared by all Lab Charts windows, so several open windows stay within one budget
+viewer_memory = ViewerMemory()
+
+
+def prepare_import(cache, file_path):
+    """Render the standard renditions of a new file and return its perceptual hash"""
+    cache.prepare(file_path)
+    return dhash(cache.get(file_path, THUMBNAIL))
+
+
+def decode_preview(cache, file_path):
+    """Decode the preview rendition of a file (runs on a worker thread)"""
+    with Image.open(cache.get(file_path, PREVIEW)) as image:
+        image.load()
+    return image
+
 
 class LabChartsWindow:
     def __init__(self, parent, patient_name, patient_id=None, new_files=None):
@@ -18,24 +136,43 @@ class LabChartsWindow:
         self.parent = parent
         self.patient_name = patient_name
         self.patient_id = patient_id
-        self.images = []  # Store tuples of (photo, file_path)
+        self.images = []  # ImageTab per notebook tab, same order
         self.db = DatabaseHelper()
+        self.cache = get_rendition_cache()  # Resized copies, so scans are not decoded on every open
+        # Decoding, resizing and copying run here; only PhotoImages are made on the Tk thread
+        self.pool = WorkerPool(self.window)
+        self.import_total = self.import_done = 0
+        self.progress_text = ""
+        # Perceptual hashes of the patient's saved images and of this import
+        self.duplicate_index = None
+        self.unchecked_tabs = []  # Imported before the index was ready
+        self.saving = False
         
-        # Create a directory to store patient images if it doesn't exist
-        self.image_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "patient_images")
-        os.makedirs(self.image_dir, exist_ok=True)
+        # Saved images, one file per distinct content, under the configured image root
+        self.store = ImageStore()
+        self.image_dir = self.store.image_root
         
         # Create UI
         self.create_widgets()
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
         
         # Load existing or new files
+        if patient_id:
+            self.pool.submit(self.load_duplicate_index, on_done=self.set_duplicate_index,
+                             on_error=lambda error: self.set_duplicate_index(BKTree()))
+        else:
+            self.duplicate_index = BKTree()
+        self.update_save_state()
         if patient_id:
             # Load existing images from database
             self.load_patient_images()
             
         # If new files were provided, add them
         if new_files:
-            self.add_new_files(new_files)
+            self.add_new_files(new_files, imported=True)
+        
+        if patient_id:
+            self.offer_resume()
     
     def create_widgets(self):
         self.main_frame = tk.Frame(self.window, bg="#e6f7ff")
@@ -43,6 +180,7 @@ class LabChartsWindow:
         
         self.notebook = ttk.Notebook(self.main_frame)
         self.notebook.pack(fill=tk.BOTH, expand=True)
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
         
         btn_frame = tk.Frame(self.main_frame, bg="#e6f7ff")
         btn_frame.pack(fill=tk.X, pady=10)
@@ -64,20 +202,47 @@ class LabChartsWindow:
         delete_btn.pack(side=tk.LEFT, padx=5)
         
         # "Save to Checkup" button
-        save_btn = tk.Button(btn_frame, text="Save to Checkup", 
+        self.save_btn = tk.Button(btn_frame, text="Save to Checkup", 
                            command=self.save_to_checkup,
                            bg="#2ecc71", fg="white",
                            padx=20, pady=5,
                            font=("Arial", 10, "bold"))
-        save_btn.pack(side=tk.LEFT, padx=5)
+        self.save_btn.pack(side=tk.LEFT, padx=5)
         
         # "Close" button
         close_btn = tk.Button(btn_frame, text="Close", 
-                            command=self.window.destroy,
+                            command=self.close,
                             bg="#e74c3c", fg="white",
                             padx=20, pady=5,
                             font=("Arial", 10, "bold"))
         close_btn.pack(side=tk.RIGHT, padx=5)
+        
+        # Rendition cache statistics
+        self.status_label = tk.Label(btn_frame, text="", bg="#e6f7ff", fg="#7f8c8d", font=("Arial", 9))
+        self.status_label.pack(side=tk.RIGHT, padx=10)
+    
+    def update_status(self):
+        if self.progress_text:
+            self.status_label.config(text=self.progress_text)
+        else:
+            self.status_label.config(text=f"{viewer_memory.stats()}  |  {self.cache.stats()}")
+    
+    def set_progress(self, text=""):
+        self.progress_text = text
+        self.update_status()
+    
+    def update_save_state(self):
+        """Save waits until every imported image has been checked for duplicates"""
+        ready = not self.saving and self.import_total == 0 and self.duplicate_index is not None
+        self.save_btn.config(state=tk.NORMAL if ready else tk.DISABLED)
+    
+    def close(self):
+        """Cancel queued decodes and copies, then close the window"""
+        self.pool.cancel()
+        for tab in self.images:
+            viewer_memory.release(tab)
+        self.cache.flush()
+        self.window.destroy()
     
     def load_patient_images(self):
         """Load existing patient images from the database"""
@@ -86,70 +251,180 @@ class LabChartsWindow:
             
         image_paths = self.db.get_patient_lab_images(self.patient_id)
         if image_paths:
-            valid_paths = []
+            valid_paths, record_paths = [], []
             for path in image_paths:
-                if os.path.exists(path):
-                    valid_paths.append(path)
-                else:
-                    print(f"Warning: Image file not found: {path}")
+                # Paths are stored relative to the image root
+                full_path = self.store.locate(path)
+                if os.path.exists(full_path):
+                    valid_paths.append(full_path)
+                    record_paths.append(path)
+            
+            # Rows whose file is gone are reported and repaired by image_reconcile.py
+            missing = len(image_paths) - len(valid_paths)
+            if missing:
+                self.set_progress(f"{missing} saved image(s) of this patient are missing from the image store")
+                self.window.after(8000, self.set_progress)
             
             if valid_paths:
-                self.add_new_files(valid_paths)
+                self.add_new_files(valid_paths, record_paths=record_paths)
                 print(f"Loaded {len(valid_paths)} existing images for patient {self.patient_name}")
     
-    def add_new_files(self, files):
-        for file_path in files:
-            try:
-                # Validate file exists
-                if not os.path.exists(file_path):
-                    messagebox.showwarning("File Not Found", f"Cannot find file: {file_path}")
+    def add_new_files(self, files, imported=False, record_paths=None):
+        """Add a tab per file; images are only decoded when their tab is shown"""
+        added = 0
+        for file_path, record_path in zip(files, record_paths or [None] * len(files)):
+            # Validate file exists
+            if not os.path.exists(file_path):
+                messagebox.showwarning("File Not Found", f"Cannot find file: {file_path}")
+                continue
+            
+            # Create a new tab with a placeholder until it is first selected
+            tab = ImageTab(self.notebook, file_path, record_path)
+            self.images.append(tab)
+            self.notebook.add(tab.frame, text=os.path.basename(file_path))
+            added += 1
+            
+            if imported:
+                # Render the thumbnail and preview once, at import, on a worker
+                tab.preparing = True
+                tab.show_progress("Preparing image...")
+                self.import_total += 1
+                self.pool.submit(
+                    lambda path=file_path: prepare_import(self.cache, path),
+                    on_done=lambda value, tab=tab: self.finish_prepare(tab, value),
+                    on_error=lambda error, tab=tab: self.finish_prepare(tab, error=error),
+                )
+        
+        if self.import_total:
+            self.set_progress(f"Preparing images: {self.import_done}/{self.import_total}")
+        self.update_save_state()
+        if added:
+            # Show the last added image (this loads it and its neighbours)
+            self.notebook.select(self.notebook.index(tk.END) - 1)
+        self.update_status()
+    
+    def on_tab_changed(self, event=None):
+        """Decode the selected image, then prefetch the tabs on either side"""
+        if not self.notebook.tabs():
+            return
+        index = self.notebook.index(self.notebook.select())
+        viewer_memory.touch(self.images[index])
+        self.show_image(index)
+        for neighbour in (index + 1, index - 1):
+            if 0 <= neighbour < len(self.images):
+                self.window.after_idle(self.show_image, neighbour)
+    
+    def finish_prepare(self, tab, value=None, error=None):
+        tab.preparing = False
+        if error is not None:
+            print(f"Could not prepare renditions for {tab.file_path}: {error}")
+        elif tab in self.images:
+            tab.dhash = value
+            self.check_duplicate(tab)
+        self.import_done += 1
+        if self.import_done >= self.import_total:
+            self.import_total = self.import_done = 0
+            self.set_progress()
+        else:
+            self.set_progress(f"Preparing images: {self.import_done}/{self.import_total}")
+        self.update_save_state()
+        
+        if tab not in self.images:
+            return  # Deleted while it was being prepared
+        # Load it now if it is the tab on screen or next to it
+        index = self.images.index(tab)
+        if abs(index - self.notebook.index(self.notebook.select())) <= 1:
+            self.show_image(index)
+        else:
+            tab.show_progress("Loading image...")
+    
+    def offer_resume(self):
+        """Reopen the files of an import that was interrupted before it was saved"""
+        journal = ImportJournal(self.patient_id)
+        sources, _ = journal.read()
+        open_paths = {tab.file_path for tab in self.images}
+        sources = [path for path in sources if path not in open_paths and os.path.exists(path)]
+        if not sources:
+            return
+        if messagebox.askyesno(
+            "Unfinished Import",
+            f"Saving {len(sources)} image(s) for this patient was interrupted.\n"
+            "Open them again to finish saving?",
+            parent=self.window
+        ):
+            self.add_new_files(sources, imported=True)
+        else:
+            journal.clear()
+    
+    def load_duplicate_index(self):
+        """Index the perceptual hashes of the patient's saved images (runs on a worker).
+
+        Images saved before perceptual hashing get their hash computed and stored.
+        """
+        index, computed = BKTree(), []
+        for image_id, record_path, value in self.db.get_lab_image_dhashes(self.patient_id):
+            path = self.store.locate(record_path)
+            if value is None:
+                if not os.path.exists(path):
                     continue
-                
-                # Create a new tab
-                tab_frame = ttk.Frame(self.notebook)
-                tab_name = os.path.basename(file_path)
-                
-                # ...existing image display code...
-                
-                canvas = tk.Canvas(tab_frame, bg="white")
-                canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-                
-                h_scroll = ttk.Scrollbar(tab_frame, orient=tk.HORIZONTAL, command=canvas.xview)
-                v_scroll = ttk.Scrollbar(tab_frame, orient=tk.VERTICAL, command=canvas.yview)
-                
-                canvas.configure(xscrollcommand=h_scroll.set, yscrollcommand=v_scroll.set)
-                h_scroll.pack(side=tk.BOTTOM, fill=tk.X)
-                v_scroll.pack(side=tk.RIGHT, fill=tk.Y)
-                
-                # Process the image
-                pil_image = Image.open(file_path)
-                
-                # Scale image
-                canvas_width = 800
-                canvas_height = 600
-                width_ratio = canvas_width / pil_image.width
-                height_ratio = canvas_height / pil_image.height
-                scale_factor = min(width_ratio, height_ratio)
-                
-                new_width = int(pil_image.width * scale_factor)
-                new_height = int(pil_image.height * scale_factor)
-                
-                pil_image = pil_image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                
-                # Create PhotoImage and store
-                photo = ImageTk.PhotoImage(pil_image)
-                self.images.append((photo, file_path))
-                
-                # Add image to canvas
-                canvas.create_image(0, 0, anchor="nw", image=photo)
-                canvas.configure(scrollregion=(0, 0, new_width, new_height))
-                
-                # Add the tab
-                self.notebook.add(tab_frame, text=tab_name)
-                self.notebook.select(self.notebook.index(tk.END)-1)
-                
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to load image {file_path}: {str(e)}")
+                try:
+                    value = to_hex(dhash(self.cache.get(path, THUMBNAIL)))
+                except Exception as e:
+                    print(f"Could not hash {path}: {e}")
+                    continue
+                computed.append((value, image_id))
+            index.add(int(value, 16), path)
+        if computed:
+            self.db.set_lab_image_dhashes(computed)
+        return index
+    
+    def set_duplicate_index(self, index):
+        self.duplicate_index = index
+        unchecked, self.unchecked_tabs = self.unchecked_tabs, []
+        for tab in unchecked:
+            self.check_duplicate(tab)
+        self.update_save_state()
+    
+    def check_duplicate(self, tab):
+        """Flag an imported image that looks like a saved or already imported one"""
+        if self.duplicate_index is None:
+            self.unchecked_tabs.append(tab)
+            return
+        matches = [path for _, path in self.duplicate_index.search(tab.dhash, DUPLICATE_DISTANCE)
+                   if path != tab.file_path]
+        self.duplicate_index.add(tab.dhash, tab.file_path)
+        if matches and tab in self.images:
+            tab.duplicate_of = matches[0]
+            name = os.path.basename(tab.file_path)
+            self.notebook.tab(tab.frame, text=f"⚠ {name}")
+            print(f"{name} looks like a duplicate of {matches[0]}")
+    
+    def show_image(self, index):
+        """Decode the preview of a tab on a worker, then show it on the Tk thread"""
+        if index >= len(self.images):
+            return
+        tab = self.images[index]
+        if tab.photo is not None or tab.loading or tab.preparing:
+            return
+        tab.loading = True
+        tab.show_progress("Loading image...")
+        # The fit-to-view rendition, not the full scan
+        self.pool.submit(
+            lambda: decode_preview(self.cache, tab.file_path),
+            on_done=lambda image: self.finish_show(tab, image),
+            on_error=lambda error: self.finish_show(tab, error=error),
+        )
+    
+    def finish_show(self, tab, image=None, error=None):
+        tab.loading = False
+        if error is not None:
+            tab.show_error(f"Failed to load image {tab.file_path}: {str(error)}")
+        elif tab in self.images:  # Not deleted while it was decoding
+            tab.show(ImageTk.PhotoImage(image))
+            viewer_memory.add(tab)
+        if image is not None:
+            image.close()  # Tk holds its own copy of the pixels
+        self.update_status()
     
     def import_more_images(self):
         """Handle importing additional images into the existing window"""
@@ -162,7 +437,7 @@ class LabChartsWindow:
             filetypes=file_types
         )
         if files:
-            self.add_new_files(files)
+            self.add_new_files(files, imported=True)
             messagebox.showinfo("Success", f"Added {len(files)} new image(s) to the lab charts.")
     
     def save_to_checkup(self):
@@ -175,67 +450,78 @@ class LabChartsWindow:
             messagebox.showwarning("Warning", "No images to save.")
             return
         
+        if self.import_total or self.duplicate_index is None:
+            return  # Still being checked for duplicates; the button is disabled meanwhile
+        
+        # Images opened from the patient's record are already saved
+        sources = [tab for tab in self.images if tab.record_path is None]
+        if not sources:
+            self.finish_save([])
+            return
+        
+        # Let the user look again at images that resemble ones already saved or imported
+        duplicates = [tab for tab in sources if tab.duplicate_of]
+        if duplicates:
+            listing = "\n".join(f"{os.path.basename(tab.file_path)} looks like {os.path.basename(tab.duplicate_of)}"
+                                 for tab in duplicates[:10])
+            if not messagebox.askyesno(
+                "Possible Duplicates",
+                f"{len(duplicates)} image(s) look like duplicates:\n{listing}\n\nSave them anyway?",
+                icon='warning'
+            ):
+                return
+        
+        # Hash, store and render on the worker pool; the checkup and all image rows are
+        # then written in one transaction
+        self.saving = True
+        self.update_save_state()
+        pipeline = ImportPipeline(self.pool, self.db, self.cache, self.patient_id, self.store)
+        pipeline.run(
+            [(tab.file_path, tab.dhash) for tab in sources],
+            on_progress=self.set_progress,
+            on_done=lambda entries: self.finish_save(entries, pipeline),
+            on_error=self.fail_save,
+        )
+    
+    def fail_save(self, error):
+        self.set_progress()
+        self.saving = False
+        self.update_save_state()
+        messagebox.showerror("Error", f"Failed to save images: {str(error)}")
+    
+    def finish_save(self, entries, pipeline=None):
+        """Create the checkup and the rows of the images the patient does not have yet.
+
+        entries are the stored files from the import pipeline; an image whose
+        content is already in the patient's record is skipped, so re-importing
+        the same scan adds nothing.
+        """
+        self.set_progress()
+        self.saving = False
+        self.update_save_state()
+        pipeline = pipeline or ImportPipeline(self.pool, self.db, self.cache, self.patient_id, self.store)
         try:
-            # Create a patient-specific folder
-            patient_folder = os.path.join(self.image_dir, f"patient_{self.patient_id}")
-            os.makedirs(patient_folder, exist_ok=True)
-            
-            # Get list of existing images for this patient
-            existing_images = self.db.get_patient_lab_images(self.patient_id)
-            
-            # Current date for the checkup
-            current_date = datetime.now().strftime('%Y-%m-%d')
-            saved_paths = []
-            new_images_count = 0
+            known = self.db.get_patient_image_hashes(self.patient_id)
+            new_images = []
+            for entry in entries:
+                if entry["sha256"] not in known:
+                    known[entry["sha256"]] = entry["stored_path"]
+                    new_images.append(entry)
+            new_images_count = len(new_images)
             
-            # First, check for each image if it's already saved for this patient
-            for idx, (photo, original_path) in enumerate(self.images):
-                # Check if this image is already in the patient's saved images
-                if original_path in existing_images:
-                    # Image already exists in database, use the existing path
-                    saved_paths.append(original_path)
-                    print(f"Image already exists in database: {original_path}")
-                    continue
-                    
-                # Check if the file is already in patient folder but not in DB
-                # by comparing file content (md5 hash would be ideal but simple basename check for now)
-                base_filename = os.path.basename(original_path)
-                duplicate_found = False
-                
-                # Check if a similar filename exists in patient folder
-                for existing_path in existing_images:
-                    if os.path.basename(existing_path).endswith(base_filename):
-                        # Consider it a duplicate
-                        saved_paths.append(existing_path)
-                        duplicate_found = True
-                        print(f"Similar image found: {existing_path}")
-                        break
-                
-                if duplicate_found:
-                    continue
-                
-                # Generate a unique filename
-                filename = f"{current_date}_{idx}_{os.path.basename(original_path)}"
-                new_path = os.path.join(patient_folder, filename)
-                
-                # Only copy if the file isn't already in the patient folder
-                if original_path != new_path and not os.path.exists(new_path):
-                    shutil.copy2(original_path, new_path)
-                    new_images_count += 1
-                
-                saved_paths.append(new_path)
-            
-            # If no new images were copied, ask user if they want to continue
-            if new_images_count == 0 and saved_paths:
+            # If there are no new images, ask user if they want to continue
+            if new_images_count == 0:
                 response = messagebox.askyesno(
                     "No New Images", 
                     "All images are already saved for this patient. Do you still want to create a new checkup entry?",
                     icon='question'
                 )
                 if not response:
+                    pipeline.abandon()
                     return
             
             # Create a new checkup record
+            current_date = datetime.now().strftime('%Y-%m-%d')
             checkup_data = (
                 self.patient_id,
                 "Lab results/images imported",  # findings
@@ -244,19 +530,17 @@ class LabChartsWindow:
                 current_date   # last_checkup_date
             )
             
-            checkup_id = self.db.add_checkup(checkup_data)
-            
-            # Save image paths to database only if they're not already saved
-            for path in saved_paths:
-                # Check if this image path is already in the database
-                if path not in existing_images:
-                    self.db.save_patient_lab_image(self.patient_id, path, checkup_id)
+            # The checkup and its image rows are written together
+            pipeline.commit(checkup_data, new_images)
             
             # Success message with details about new vs existing images
             if new_images_count > 0:
                 success_message = f"Saved {new_images_count} new image(s) to patient record."
-                if len(saved_paths) - new_images_count > 0:
-                    success_message += f"\n{len(saved_paths) - new_images_count} image(s) were already saved."
+                if len(self.images) - new_images_count > 0:
+                    success_message += f"\n{len(self.images) - new_images_count} image(s) were already saved."
+                saved_bytes = sum(image["original_size"] - image["size"] for image in new_images)
+                if saved_bytes > 0:
+                    success_message += f"\nCompacting the images saved {saved_bytes / (1024 * 1024):.1f} MB."
             else:
                 success_message = "No new images were saved, but checkup record was created."
                 
@@ -288,40 +572,18 @@ class LabChartsWindow:
         try:
             # Get the image information
             if selected_tab_index < len(self.images):
-                _, file_path = self.images[selected_tab_index]
+                record_path = self.images[selected_tab_index].record_path
                 
-                # If this is a saved patient image, remove from database
-                if self.patient_id and file_path.startswith(self.image_dir):
-                    # Delete from database if it's stored there
-                    conn = self.db.get_connection()
-                    cursor = conn.cursor()
-                    
-                    try:
-                        # Check if LabImages table exists
-                        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='LabImages'")
-                        if cursor.fetchone():
-                            cursor.execute("""
-                                DELETE FROM LabImages 
-                                WHERE patient_id = ? AND file_path = ?
-                            """, (self.patient_id, file_path))
-                            conn.commit()
-                            
-                            print(f"Deleted image record from database: {file_path}")
-                            
-                            # Optionally delete the actual file
-                            try:
-                                if os.path.exists(file_path) and file_path.startswith(self.image_dir):
-                                    os.remove(file_path)
-                                    print(f"Deleted image file: {file_path}")
-                            except Exception as e:
-                                print(f"Warning: Could not delete file {file_path}: {str(e)}")
-                    except sqlite3.Error as e:
-                        print(f"Database error during image deletion: {str(e)}")
-                    finally:
-                        conn.close()
+                # If this is a saved patient image, remove it from the database, and
+                # delete the file once no checkup of any patient uses it
+                if self.patient_id and record_path is not None:
+                    if self.db.delete_lab_image(self.patient_id, record_path):
+                        self.pool.submit(lambda: release_files([record_path], self.db, self.store))
                 
                 # Remove from our image list
-                self.images.pop(selected_tab_index)
+                tab = self.images.pop(selected_tab_index)
+                viewer_memory.release(tab)
+                tab.unload()
             
             # Remove the tab from the notebook
             self.notebook.forget(selected_tab_index)
@@ -1,6 +1,10 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from db_helper import DatabaseHelper
+from medicine_catalog import get_catalog
+from order_sets import describe_order_set
+from drug_interactions import interaction_checker, describe_interactions
+from records import Prescription
 from tkinter import Tk, Label, Entry, Button
 
 # Update the MedAutoCompleteCombobox class with improved dropdown prevention
@@ -50,9 +54,11 @@ class MedAutoCompleteCombobox(ttk.Combobox):
         return  # Let default handler work
 
 class MedicationManagementWindow:
-    def __init__(self, parent, callback=None):
+    def __init__(self, parent, callback=None, diagnosis="", order_sets=None):
         self.parent = parent
         self.callback = callback  # Function to call when medications are saved
+        self.diagnosis = diagnosis  # Findings of the visit, for order set suggestions
+        self.order_sets = order_sets  # OrderSetIndex, or None while it is loading
         
         # Create the window
         self.window = tk.Toplevel(parent)
@@ -111,9 +117,10 @@ class MedicationManagementWindow:
         # Generic selection
         tk.Label(input_frame, text="Generic Name:", bg=self.SECONDARY_COLOR, fg=self.TEXT_COLOR).grid(row=0, column=2, padx=5, pady=5, sticky="w")
         self.generic_var = tk.StringVar()
-        self.generic_dropdown = ttk.Combobox(input_frame, textvariable=self.generic_var, width=30)
+        self.generic_dropdown = MedAutoCompleteCombobox(input_frame, textvariable=self.generic_var, width=30)
         self.generic_dropdown.grid(row=0, column=3, padx=5, pady=5, sticky="w")
         self.generic_dropdown.bind("<<ComboboxSelected>>", self.on_generic_select)
+        self.generic_dropdown.bind("<KeyRelease>", self.on_generic_key_release)
         
         # Quantity
         tk.Label(input_frame, text="Quantity:", bg=self.SECONDARY_COLOR, fg=self.TEXT_COLOR).grid(row=1, column=0, padx=5, pady=5, sticky="w")
@@ -169,6 +176,11 @@ class MedicationManagementWindow:
         self.tree.configure(yscroll=scrollbar.set)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
+        # Interaction warnings for the medications in the list
+        self.interaction_label = tk.Label(main_frame, text="", bg=self.SECONDARY_COLOR, fg=self.WARNING_COLOR,
+                                          font=("Arial", 10, "bold"), justify=tk.LEFT, anchor="w")
+        self.interaction_label.pack(fill=tk.X, padx=5)
+        
         # Button section
         button_frame = tk.Frame(main_frame, bg=self.SECONDARY_COLOR)
         button_frame.pack(fill=tk.X, padx=5, pady=10)
@@ -185,6 +197,12 @@ class MedicationManagementWindow:
                                  padx=10, pady=5, command=self.delete_selected)
         delete_button.pack(side=tk.LEFT, padx=5)
         
+        # Order set button
+        self.order_set_button = tk.Button(button_frame, text="Apply Order Set", 
+                                         bg=self.PRIMARY_COLOR, fg=self.BUTTON_TEXT_COLOR,
+                                         padx=10, pady=5, command=self.show_order_sets)
+        self.order_set_button.pack(side=tk.LEFT, padx=5)
+        
         # Save all button
         save_button = tk.Button(button_frame, text="Save All Medications", 
                                bg=self.ACCENT_COLOR, fg=self.BUTTON_TEXT_COLOR,
@@ -198,50 +216,43 @@ class MedicationManagementWindow:
         back_button.pack(side=tk.RIGHT, padx=5)
     
     def load_medicines(self):
-        # Get medicines from database
-        medicines = self.db.get_medicines()
-        
-        # Extract brand and generic names
-        brands = sorted(list(set([med[1] for med in medicines])))
-        generics = sorted(list(set([med[2] for med in medicines])))
+        # Shared catalog; only medicines changed since the last window are re-read
+        self.catalog = get_catalog()
         
-        # Update dropdown values
-        self.brand_dropdown['values'] = brands
-        self.generic_dropdown['values'] = generics
-        
-        # Store medicines for later use - Include quantity and administration
-        self.medicine_dict = {med[1]: (med[0], med[2], med[3], med[4]) for med in medicines}  # brand: (id, generic, quantity, admin)
-        self.generic_dict = {med[2]: (med[0], med[1], med[3], med[4]) for med in medicines}   # generic: (id, brand, quantity, admin)
+        # Update dropdown values (most prescribed first)
+        self.on_brand_key_release()
+        self.on_generic_key_release()
     
     def on_brand_select(self, event=None):
         selected_brand = self.brand_var.get()
-        if selected_brand and selected_brand in self.medicine_dict:
-            # Set the corresponding generic name, quantity and administration
-            med_id, generic, quantity, admin = self.medicine_dict[selected_brand]
-            self.generic_var.set(generic)
-            
-            # Only set quantity and administration if they have values
-            if quantity:
-                self.quantity_entry.delete(0, tk.END)
-                self.quantity_entry.insert(0, quantity)
-            
-            if admin:
-                self.admin_var.set(admin)
+        products = self.catalog.find_by_brand(selected_brand) if selected_brand else []
+        if products:
+            # Several products can share a brand; offer their generics and start with the first
+            self.generic_dropdown['values'] = [med.generic for med in products]
+            self.fill_from_medicine(products[0], brand=False)
     
     def on_generic_select(self, event=None):
         selected_generic = self.generic_var.get()
-        if selected_generic and selected_generic in self.generic_dict:
-            # Set the corresponding brand name, quantity and administration
-            med_id, brand, quantity, admin = self.generic_dict[selected_generic]
-            self.brand_var.set(brand)
-            
-            # Only set quantity and administration if they have values
-            if quantity:
-                self.quantity_entry.delete(0, tk.END)
-                self.quantity_entry.insert(0, quantity)
-            
-            if admin:
-                self.admin_var.set(admin)
+        products = self.catalog.find_by_generic(selected_generic) if selected_generic else []
+        if products:
+            # Several brands can share a generic; offer them and start with the first
+            self.brand_dropdown['values'] = [med.brand for med in products]
+            self.fill_from_medicine(products[0], generic=False)
+    
+    def fill_from_medicine(self, medicine, brand=True, generic=True):
+        """Fill the inputs with a catalog medicine's names, quantity and administration"""
+        if brand:
+            self.brand_var.set(medicine.brand)
+        if generic:
+            self.generic_var.set(medicine.generic)
+        
+        # Only set quantity and administration if they have values
+        if medicine.quantity:
+            self.quantity_entry.delete(0, tk.END)
+            self.quantity_entry.insert(0, medicine.quantity)
+        
+        if medicine.administration:
+            self.admin_var.set(medicine.administration)
     
     def add_to_list(self):
         # Get values from inputs
@@ -264,9 +275,11 @@ class MedicationManagementWindow:
             return
         
         # Get medicine ID if available
-        med_id = None
-        if brand in self.medicine_dict:
-            med_id = self.medicine_dict[brand][0]
+        medicine = self.catalog.find(brand, generic) or self.catalog.find(brand)
+        med_id = medicine.id if medicine else None
+        
+        # Check the new drug against the ones already in the list
+        interactions = interaction_checker.check_new(generic, [med["generic"] for med in self.medications])
         
         # Add to treeview
         item_id = self.tree.insert("", tk.END, values=(med_id, brand, generic, quantity, administration))
@@ -281,11 +294,58 @@ class MedicationManagementWindow:
             "tree_id": item_id
         })
         
-        self.show_notification(f"Added {brand} to the list")
+        if interactions:
+            self.show_notification(f"Added {brand} - check interactions below!", self.WARNING_COLOR)
+        else:
+            self.show_notification(f"Added {brand} to the list")
+        self.check_interactions()
         
         # Clear inputs
         self.clear_inputs()
     
+    def add_medications(self, prescriptions):
+        """Show medications that are already on the prescription in the list"""
+        for rx in prescriptions:
+            item_id = self.tree.insert("", tk.END, values=(None, rx.brand, rx.generic, rx.quantity, rx.administration))
+            self.medications.append({
+                "id": None,  # Since we don't have ID in the prescription table
+                "brand": rx.brand,
+                "generic": rx.generic,
+                "quantity": rx.quantity,
+                "administration": rx.administration,
+                "tree_id": item_id
+            })
+        self.check_interactions()
+    
+    def check_interactions(self):
+        """Show the interactions between the medications in the list"""
+        interactions = interaction_checker.check_all(med["generic"] for med in self.medications)
+        self.interaction_label.config(text=interaction_checker.off_notice() or describe_interactions(interactions))
+
+    def show_order_sets(self):
+        """Offer the drug combinations usually prescribed for this diagnosis"""
+        menu = tk.Menu(self.window, tearoff=0)
+        if self.order_sets is None:
+            menu.add_command(label="Order sets are still loading...", state=tk.DISABLED)
+        else:
+            current = [Prescription(med["brand"], med["generic"], med["quantity"], med["administration"])
+                       for med in self.medications]
+            suggestions = self.order_sets.suggest(self.diagnosis, current)
+            for rows, uses in suggestions:
+                menu.add_command(label=describe_order_set(rows, uses),
+                                 command=lambda rows=rows: self.apply_order_set(rows))
+            if not suggestions:
+                menu.add_command(label="No order sets for this diagnosis yet", state=tk.DISABLED)
+        button = self.order_set_button
+        menu.tk_popup(button.winfo_rootx(), button.winfo_rooty() + button.winfo_height())
+    
+    def apply_order_set(self, rows):
+        """Add the medications of a set that are not in the list yet"""
+        present = {(med["brand"], med["generic"]) for med in self.medications}
+        missing = [rx for rx in rows if (rx.brand, rx.generic) not in present]
+        self.add_medications(missing)
+        self.show_notification(f"Added {len(missing)} medications from the order set")
+
     def edit_selected(self):
         selected_item = self.tree.selection()
         if not selected_item:
@@ -325,6 +385,7 @@ class MedicationManagementWindow:
         
         # Remove from our list
         self.medications = [med for med in self.medications if med["tree_id"] != tree_id]
+        self.check_interactions()
         
         # Show confirmation
         if confirm:  # Only show notification if not called from edit_selected
@@ -379,11 +440,8 @@ class MedicationManagementWindow:
             self.show_notification("Please enter at least Brand and Generic Name!", self.WARNING_COLOR)
             return
         
-        # Check if medicine already exists in DB
-        existing_medicine = None
-        if brand in self.medicine_dict:
-            existing_medicine = (self.medicine_dict[brand][0], brand, generic, quantity, administration)
-        
+        # Check if medicine already exists in DB (the same brand and generic first)
+        existing_medicine = self.catalog.find(brand, generic)
         if existing_medicine:
             # Confirm overwrite
             response = messagebox.askyesno(
@@ -391,35 +449,49 @@ class MedicationManagementWindow:
                 f"Medicine '{brand}' already exists. Do you want to update it?",
                 icon='warning'
             )
+            if not response:
+                return
+        elif self.catalog.find(brand):
+            # Same brand under another generic: correct that product or add a new one
+            other = self.catalog.find(brand)
+            response = messagebox.askyesnocancel(
+                "Medicine Exists",
+                f"Medicine '{brand}' already exists with generic '{other.generic}'.\n\n"
+                f"Yes: change it to '{generic}'\nNo: add '{brand} ({generic})' as a separate product",
+                icon='warning'
+            )
+            if response is None:
+                return
             if response:
+                existing_medicine = other
+        
+        try:
+            if existing_medicine:
                 # Update existing medicine
-                try:
-                    self.db.update_medicine((generic, quantity, administration, existing_medicine[0]))
-                    self.show_notification(f"Medicine '{brand}' updated successfully!")
-                    self.load_medicines()  # Refresh medicine list
-                except Exception as e:
-                    self.show_notification(f"Error: {str(e)}", self.WARNING_COLOR)
-        else:
-            # Add new medicine
-            try:
-                self.db.add_medicine((brand, generic, quantity, administration))
+                self.catalog.update(existing_medicine.id, generic, quantity, administration)
+                self.show_notification(f"Medicine '{brand}' updated successfully!")
+            else:
+                # Add new medicine
+                self.catalog.add(brand, generic, quantity, administration)
                 self.show_notification(f"Medicine '{brand}' added successfully!")
-                self.load_medicines()  # Refresh medicine list
-            except Exception as e:
-                self.show_notification(f"Error: {str(e)}", self.WARNING_COLOR)
+            self.load_medicines()  # Refresh medicine list
+        except Exception as e:
+            self.show_notification(f"Error: {str(e)}", self.WARNING_COLOR)
     
     def delete_from_database(self):
         """Delete the selected medicine from the database"""
         # Get values from inputs
         brand = self.brand_var.get()
+        generic = self.generic_var.get()
         
         # Validate inputs
         if not brand:
             self.show_notification("Please select a medicine to delete!", self.WARNING_COLOR)
             return
         
-        # Check if medicine exists
-        if brand not in self.medicine_dict:
+        # Check if medicine exists (the product with this generic, if there are several)
+        medicine = self.catalog.find(brand, generic) or self.catalog.find(brand)
+        if not medicine:
             self.show_notification(f"Medicine '{brand}' not found in database!", self.WARNING_COLOR)
             return
         
@@ -432,8 +504,7 @@ class MedicationManagementWindow:
         
         if response:
             try:
-                med_id = self.medicine_dict[brand][0]
-                self.db.delete_medicine(med_id)
+                self.catalog.delete(medicine.id)
                 self.show_notification(f"Medicine '{brand}' deleted successfully!")
                 self.load_medicines()  # Refresh medicine list
                 self.clear_inputs()    # Clear inputs
@@ -480,31 +551,16 @@ class MedicationManagementWindow:
 
     def on_brand_key_release(self, event=None):
         """Handle key release in brand dropdown to update values without showing dropdown"""
-        current_text = self.brand_var.get().strip()
-        
-        # Get all brand names
-        all_brands = sorted(list(self.medicine_dict.keys()))
-        
-        # Filter brands based on current text
-        if current_text:
-            # First priority: names that start with the typed text
-            matching_brands = [b for b in all_brands if b.lower().startswith(current_text.lower())]
-            
-            # Second priority: names that contain the typed text (if we have fewer than 5 starting matches)
-            if len(matching_brands) < 5:
-                for brand in all_brands:
-                    if (not brand.lower().startswith(current_text.lower()) and 
-                        current_text.lower() in brand.lower()):
-                        matching_brands.append(brand)
-        else:
-            matching_brands = all_brands
-        
-        # Sort and update the dropdown values but DO NOT show dropdown
-        if matching_brands:
-            matching_brands.sort()
-            self.brand_dropdown['values'] = matching_brands
-        else:
-            self.brand_dropdown['values'] = ["No matches found"]
+        self.update_suggestions(self.brand_dropdown, self.catalog.brand_index, self.brand_var.get())
+
+    def on_generic_key_release(self, event=None):
+        """Handle key release in generic dropdown to update values without showing dropdown"""
+        self.update_suggestions(self.generic_dropdown, self.catalog.generic_index, self.generic_var.get())
+
+    def update_suggestions(self, dropdown, index, text):
+        """Fill a dropdown with the best matches for the typed text but DO NOT show it"""
+        matches = index.complete(text)
+        dropdown['values'] = matches if matches else ["No matches found"]
 
     def show_brand_dropdown(self):
         """Explicitly show the brand dropdown when requested"""
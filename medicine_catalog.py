@@ -0,0 +1,142 @@
+# medicine_catalog.py
+from bisect import bisect_left, insort
+from autocomplete import AutocompleteIndex
+from db_helper import DatabaseHelper
+from records import Medicine
+
+
+class MedicineCatalog:
+    """In-process copy of the medicine table shared by every window.
+
+    Brands and generics are multi-maps, since several products may share a
+    brand or a generic name. The catalog remembers the database version it
+    reflects (the newest MedicineChanges row); refresh() only re-reads the
+    medicines that changed since then, including edits from other stations.
+    Writes made through the catalog update the indexes in place.
+    """
+
+    def __init__(self, db=None):
+        self.db = db or DatabaseHelper()
+        self.version = None
+        self.by_id = {}
+        self._by_brand = {}    # brand -> [Medicine]
+        self._by_generic = {}  # generic -> [Medicine]
+        self.brands = []       # Sorted, unique
+        self.generics = []     # Sorted, unique
+        self.brand_index = AutocompleteIndex()    # Ranked brand suggestions
+        self.generic_index = AutocompleteIndex()  # Ranked generic suggestions
+
+    def refresh(self):
+        """Bring the catalog up to date with the database"""
+        if self.version is None:
+            version, medicines = self.db.get_medicine_snapshot()
+            if version is None:
+                return
+            self._reset(medicines)
+            self.version = version
+        else:
+            version, changed, deleted_ids = self.db.get_medicine_changes(self.version)
+            for medicine_id in deleted_ids:
+                self._remove(medicine_id)
+            for medicine in changed:
+                self._remove(medicine.id)
+                self._insert(medicine)
+            self.version = version
+
+        # Usage counts are kept up to date by triggers on Prescriptions, so this
+        # is a read of one small table, not a count over every prescription
+        usage = self.db.get_medicine_usage()
+        self.brand_index.set_usage(usage["brand"])
+        self.generic_index.set_usage(usage["generic"])
+
+    def find_by_brand(self, brand):
+        return list(self._by_brand.get(brand, ()))
+
+    def find_by_generic(self, generic):
+        return list(self._by_generic.get(generic, ()))
+
+    def find(self, brand, generic=None):
+        """Return the product with this brand (and generic, if given), or None"""
+        for medicine in self._by_brand.get(brand, ()):
+            if generic is None or medicine.generic == generic:
+                return medicine
+        return None
+
+    def add(self, brand, generic, quantity, administration):
+        medicine_id = self.db.add_medicine((brand, generic, quantity, administration))
+        self._after_write(medicine_id, Medicine(medicine_id, brand, generic, quantity, administration))
+        return medicine_id
+
+    def update(self, medicine_id, generic, quantity, administration):
+        self.db.update_medicine((generic, quantity, administration, medicine_id))
+        brand = self.by_id[medicine_id].brand
+        self._after_write(medicine_id, Medicine(medicine_id, brand, generic, quantity, administration))
+
+    def delete(self, medicine_id):
+        self.db.delete_medicine(medicine_id)
+        self._after_write(medicine_id)
+
+    def _after_write(self, medicine_id, medicine=None):
+        """Apply our own write to the indexes without re-reading the table"""
+        self._remove(medicine_id)
+        if medicine:
+            self._insert(medicine)
+        # Our write logged exactly one change. If the log moved further, another
+        # station wrote as well and the next refresh() picks both up.
+        if self.version is not None and self.db.get_medicine_catalog_version() == self.version + 1:
+            self.version += 1
+
+    def _reset(self, medicines):
+        self.by_id = {}
+        self._by_brand = {}
+        self._by_generic = {}
+        for medicine in medicines:
+            self.by_id[medicine.id] = medicine
+            self._by_brand.setdefault(medicine.brand, []).append(medicine)
+            self._by_generic.setdefault(medicine.generic, []).append(medicine)
+        self.brands = sorted(self._by_brand)
+        self.generics = sorted(self._by_generic)
+        self.brand_index = AutocompleteIndex(self.brands)
+        self.generic_index = AutocompleteIndex(self.generics)
+
+    def _insert(self, medicine):
+        self.by_id[medicine.id] = medicine
+        self._add_to(self._by_brand, self.brands, self.brand_index, medicine.brand, medicine)
+        self._add_to(self._by_generic, self.generics, self.generic_index, medicine.generic, medicine)
+
+    def _remove(self, medicine_id):
+        medicine = self.by_id.pop(medicine_id, None)
+        if medicine:
+            self._remove_from(self._by_brand, self.brands, self.brand_index, medicine.brand, medicine_id)
+            self._remove_from(self._by_generic, self.generics, self.generic_index, medicine.generic, medicine_id)
+
+    @staticmethod
+    def _add_to(index, names, completer, name, medicine):
+        if name not in index:
+            index[name] = []
+            insort(names, name)
+            completer.add(name)
+        index[name].append(medicine)
+
+    @staticmethod
+    def _remove_from(index, names, completer, name, medicine_id):
+        remaining = [med for med in index.get(name, ()) if med.id != medicine_id]
+        if remaining:
+            index[name] = remaining
+        elif name in index:
+            del index[name]
+            position = bisect_left(names, name)
+            if position < len(names) and names[position] == name:
+                del names[position]
+            completer.remove(name)
+
+
+_catalog = None
+
+def get_catalog():
+    """Return the process-wide catalog, loading it on first use"""
+    global _catalog
+    if _catalog is None:
+        _catalog = MedicineCatalog()
+    _catalog.refresh()
+    return _catalog
@@ -1,6 +1,7 @@
 import tkinter as tk
 from tkinter import ttk
 from db_helper import DatabaseHelper
+from virtual_list import VirtualList
 
 class MedicineSelector(tk.Toplevel):
     def __init__(self, parent):
@@ -8,36 +9,53 @@ class MedicineSelector(tk.Toplevel):
         self.title("Select Medicine")
         self.geometry("600x400")
         self.selected_medicine = None
-        
-        # Create treeview
-        self.tree = ttk.Treeview(self, columns=("ID", "Name", "Generic", "Type"), show="headings")
-        self.tree.heading("ID", text="ID")
-        self.tree.heading("Name", text="Brand Name")
-        self.tree.heading("Generic", text="Generic Name")
-        self.tree.heading("Type", text="Type")
-        
-        # Add scrollbar
-        scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscroll=scrollbar.set)
-        
-        # Layout
-        self.tree.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
-        
+        self.db = DatabaseHelper()
+        self._filter_job = None
+
+        # Type-to-filter box (brand or generic name prefix)
+        search_frame = tk.Frame(self)
+        search_frame.pack(side="top", fill="x", padx=5, pady=5)
+        tk.Label(search_frame, text="Search:").pack(side="left")
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
+        search_entry.pack(side="left", fill="x", expand=True, padx=5)
+        search_entry.bind("<KeyRelease>", self.on_search_key)
+        search_entry.bind("<Down>", lambda e: self.tree.focus_set())
+
+        # Only the visible rows are fetched from the database and put in the tree
+        self.medicine_list = VirtualList(
+            self,
+            columns=("ID", "Name", "Generic", "Type"),
+            headings=("ID", "Brand Name", "Generic Name", "Type"),
+            fetch_page=lambda offset, limit: self.db.get_medicines_page(self.search_var.get(), offset, limit),
+            count_rows=lambda: self.db.count_medicines(self.search_var.get()),
+        )
+        self.medicine_list.pack(side="top", fill="both", expand=True)
+        self.tree = self.medicine_list.tree
+
         # Load medicines
         self.load_medicines()
-        
+        search_entry.focus_set()
+
         # Bind double-click event
         self.tree.bind("<Double-1>", self.select_medicine)
+        self.tree.bind("<Return>", self.select_medicine)
 
     def load_medicines(self):
-        db = DatabaseHelper()
-        medicines = db.get_medicines()
-        for med in medicines:
-            self.tree.insert("", "end", values=med)
+        self.medicine_list.refresh()
+
+    def on_search_key(self, event=None):
+        """Re-run the filter shortly after typing stops"""
+        if self._filter_job:
+            self.after_cancel(self._filter_job)
+        self._filter_job = self.after(150, self.apply_filter)
+
+    def apply_filter(self):
+        self._filter_job = None
+        self.load_medicines()
 
     def select_medicine(self, event):
-        selected_item = self.tree.selection()
-        if selected_item:
-            self.selected_medicine = self.tree.item(selected_item)['values']
+        medicine = self.medicine_list.selected_row()
+        if medicine:
+            self.selected_medicine = list(medicine)
             self.destroy()
@@ -1,3 +1,6 @@
+import time
+STARTUP_STARTED = time.perf_counter()  # Used to report time-to-interactive
+
 import tkinter as tk
 from tkinter import ttk, messagebox
 import tkcalendar  # Add this import for the calendar widget
@@ -14,6 +17,18 @@ import subprocess
 from PIL import Image, ImageDraw, ImageFont
 from tkinter import filedialog
 from lab_charts import LabChartsWindow
+from inventory import InventoryWindow
+from recall_search import RecallSearchWindow
+from background import run_in_background
+from prescription_model import PrescriptionModel
+from order_sets import OrderSetIndex, describe_order_set
+from findings_index import FindingsIndex
+from phrase_index import PhraseIndex
+from icd10_lookup import Icd10Lookup
+from drug_interactions import interaction_checker, describe_interactions
+from image_reconcile import maintain_image_store, describe_report, release_files
+from records import Visit
+from treeview_sync import TreeviewSync
 
 # Replace the AutocompleteCombobox class with this updated version
 class AutocompleteCombobox(ttk.Combobox):
@@ -61,38 +76,38 @@ class AutocompleteCombobox(ttk.Combobox):
             return "break"  # Handle it ourselves
         return  # Let default handler work
 
+# Maximum number of patient names held by the name dropdown at any time
+PATIENT_MATCH_LIMIT = 20
+
+# Name-to-id map for the names currently shown in the dropdown only
+matched_patients = {}
+
 # Update the check_name_match function to populate values but NOT show dropdown
 def check_name_match(event=None):
-    """Filter dropdown list based on typed text but don't show the dropdown"""
-    current_text = entry_name.get().strip()
-    
-    # When text is empty, set values but don't show dropdown
-    if not current_text:
-        sorted_names = sorted(list(patient_dict.keys()))[:20]  # Limit to 20 names
-        entry_name['values'] = sorted_names
-        return
-    
-    # Filter patient names based on typed text
-    matching_names = []
-    
-    # First priority: names that start with the typed text
-    for name in patient_dict.keys():
-        if name.lower().startswith(current_text.lower()):
-            matching_names.append(name)
-    
-    # Second priority: names containing the typed text (if few starting matches)
-    if len(matching_names) < 5:
-        for name in patient_dict.keys():
-            if not name.lower().startswith(current_text.lower()) and current_text.lower() in name.lower():
-                matching_names.append(name)
+    """Fill the dropdown with the top matches for the typed text but don't show the dropdown"""
+    db = DatabaseHelper()
+    apply_patient_matches(db.search_patients(entry_name.get(), PATIENT_MATCH_LIMIT))
+
+def apply_patient_matches(patients):
+    """Show PatientName rows in the name dropdown and remember their ids"""
+    global matched_patients
+    matched_patients = {patient.name: patient.id for patient in patients}
     
     # Update values but DO NOT show dropdown
-    if matching_names:
-        matching_names.sort()
-        entry_name['values'] = matching_names
+    if patients:
+        entry_name['values'] = [patient.name for patient in patients]
     else:
         entry_name['values'] = ["No matches found"]
 
+def lookup_patient_id(name):
+    """Resolve a patient name to its id, querying the database when it isn't a current match"""
+    if not name:
+        return None
+    if name in matched_patients:
+        return matched_patients[name]
+    db = DatabaseHelper()
+    return db.get_patient_id(name)
+
 # Add a new function to allow showing dropdown on demand
 def show_patient_dropdown(event=None):
     """Function to explicitly show the patient dropdown when requested"""
@@ -162,7 +177,7 @@ def save_record():
         is_new_patient = False
         
         if existing_patient:
-            patient_id = existing_patient[0]  # Get existing patient's ID
+            patient_id = existing_patient.id  # Get existing patient's ID
             
             # Update patient's basic information
             patient_data = (
@@ -196,14 +211,12 @@ def save_record():
             # Update existing checkup for today
             checkup_data = (
                 text_remarks.get("1.0", tk.END),  # findings
-                existing_checkup[2],  # Keep existing lab_ids
+                existing_checkup.lab_ids,  # Keep existing lab_ids
                 entry_bp.get(),  # blood_pressure
-                existing_checkup[0]  # checkup_id
+                existing_checkup.id  # checkup_id
             )
             db.update_checkup(checkup_data)
-            
-            # Delete existing prescriptions for updating
-            db.delete_prescriptions_for_checkup(patient_id, current_date)
+            checkup_id = existing_checkup.id
         else:
             # Create a new checkup record
             checkup_data = (
@@ -213,20 +226,13 @@ def save_record():
                 current_date,  # dateOfVisit
                 current_date   # last_checkup_date
             )
-            db.add_checkup(checkup_data)
+            checkup_id = db.add_checkup(checkup_data)
+        db.set_checkup_codes(checkup_id, icd_lookup.codes)
         
-        # Save prescriptions with current date
-        for item in tree_med.get_children():
-            values = tree_med.item(item)['values']
-            prescription_data = (
-                patient_id,
-                values[1],  # generic
-                values[0],  # brand
-                values[2],  # quantity
-                values[3],  # administration
-                current_date  # last_checkup_date
-            )
-            db.add_prescription(prescription_data)
+        # Save prescriptions with current date (replacing any saved earlier today)
+        # and take them from stock
+        db.save_visit_prescriptions(patient_id, current_date, prescription_model.items)
+        record_saved_visit(patient_id, current_date)
         
         # Display success message
         if is_new_patient:
@@ -250,33 +256,34 @@ def save_record():
         messagebox.showerror("Error", f"An error occurred: {str(e)}")
 
 def load_today_queue():
-    global queue_counter
     try:
         db = DatabaseHelper()
         
         # Ensure database tables are created
         db.create_tables()
         
-        queue_entries = db.get_todays_queue()
-        
-        # Clear existing entries in the treeview
-        for item in tree_queue.get_children():
-            tree_queue.delete(item)
-            
-        # Find highest queue number to set counter
-        highest_queue = 0
-        
-        # Add queue entries to the treeview
-        for entry in queue_entries:
-            queue_id, queue_num, name, queue_time = entry
-            tree_queue.insert("", "end", values=(queue_num, name, queue_time), tags=(str(queue_id),))
-            highest_queue = max(highest_queue, int(queue_num) if isinstance(queue_num, (int, str)) else 0)
-        
-        # Set queue counter to continue from highest number
-        queue_counter = highest_queue
+        populate_queue(db.get_todays_queue())
         
     except Exception as e:
         print(f"Error loading queue: {e}")
+
+def populate_queue(queue_entries):
+    """Show the given queue rows in the treeview and continue numbering from them"""
+    global queue_counter
+    # Apply the entries as one batched diff; rows already shown are kept
+    queue_view.sync([
+        (entry.id, (entry.queue_number, entry.patient_name, entry.queue_time), (str(entry.id),))
+        for entry in queue_entries
+    ])
+        
+    # Find highest queue number to set counter
+    highest_queue = 0
+    for entry in queue_entries:
+        queue_num = entry.queue_number
+        highest_queue = max(highest_queue, int(queue_num) if isinstance(queue_num, (int, str)) else 0)
+    
+    # Set queue counter to continue from highest number
+    queue_counter = highest_queue
       
 
   
@@ -286,12 +293,11 @@ def update_record():
         patient_name = entry_name.get()
         
         # Check if the patient exists
-        if not patient_name or patient_name not in patient_dict:
+        patient_id = lookup_patient_id(patient_name)
+        if patient_id is None:
             messagebox.showwarning("Error", "Please select a valid patient first.")
             return
         
-        patient_id = patient_dict[patient_name]
-        
         # Get the selected date from the dropdown or use current date
         selected_checkup_date = checkup_history_var.get()
         if selected_checkup_date == "No previous checkups":
@@ -305,34 +311,18 @@ def update_record():
         
         # For existing checkups, get the checkup ID
         if not is_new_checkup:
-            existing_checkup = next((c for c in current_checkups if c[4] == checkup_date), None)
+            existing_checkup = next((c for c in current_checkups if c.last_checkup_date == checkup_date), None)
             if existing_checkup:
-                checkup_id = existing_checkup[0]
+                checkup_id = existing_checkup.id
                 
                 # Update the existing checkup record
                 checkup_data = (
                     text_remarks.get("1.0", tk.END),  # findings
-                    existing_checkup[2],  # Keep existing lab_ids
+                    existing_checkup.lab_ids,  # Keep existing lab_ids
                     entry_bp.get(),      # blood_pressure
                     checkup_id           # checkup_id
                 )
                 db.update_checkup(checkup_data)
-                
-                # Delete existing prescriptions for this date
-                db.delete_prescriptions_for_checkup(patient_id, checkup_date)
-                
-                # Add new prescriptions
-                for item in tree_med.get_children():
-                    values = tree_med.item(item)['values']
-                    prescription_data = (
-                        patient_id,
-                        values[1],  # generic
-                        values[0],  # brand
-                        values[2],  # quantity
-                        values[3],  # administration
-                        checkup_date  # last_checkup_date
-                    )
-                    db.add_prescription(prescription_data)
             else:
                 messagebox.showerror("Error", "Selected checkup record not found.")
                 return
@@ -353,14 +343,12 @@ def update_record():
                 # Update existing checkup for today
                 checkup_data = (
                     text_remarks.get("1.0", tk.END),  # findings
-                    existing_today_checkup[2],  # Keep existing lab_ids
+                    existing_today_checkup.lab_ids,  # Keep existing lab_ids
                     entry_bp.get(),  # blood_pressure
-                    existing_today_checkup[0]  # checkup_id
+                    existing_today_checkup.id  # checkup_id
                 )
                 db.update_checkup(checkup_data)
-                
-                # Delete and recreate prescriptions
-                db.delete_prescriptions_for_checkup(patient_id, checkup_date)
+                checkup_id = existing_today_checkup.id
             else:
                 # Create a new checkup record
                 checkup_data = (
@@ -370,20 +358,12 @@ def update_record():
                     checkup_date,  # dateOfVisit
                     checkup_date  # last_checkup_date
                 )
-                db.add_checkup(checkup_data)
-            
-            # Add prescriptions with updated format
-            for item in tree_med.get_children():
-                values = tree_med.item(item)['values']
-                prescription_data = (
-                    patient_id,
-                    values[1],  # generic
-                    values[0],  # brand
-                    values[2],  # quantity
-                    values[3],  # administration
-                    checkup_date  # last_checkup_date
-                )
-                db.add_prescription(prescription_data)
+                checkup_id = db.add_checkup(checkup_data)
+        
+        # Replace the prescriptions for this date and adjust stock to match
+        db.save_visit_prescriptions(patient_id, checkup_date, prescription_model.items)
+        db.set_checkup_codes(checkup_id, icd_lookup.codes)
+        record_saved_visit(patient_id, checkup_date)
         
         # Display a success message
         messagebox.showinfo("Success", "Record updated successfully!")
@@ -411,9 +391,9 @@ def clear_form(show_message=True):
     entry_phone.delete(0, tk.END)
     entry_bp.delete(0, tk.END)
     text_remarks.delete("1.0", tk.END)
-    # Clear medications treeview
-    for item in tree_med.get_children():
-        tree_med.delete(item)
+    icd_lookup.clear()
+    # Clear medications
+    prescription_model.clear()
     # Reset comboboxes and radiobuttons
     status_var.set("")
     gender_var.set("")
@@ -429,14 +409,12 @@ def delete_record():
         messagebox.showwarning("Selection Error", "Please select a patient to delete.")
         return
     
-    # Check if patient exists in the database
-    if patient_name not in patient_dict:
+    # Check if patient exists in the database and get patient ID
+    patient_id = lookup_patient_id(patient_name)
+    if patient_id is None:
         messagebox.showwarning("Patient Not Found", f"Patient '{patient_name}' not found in the database.")
         return
     
-    # Get patient ID
-    patient_id = patient_dict[patient_name]
-    
     # Confirm deletion with the user
     response = messagebox.askyesno(
         "Confirm Deletion", 
@@ -447,7 +425,14 @@ def delete_record():
     if response:
         try:
             db = DatabaseHelper()
+            image_paths = db.get_patient_lab_images(patient_id)
             db.delete_patient(patient_id)
+            if phrase_index is None:
+                PhraseIndex.journal_patient_removal(patient_id)  # Applied when the index is loaded
+            else:
+                phrase_index.remove_patient(patient_id)
+            # Image files are shared by content; remove the ones no one else uses
+            run_in_background(root, lambda: release_files(image_paths))
             messagebox.showinfo("Success", f"Patient '{patient_name}' and all related records have been deleted.")
             
             # Clear the form
@@ -619,13 +604,13 @@ def open_print_dialog():
             if selected_type == "Prescription":
                 doc.add_paragraph()  # Empty space
                 
-                if tree_med.get_children():
-                    for idx, item in enumerate(tree_med.get_children()):
-                        values = tree_med.item(item)['values']
-                        brand = values[0]
-                        generic = values[1]
-                        quantity = values[2]
-                        admin = values[3]
+                prescriptions = prescription_model.items
+                if prescriptions:
+                    for idx, rx in enumerate(prescriptions):
+                        brand = rx.brand
+                        generic = rx.generic
+                        quantity = rx.quantity
+                        admin = rx.administration
                         
                         # Format medication similar to PDF structure
                         generic_para = doc.add_paragraph()
@@ -645,7 +630,7 @@ def open_print_dialog():
                         admin_run.font.size = Pt(9)  # Set font size on run, not paragraph
                         
                         # Add space between medications
-                        if idx < len(tree_med.get_children()) - 1:
+                        if idx < len(prescriptions) - 1:
                             doc.add_paragraph()  # Add space
                 else:
                     doc.add_paragraph("No medications prescribed.")
@@ -723,23 +708,23 @@ def get_formatted_prescription(patient_name):
     formatted_text += "\n\n"
     
     # Check if there are medications
-    if tree_med.get_children():
+    prescriptions = prescription_model.items
+    if prescriptions:
         formatted_text += "Rx:\n\n"
         
         # Add each medication to the formatted text with proper formatting
-        for idx, item in enumerate(tree_med.get_children()):
-            values = tree_med.item(item)['values']
-            brand = values[0]
-            generic = values[1]
-            quantity = values[2]
-            admin = values[3]
+        for idx, rx in enumerate(prescriptions):
+            brand = rx.brand
+            generic = rx.generic
+            quantity = rx.quantity
+            admin = rx.administration
             
             # Format medication as requested
             formatted_text += f"{generic} {brand}\n"
             formatted_text += f"#{quantity} {admin}\n"
             
             # Add spacing between medications (removed separator line)
-            if idx < len(tree_med.get_children()) - 1:
+            if idx < len(prescriptions) - 1:
                 formatted_text += "\n\n"
     else:
         formatted_text += "No medications prescribed."
@@ -822,13 +807,13 @@ def print_document(print_type):
         if selected_type == "Prescription":
             doc.add_paragraph()  # Empty space
              
-            if tree_med.get_children():
-                for idx, item in enumerate(tree_med.get_children()):
-                    values = tree_med.item(item)['values']
-                    brand = values[0]
-                    generic = values[1]
-                    quantity = values[2]
-                    admin = values[3]
+            prescriptions = prescription_model.items
+            if prescriptions:
+                for idx, rx in enumerate(prescriptions):
+                    brand = rx.brand
+                    generic = rx.generic
+                    quantity = rx.quantity
+                    admin = rx.administration
                     
                     # Format medication similar to PDF structure
                     generic_para = doc.add_paragraph()
@@ -845,7 +830,7 @@ def print_document(print_type):
                     admin_para.add_run(f"{admin}")
                     
                     # Add space between medications
-                    if idx < len(tree_med.get_children()) - 1:
+                    if idx < len(prescriptions) - 1:
                         doc.add_paragraph()  # Add space
             else:
                 doc.add_paragraph("No medications prescribed.")
@@ -890,7 +875,7 @@ def open_lab_charts(new_files=None):
         return
     
     patient_name = entry_name.get()
-    patient_id = patient_dict.get(patient_name)  # Get patient_id from patient_dict
+    patient_id = lookup_patient_id(patient_name)
     if not patient_id:
         messagebox.showerror("Error", "Patient not found in database.")
         return
@@ -920,6 +905,8 @@ btn_print = create_sidebar_button("Print", open_print_dialog, PRIMARY_COLOR)  #
 btn_med_cert = create_sidebar_button("Medical Certificate", open_med_cert, PRIMARY_COLOR)
 btn_scan = create_sidebar_button("Scan/Import", open_scan_dialog, PRIMARY_COLOR)
 btn_lab = create_sidebar_button("Lab/Charts", open_lab_charts, PRIMARY_COLOR)
+btn_inventory = create_sidebar_button("Inventory", lambda: InventoryWindow(root), PRIMARY_COLOR)
+btn_recall = create_sidebar_button("Recall Search", lambda: RecallSearchWindow(root), PRIMARY_COLOR)
 
 # Exit button at the bottom of sidebar
 tk.Frame(sidebar, bg=SIDEBAR_COLOR, height=100).pack(fill=tk.X, expand=True)
@@ -1002,33 +989,20 @@ def load_checkup_details(event=None):
         return
         
     try:
-        for item in tree_med.get_children():
-            tree_med.delete(item)
-        
         db = DatabaseHelper()
-        patient_id = patient_dict[entry_name.get()]
-        
-        # Clear current medications in tree
-        for item in tree_med.get_children():
-            tree_med.delete(item)
-                
-        # Load prescriptions for this checkup date
-        prescriptions = db.get_prescriptions_for_checkup(patient_id, selected_date)
+        patient_id = lookup_patient_id(entry_name.get())
+        if patient_id is None:
+            return
         
-        # Insert prescriptions into treeview
-        for rx in prescriptions:
-            tree_med.insert("", "end", values=(
-                rx[0],  # brand
-                rx[1],  # generic
-                rx[2],  # quantity
-                rx[3]   # administration
-            ))
+        # Load prescriptions for this checkup date, replacing the current ones
+        prescription_model.replace(db.get_prescriptions_for_checkup(patient_id, selected_date))
             
         # Load remarks/findings
-        checkup = next((c for c in current_checkups if c[4] == selected_date), None)
+        checkup = next((c for c in current_checkups if c.last_checkup_date == selected_date), None)
         if checkup:
             text_remarks.delete("1.0", tk.END)
-            text_remarks.insert("1.0", checkup[1] or "")
+            text_remarks.insert("1.0", checkup.findings or "")
+            icd_lookup.set_codes(db.get_checkup_codes(checkup.id))
             
     except Exception as e:
         messagebox.showerror("Error", f"Failed to load checkup details: {str(e)}")
@@ -1069,6 +1043,7 @@ tree_queue.column("No", width=30)
 tree_queue.column("Name", width=150)
 tree_queue.column("Time", width=80)
 tree_queue.pack(padx=5, pady=5)
+queue_view = TreeviewSync(tree_queue)  # Queue rows use the queue id as item id
 
 # Add scrollbar to queue
 scrollbar = ttk.Scrollbar(frame_queue, orient="vertical", command=tree_queue.yview)
@@ -1100,8 +1075,8 @@ def add_to_queue():
             queue_id = db.add_to_queue((queue_counter, name, current_time))
             
             if queue_id:
-                # Add to treeview with the queue_id as a tag
-                tree_queue.insert("", "end", values=(queue_counter, name, current_time), tags=(str(queue_id),))
+                # Add to treeview with the queue_id as item id and tag
+                queue_view.append(queue_id, (queue_counter, name, current_time), tags=(str(queue_id),))
                 
                 # Refresh patient list after adding to queue
                 refresh_patient_list(name)
@@ -1118,7 +1093,7 @@ def add_to_queue():
                 queue_id = db.add_to_queue((queue_counter, name, current_time))
                 
                 if queue_id:
-                    tree_queue.insert("", "end", values=(queue_counter, name, current_time), tags=(str(queue_id),))
+                    queue_view.append(queue_id, (queue_counter, name, current_time), tags=(str(queue_id),))
                     refresh_patient_list(name)
                 else:
                     messagebox.showerror("Database Error", "Failed to add patient to queue after multiple attempts.")
@@ -1140,7 +1115,7 @@ def remove_from_queue():
         try:
             db = DatabaseHelper()
             if db.remove_from_queue(queue_id):
-                tree_queue.delete(selected_item)
+                queue_view.remove(*selected_item)
             else:
                 messagebox.showerror("Database Error", "Failed to remove patient from queue.")
         except Exception as e:
@@ -1166,6 +1141,107 @@ remarks_scrollbar = ttk.Scrollbar(frame_remarks, orient="vertical", command=text
 text_remarks.configure(yscrollcommand=remarks_scrollbar.set)
 remarks_scrollbar.place(relx=0.97, relheight=0.9)
 
+# Tools under the diagnosis box
+remarks_tools = tk.Frame(frame_remarks, bg=SECONDARY_COLOR)
+remarks_tools.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=(0, 5), before=text_remarks)
+
+def show_history_suggestions():
+    """Show past visits with similar findings and the drugs prescribed in them"""
+    menu = tk.Menu(root, tearoff=0)
+    findings = text_remarks.get("1.0", tk.END)
+    if findings_index is None:
+        menu.add_command(label="Visit history is still loading...", state=tk.DISABLED)
+    elif not findings.strip():
+        menu.add_command(label="Type the findings first", state=tk.DISABLED)
+    else:
+        # Leave out the visit being edited
+        patient_id = lookup_patient_id(entry_name.get())
+        visit_date = checkup_history_var.get()
+        if visit_date == "No previous checkups" or not visit_date:
+            visit_date = datetime.now().strftime('%Y-%m-%d')
+        current = (patient_id, visit_date[:10])
+        
+        for rx, score in findings_index.suggest_drugs(findings, exclude=current):
+            menu.add_command(label=f"{rx.brand} ({rx.generic})",
+                             command=lambda rx=rx: apply_order_set([rx]))
+        similar = findings_index.similar(findings, exclude=current)
+        if similar:
+            menu.add_separator()
+        for score, visit in similar:
+            visit_menu = tk.Menu(menu, tearoff=0)
+            for rx in visit.prescriptions:
+                visit_menu.add_command(label=f"{rx.brand} ({rx.generic})",
+                                       command=lambda rx=rx: apply_order_set([rx]))
+            if visit.prescriptions:
+                visit_menu.add_separator()
+                visit_menu.add_command(label="Add all",
+                                       command=lambda rows=visit.prescriptions: apply_order_set(rows))
+            summary = " ".join(visit.findings.split())[:40]
+            menu.add_cascade(label=f"{visit.visit_date}: {summary}", menu=visit_menu)
+        if not similar:
+            menu.add_command(label="No similar visits found", state=tk.DISABLED)
+    menu.tk_popup(btn_history.winfo_rootx(), btn_history.winfo_rooty() + btn_history.winfo_height())
+
+btn_history = tk.Button(remarks_tools, text="Suggest from History", 
+                        bg=PRIMARY_COLOR, fg=BUTTON_TEXT_COLOR, 
+                        padx=5, pady=1, command=show_history_suggestions)
+btn_history.pack(side=tk.LEFT)
+
+# Coded diagnoses for the checkup, stored with it on save
+icd_lookup = Icd10Lookup(frame_remarks, bg=SECONDARY_COLOR)
+icd_lookup.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=(0, 2), before=text_remarks)
+
+# Inline phrase completion: the likely continuation is shown here, Tab accepts it
+phrase_hint_label = tk.Label(remarks_tools, text="", bg=SECONDARY_COLOR, fg="#7f8c8d",
+                             font=("Arial", 9, "italic"), anchor="w")
+phrase_hint_label.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+phrase_index = None
+phrase_index_loading = False
+phrase_suggestion = ""
+
+def load_phrase_index(event=None):
+    """Load the phrase index the first time the diagnosis box is used"""
+    global phrase_index_loading
+    if phrase_index is None and not phrase_index_loading:
+        phrase_index_loading = True
+        run_in_background(root, lambda: PhraseIndex.load(history=DatabaseHelper().get_visit_history),
+                          on_done=finish_phrase_index, on_error=fail_phrase_index)
+
+def finish_phrase_index(index):
+    global phrase_index
+    phrase_index = index
+    update_phrase_hint()
+
+def fail_phrase_index(error):
+    global phrase_index_loading
+    print(f"Error loading phrase index: {error}")
+    phrase_index_loading = False
+
+def update_phrase_hint(event=None):
+    global phrase_suggestion
+    phrase_suggestion = ""
+    # Only complete at the end of a line
+    if phrase_index is not None and not text_remarks.get("insert", "insert lineend").strip():
+        phrase_suggestion = phrase_index.complete(text_remarks.get("insert linestart", "insert"))
+    phrase_hint_label.config(text=f"Tab: ...{phrase_suggestion}" if phrase_suggestion else "")
+
+def accept_phrase(event=None):
+    if not phrase_suggestion:
+        return None  # Normal Tab
+    text_remarks.insert("insert", phrase_suggestion)
+    update_phrase_hint()
+    return "break"
+
+def dismiss_phrase(event=None):
+    global phrase_suggestion
+    phrase_suggestion = ""
+    phrase_hint_label.config(text="")
+
+text_remarks.bind("<FocusIn>", load_phrase_index)
+text_remarks.bind("<KeyRelease>", lambda e: None if e.keysym in ("Tab", "Escape") else update_phrase_hint())
+text_remarks.bind("<Tab>", accept_phrase)
+text_remarks.bind("<Escape>", dismiss_phrase)
+
 # ----------------- Prescription Section ----------------- #
 frame_med = tk.LabelFrame(content_frame, text="PRESCRIPTION/MEDICATION", bg=SECONDARY_COLOR, fg=TEXT_COLOR, font=("Arial", 12, "bold"))
 frame_med.place(x=505, y=340, width=485, height=280)
@@ -1187,19 +1263,33 @@ med_scrollbar = ttk.Scrollbar(frame_med, orient="vertical", command=tree_med.yvi
 tree_med.configure(yscroll=med_scrollbar.set)
 med_scrollbar.place(relx=0.97, relheight=0.7)
 
+# The prescription list itself; tree_med only displays it
+prescription_model = PrescriptionModel(tree_med)
+
 # Button frame for medication management
 med_button_frame = tk.Frame(frame_med, bg=SECONDARY_COLOR)
 med_button_frame.pack(padx=1, pady=1, fill=tk.X)
 
+# Interaction warnings for the current prescription
+interaction_label = tk.Label(frame_med, text="", bg=SECONDARY_COLOR, fg=WARNING_COLOR,
+                             font=("Arial", 9, "bold"), justify=tk.LEFT, anchor="w", wraplength=460)
+interaction_label.pack(padx=5, fill=tk.X, before=tree_med, side=tk.BOTTOM)
+
+def check_prescription_interactions():
+    """Show the interactions between the drugs on the prescription"""
+    interactions = interaction_checker.check_all(rx.generic for rx in prescription_model)
+    interaction_label.config(text=interaction_checker.off_notice() or describe_interactions(interactions))
+
+prescription_model.on_change = check_prescription_interactions
+
 
 
 
 def clear_prescriptions(show_confirmation=True):
     """Clear all medications from the prescription table"""
-    if tree_med.get_children():  # Check if there are any prescriptions
+    if len(prescription_model):  # Check if there are any prescriptions
         if not show_confirmation or messagebox.askyesno("Clear Prescriptions", "Are you sure you want to clear all prescriptions?"):
-            for item in tree_med.get_children():
-                tree_med.delete(item)
+            prescription_model.clear()
                 
 btn_clear_meds = tk.Button(med_button_frame, text="Clear All", 
                           bg=WARNING_COLOR, fg=BUTTON_TEXT_COLOR, 
@@ -1207,51 +1297,24 @@ btn_clear_meds = tk.Button(med_button_frame, text="Clear All",
 btn_clear_meds.pack(side=tk.LEFT, padx=5)                
 
 def open_medication_management():
-    # Get current medications from tree_med
-    current_medications = []
-    for item in tree_med.get_children():
-        values = tree_med.item(item)['values']
-        current_medications.append({
-            "id": None,  # Since we don't have ID in the prescription table
-            "brand": values[0],  # Brand name
-            "generic": values[1],  # Generic name
-            "quantity": values[2],  # Quantity
-            "administration": values[3],  # Administration
-            "tree_id": item
-        })
-
     # Define callback function to receive medications from the management window
     def update_medications(medications):
-        # Clear current medications in the tree
-        for item in tree_med.get_children():
-            tree_med.delete(item)
-        
-        # Add new medications
-        for med in medications:
-            tree_med.insert("", "end", values=(
-                med["brand"],
-                med["generic"],
-                med["quantity"],
-                med["administration"]
-            ))
+        prescription_model.replace(
+            (med["brand"], med["generic"], med["quantity"], med["administration"])
+            for med in medications
+        )
     
     # Open medication management window with current medications
-    med_window = MedicationManagementWindow(root, callback=update_medications)
-    
-    # After window is created, populate it with current medications
-    for med in current_medications:
-        med_window.tree.insert("", "end", values=(
-            med["id"],
-            med["brand"],
-            med["generic"],
-            med["quantity"],
-            med["administration"]
-        ))
+    med_window = MedicationManagementWindow(root, callback=update_medications,
+                                            diagnosis=text_remarks.get("1.0", tk.END),
+                                            order_sets=order_set_index)
+    med_window.add_medications(prescription_model.items)
 
 def remove_selected_medication():
     selected_item = tree_med.selection()
     if selected_item:
-        tree_med.delete(selected_item)
+        for tree_id in selected_item:
+            prescription_model.remove(tree_id)
     else:
         messagebox.showwarning("Selection Error", "Select a medication to remove!")
 
@@ -1266,6 +1329,32 @@ btn_remove_med = tk.Button(med_button_frame, text="Remove Selected",
                           padx=10, pady=5, command=remove_selected_medication)
 btn_remove_med.pack(side=tk.LEFT, padx=5)
 
+def show_order_set_menu():
+    """Offer the drug combinations usually prescribed for this diagnosis"""
+    menu = tk.Menu(root, tearoff=0)
+    if order_set_index is None:
+        menu.add_command(label="Order sets are still loading...", state=tk.DISABLED)
+    else:
+        suggestions = order_set_index.suggest(text_remarks.get("1.0", tk.END), prescription_model.items)
+        for rows, uses in suggestions:
+            menu.add_command(label=describe_order_set(rows, uses),
+                             command=lambda rows=rows: apply_order_set(rows))
+        if not suggestions:
+            menu.add_command(label="No order sets for this diagnosis yet", state=tk.DISABLED)
+    menu.tk_popup(btn_order_sets.winfo_rootx(), btn_order_sets.winfo_rooty() + btn_order_sets.winfo_height())
+
+def apply_order_set(rows):
+    """Add the medications of a set that are not on the prescription yet"""
+    present = {(rx.brand, rx.generic) for rx in prescription_model}
+    for rx in rows:
+        if (rx.brand, rx.generic) not in present:
+            prescription_model.add(*rx)
+
+btn_order_sets = tk.Button(med_button_frame, text="Order Sets", 
+                          bg=PRIMARY_COLOR, fg=BUTTON_TEXT_COLOR, 
+                          padx=10, pady=5, command=show_order_set_menu)
+btn_order_sets.pack(side=tk.LEFT, padx=5)
+
 # Let's update the add_to_queue function to calculate age from birthdate
 def calculate_age(birth_date_str):
     try:
@@ -1287,22 +1376,12 @@ def update_age(event=None):
     except:
         pass
 
-# Add this after the entry definitions
-def load_patient_names():
-    db = DatabaseHelper()
-    patients = db.get_patients()
-    patient_names = [patient[1] for patient in patients]
-    patient_names.sort()  # Sort alphabetically
-    entry_name['values'] = patient_names
-    return {name: id for id, name in patients}
-
-patient_dict = load_patient_names()
-
 def on_name_select(event=None):
     selected_name = entry_name.get()
-    if selected_name in patient_dict:
+    patient_id = lookup_patient_id(selected_name)
+    if patient_id is not None:
         db = DatabaseHelper()
-        patient = db.get_patient_details(patient_dict[selected_name])
+        patient = db.get_patient_details(patient_id)
         load_checkup_history(patient)
         if patient:
             # Clear existing fields
@@ -1311,17 +1390,17 @@ def on_name_select(event=None):
             entry_bp.delete(0, tk.END)
             
             # Fill in patient details from database
-            entry_address.insert(0, patient[2])  # address
+            entry_address.insert(0, patient.address)
             # Convert string date to datetime before setting
             try:
-                date_obj = datetime.strptime(patient[3], '%Y-%m-%d')
+                date_obj = datetime.strptime(patient.birthdate, '%Y-%m-%d')
                 selected_date.set(date_obj.strftime('%Y-%m-%d'))
             except:
                 selected_date.set(datetime.now().strftime('%Y-%m-%d'))
                 
-            entry_phone.insert(0, patient[9])  # phone
-            status_var.set(patient[5])  # civil_status 
-            gender_var.set(patient[8])  # gender
+            entry_phone.insert(0, patient.phone)
+            status_var.set(patient.civil_status)
+            gender_var.set(patient.gender)
             update_age()
             
             # Load most recent checkup info
@@ -1332,14 +1411,14 @@ def on_name_select(event=None):
                     SELECT blood_pressure FROM Checkups 
                     WHERE patient_id = ? 
                     ORDER BY dateOfVisit DESC LIMIT 1
-                """, (patient_dict[selected_name],))
+                """, (patient_id,))
                 latest_bp = cursor.fetchone()
                 if (latest_bp and latest_bp[0]):
                     entry_bp.insert(0, latest_bp[0])
                 conn.close()
                 
                 # Load checkup history for dropdown
-                load_checkup_history(patient_dict[selected_name])
+                load_checkup_history(patient_id)
             except Exception as e:
                 print(f"Error loading patient data: {e}")
 
@@ -1413,7 +1492,6 @@ def refresh_patient_list(keep_selection=None):
     Refresh the patient dropdown list with current data from the database.
     If keep_selection is provided, will maintain that patient as selected.
     """
-    global patient_dict
     # Store current selection if needed
     current_selection = None
     if keep_selection:
@@ -1421,16 +1499,14 @@ def refresh_patient_list(keep_selection=None):
     elif entry_name.get():
         current_selection = entry_name.get()
     
-    # Reload patient names from database
-    patient_dict = load_patient_names()
+    # Reload the matching patient names from database
+    db = DatabaseHelper()
+    apply_patient_matches(db.search_patients(current_selection or "", PATIENT_MATCH_LIMIT))
     
     # Restore the selection if needed
     if current_selection:
         entry_name.set(current_selection)
 
-# Call refresh_patient_list after the window is loaded
-root.after(100, refresh_patient_list)
-
 # Add these new functions to handle checkup history
 def load_checkup_history(patient_id):
     """Load the checkup history for a patient into the dropdown"""
@@ -1439,7 +1515,7 @@ def load_checkup_history(patient_id):
         checkups = db.get_patient_checkups(patient_id)
         
         # Format dates for dropdown
-        checkup_dates = [checkup[4] for checkup in checkups]  # Using last_checkup_date
+        checkup_dates = [checkup.last_checkup_date for checkup in checkups]
         
         # Update dropdown values
         if checkup_dates:
@@ -1463,12 +1539,12 @@ def show_checkup_notification(checkup):
     notification.configure(bg=SECONDARY_COLOR)
     
     # Get checkup details
-    checkup_id = checkup[0]
-    findings = checkup[1] or "No findings recorded"
-    lab_ids = checkup[2] or "No labs recorded"
-    checkup_date = checkup[3]
-    last_checkup_date = checkup[4]
-    blood_pressure = checkup[5] or "Not recorded"
+    checkup_id = checkup.id
+    findings = checkup.findings or "No findings recorded"
+    lab_ids = checkup.lab_ids or "No labs recorded"
+    checkup_date = checkup.date_of_visit
+    last_checkup_date = checkup.last_checkup_date
+    blood_pressure = checkup.blood_pressure or "Not recorded"
     
     # Create header frame
     header_frame = tk.Frame(notification, bg=PRIMARY_COLOR, padx=15, pady=10)
@@ -1483,8 +1559,8 @@ def show_checkup_notification(checkup):
     main_frame.pack(fill=tk.BOTH, expand=True)
     
     # Patient details section if available
-    if entry_name.get() in patient_dict:
-        patient_id = patient_dict[entry_name.get()]
+    patient_id = lookup_patient_id(entry_name.get())
+    if patient_id is not None:
         db = DatabaseHelper()
         patient = db.get_patient_details(patient_id)
         if patient:
@@ -1499,11 +1575,11 @@ def show_checkup_notification(checkup):
             # Row 1
             tk.Label(info_grid, text="Name:", bg=SECONDARY_COLOR, fg=TEXT_COLOR, 
                    font=("Arial", 10, "bold")).grid(row=0, column=0, sticky="w", padx=(0, 5), pady=2)
-            tk.Label(info_grid, text=patient[1], bg=SECONDARY_COLOR, fg=TEXT_COLOR).grid(row=0, column=1, sticky="w", padx=5, pady=2)
+            tk.Label(info_grid, text=patient.name, bg=SECONDARY_COLOR, fg=TEXT_COLOR).grid(row=0, column=1, sticky="w", padx=5, pady=2)
             
             tk.Label(info_grid, text="Gender:", bg=SECONDARY_COLOR, fg=TEXT_COLOR, 
                    font=("Arial", 10, "bold")).grid(row=0, column=2, sticky="w", padx=(20, 5), pady=2)
-            tk.Label(info_grid, text=patient[8], bg=SECONDARY_COLOR, fg=TEXT_COLOR).grid(row=0, column=3, sticky="w", padx=5, pady=2)
+            tk.Label(info_grid, text=patient.gender, bg=SECONDARY_COLOR, fg=TEXT_COLOR).grid(row=0, column=3, sticky="w", padx=5, pady=2)
             
             # Row 2
             tk.Label(info_grid, text="Age at checkup:", bg=SECONDARY_COLOR, fg=TEXT_COLOR, 
@@ -1511,7 +1587,7 @@ def show_checkup_notification(checkup):
             
             # Calculate age at time of checkup
             try:
-                birth_date = datetime.strptime(patient[3], '%Y-%m-%d').date()
+                birth_date = datetime.strptime(patient.birthdate, '%Y-%m-%d').date()
                 checkup_datetime = datetime.strptime(checkup_date, '%Y-%m-%d').date()
                 age_at_checkup = checkup_datetime.year - birth_date.year - ((checkup_datetime.month, checkup_datetime.day) < (birth_date.month, birth_date.day))
                 tk.Label(info_grid, text=str(age_at_checkup), bg=SECONDARY_COLOR, fg=TEXT_COLOR).grid(row=1, column=1, sticky="w", padx=5, pady=2)
@@ -1520,7 +1596,7 @@ def show_checkup_notification(checkup):
             
             tk.Label(info_grid, text="Status:", bg=SECONDARY_COLOR, fg=TEXT_COLOR, 
                    font=("Arial", 10, "bold")).grid(row=1, column=2, sticky="w", padx=(20, 5), pady=2)
-            tk.Label(info_grid, text=patient[5] or "Not recorded", bg=SECONDARY_COLOR, fg=TEXT_COLOR).grid(row=1, column=3, sticky="w", padx=5, pady=2)
+            tk.Label(info_grid, text=patient.civil_status or "Not recorded", bg=SECONDARY_COLOR, fg=TEXT_COLOR).grid(row=1, column=3, sticky="w", padx=5, pady=2)
     
     # Vital signs section
     vitals_frame = tk.LabelFrame(main_frame, text="Vital Signs", 
@@ -1669,18 +1745,127 @@ def show_checkup_notification(checkup):
 # Add a global variable to store current checkups data
 current_checkups = []
 
-# Initialize queue from database
-try:
-    # Initialize the database first
-    db = DatabaseHelper()
-    db.create_tables()
-    
-    # Load today's queue
-    load_today_queue()
-    
+# ----------------- Staged Startup ----------------- #
+# Only the widgets are built before the mainloop starts. The queue, the first
+# patient names and queue maintenance are loaded on worker threads once the first
+# frame is on screen, so the time to the first window does not grow with the database.
+startup_times = {}
+
+queue_loading_label = tk.Label(frame_queue, text="Loading today's queue...",
+                               bg="white", fg=TEXT_COLOR, font=("Arial", 9, "italic"))
+queue_loading_label.place(relx=0.5, rely=0.4, anchor="center")
+entry_name['values'] = ["Loading patients..."]
+
+def elapsed_ms():
+    return (time.perf_counter() - STARTUP_STARTED) * 1000
+
+def on_root_mapped(event):
+    """Start loading data once the main window has been mapped"""
+    if event.widget is root:
+        root.unbind("<Map>", startup_map_binding)
+        # Idle callbacks run after the pending redraws, i.e. after the first paint
+        root.after_idle(begin_staged_startup)
+
+def begin_staged_startup():
+    startup_times["first_paint"] = elapsed_ms()
+    
+    def fetch_queue():
+        db = DatabaseHelper()  # Also makes sure the Queue table exists
+        return db.get_todays_queue()
+    
+    run_in_background(root, fetch_queue, on_done=finish_queue_stage, on_error=fail_queue_stage)
+
+def finish_queue_stage(queue_entries):
+    queue_loading_label.destroy()
+    populate_queue(queue_entries)
+    startup_times["queue"] = elapsed_ms()
+    run_in_background(root, lambda: DatabaseHelper().search_patients("", PATIENT_MATCH_LIMIT),
+                      on_done=finish_roster_stage, on_error=fail_roster_stage)
+
+def fail_queue_stage(error):
+    print(f"Error initializing queue: {error}")
+    queue_loading_label.config(text="Could not load today's queue", fg=WARNING_COLOR)
+    run_in_background(root, lambda: DatabaseHelper().search_patients("", PATIENT_MATCH_LIMIT),
+                      on_done=finish_roster_stage, on_error=fail_roster_stage)
+
+def finish_roster_stage(patients):
+    if entry_name.get():
+        # Something was typed while loading; match that instead of the first names
+        check_name_match()
+    else:
+        apply_patient_matches(patients)
+    startup_times["interactive"] = elapsed_ms()
+    report_startup_times()
+    start_follow_on_stages()
+
+def fail_roster_stage(error):
+    print(f"Error loading patient names: {error}")
+    entry_name['values'] = []
+    startup_times["interactive"] = elapsed_ms()
+    report_startup_times()
+    # The rest of startup does not depend on the roster
+    start_follow_on_stages()
+
+def start_follow_on_stages():
+    """Work that can wait until the window is interactive"""
+    # The interaction data is only needed once drugs are added
+    run_in_background(root, interaction_checker.load, on_done=lambda count: check_prescription_interactions())
     # Clean up old queue entries (older than 7 days)
-    db.clear_old_queue(7)
-except Exception as e:
-    print(f"Error initializing queue: {e}")
-    
+    run_in_background(root, lambda: DatabaseHelper().clear_old_queue(7),
+                      on_done=finish_maintenance_stage, on_error=finish_maintenance_stage)
+
+def finish_maintenance_stage(result=None):
+    startup_times["maintenance"] = elapsed_ms()
+    print(f"Startup: queue maintenance finished at {startup_times['maintenance']:.0f} ms")
+    run_in_background(root, build_history_indexes, on_done=finish_history_stage)
+    # Check the image store against the database; only reports, nothing is deleted
+    run_in_background(root, maintain_image_store,
+                      on_done=lambda report: print(describe_report(report)))
+
+# ----------------- History Indexes ----------------- #
+# Suggestions mined from past visits are served from in-memory indexes. They are
+# built once in the background; every save afterwards updates them in place.
+order_set_index = None
+findings_index = None
+pending_visits = []  # Visits saved while the indexes were still being built
+
+def build_history_indexes():
+    """Worker thread: read the visit history and build the indexes from it"""
+    visits = DatabaseHelper().get_visit_history()
+    return OrderSetIndex.build(visits), FindingsIndex.build(visits)
+
+def finish_history_stage(indexes):
+    global order_set_index, findings_index
+    order_set_index, findings_index = indexes
+    for visit in pending_visits:
+        for index in indexes:
+            index.update_visit(visit)
+    pending_visits.clear()
+    startup_times["history"] = elapsed_ms()
+    print(f"Startup: history indexes ready at {startup_times['history']:.0f} ms")
+
+def record_saved_visit(patient_id, visit_date):
+    """Feed the visit that was just saved into the history indexes"""
+    visit = Visit(patient_id, str(visit_date)[:10], text_remarks.get("1.0", tk.END).strip(),
+                  prescription_model.items)
+    if order_set_index is None:
+        pending_visits.append(visit)
+    else:
+        for index in (order_set_index, findings_index):
+            index.update_visit(visit)
+    if phrase_index is None:
+        PhraseIndex.journal_visit(visit)  # Picked up when the index is loaded
+    else:
+        phrase_index.update_visit(visit)
+
+def report_startup_times():
+    """Print the startup milestones and show time-to-interactive in the sidebar"""
+    print(f"Startup: first window painted at {startup_times['first_paint']:.0f} ms, "
+          f"queue loaded at {startup_times.get('queue', 0):.0f} ms, "
+          f"interactive at {startup_times['interactive']:.0f} ms")
+    tk.Label(sidebar, text=f"Ready in {startup_times['interactive'] / 1000:.2f} s",
+             bg=SIDEBAR_COLOR, fg="#95a5a6", font=("Arial", 8)).pack(side=tk.BOTTOM, pady=(0, 5))
+
+startup_map_binding = root.bind("<Map>", on_root_mapped)
+
 root.mainloop()
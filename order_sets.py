@@ -0,0 +1,100 @@
+# order_sets.py
+import re
+from collections import Counter
+
+
+def diagnosis_key(findings):
+    """Normalize findings text so the same diagnosis written slightly differently matches"""
+    return " ".join(re.findall(r"[a-z0-9]+", (findings or "").lower()))
+
+
+def describe_order_set(rows, uses):
+    """Menu label for a suggested set, e.g. 'Biogesic + Neozep (12x)'"""
+    return " + ".join(rx.brand or rx.generic for rx in rows) + f" ({uses}x)"
+
+
+class OrderSetIndex:
+    """Drug combinations that were prescribed together, mined from past visits.
+
+    Each visit contributes its set of drugs (brand + generic) once, counted under
+    the visit's diagnosis and under every drug in it. The best TOP_K sets for
+    each diagnosis and each drug are kept precomputed, so a suggestion is a
+    dictionary lookup. Saving a visit only recounts the keys that visit touches.
+    """
+
+    TOP_K = 5
+
+    def __init__(self):
+        self._visits = {}        # (patient_id, visit_date) -> (diagnosis, set key)
+        self._by_diagnosis = {}  # diagnosis -> Counter(set key)
+        self._by_drug = {}       # (brand, generic) -> Counter(set key)
+        self._set_rows = {}      # set key -> Prescription records, as last prescribed
+        self._top_by_diagnosis = {}
+        self._top_by_drug = {}
+
+    @classmethod
+    def build(cls, visits):
+        """Build the index from the whole visit history"""
+        index = cls()
+        for visit in visits:
+            index.update_visit(visit)
+        return index
+
+    def update_visit(self, visit):
+        """Add a saved visit, replacing what an earlier save of it contributed"""
+        visit_key = (visit.patient_id, visit.visit_date)
+        previous = self._visits.pop(visit_key, None)
+        if previous:
+            self._count(*previous, -1)
+
+        rows = {}
+        for rx in visit.prescriptions:
+            if rx.brand or rx.generic:
+                rows.setdefault((rx.brand, rx.generic), rx)
+        if not rows:
+            return
+        set_key = tuple(sorted(rows))
+        self._set_rows[set_key] = tuple(rows[drug] for drug in set_key)
+
+        diagnosis = diagnosis_key(visit.findings)
+        self._visits[visit_key] = (diagnosis, set_key)
+        self._count(diagnosis, set_key, 1)
+
+    def for_diagnosis(self, findings):
+        """Return [(prescriptions, times used)] for this diagnosis, most used first"""
+        return self._top_by_diagnosis.get(diagnosis_key(findings), [])
+
+    def with_drug(self, brand, generic):
+        """Return [(prescriptions, times used)] for combinations including this drug"""
+        return self._top_by_drug.get((brand, generic), [])
+
+    def suggest(self, findings, prescriptions=()):
+        """Sets for the diagnosis first, then sets built around the drugs already chosen"""
+        suggestions = []
+        seen = set()
+        candidates = list(self.for_diagnosis(findings))
+        for rx in prescriptions:
+            candidates.extend(self.with_drug(rx.brand, rx.generic))
+        for rows, uses in candidates:
+            if rows not in seen:
+                seen.add(rows)
+                suggestions.append((rows, uses))
+        return suggestions[:self.TOP_K]
+
+    def _count(self, diagnosis, set_key, delta):
+        if diagnosis:
+            self._bump(self._by_diagnosis, self._top_by_diagnosis, diagnosis, set_key, delta)
+        if len(set_key) > 1:
+            for drug in set_key:
+                self._bump(self._by_drug, self._top_by_drug, drug, set_key, delta)
+
+    def _bump(self, counts, top, key, set_key, delta):
+        counter = counts.setdefault(key, Counter())
+        counter[set_key] += delta
+        if counter[set_key] <= 0:
+            del counter[set_key]
+        if counter:
+            top[key] = [(self._set_rows[found], uses) for found, uses in counter.most_common(self.TOP_K)]
+        else:
+            del counts[key]
+            top.pop(key, None)
@@ -0,0 +1,78 @@
+# perceptual_hash.py
+from PIL import Image
+
+# Hashes this many bits apart (out of 64) are treated as the same picture
+DUPLICATE_DISTANCE = 6
+
+
+def dhash(path, hash_size=8):
+    """64-bit difference hash: which of each pair of neighbouring pixels is brighter.
+
+    The image is shrunk to (hash_size + 1) x hash_size greys first, so a
+    re-photographed or re-compressed sheet gets the same or a nearby hash.
+    Pass a small rendition (the thumbnail) rather than the full scan.
+    """
+    with Image.open(path) as image:
+        image.draft("L", (hash_size * 4, hash_size * 4))
+        small = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def to_hex(value):
+    return f"{value:016x}"
+
+
+class BKTree:
+    """Hashes indexed by Hamming distance, for 'everything within d bits' queries.
+
+    Each child hangs off its parent by its distance to it, so by the triangle
+    inequality a search only descends into children whose edge is within
+    max_distance of the query's distance to the node - a small part of the
+    tree when max_distance is small.
+    """
+
+    def __init__(self):
+        self._root = None  # [hash, items, {distance: child}]
+        self.size = 0
+
+    def add(self, value, item):
+        self.size += 1
+        if self._root is None:
+            self._root = [value, [item], {}]
+            return
+        node = self._root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value, max_distance=DUPLICATE_DISTANCE):
+        """Return (distance, item) for every item within max_distance, nearest first"""
+        found = []
+        stack = [self._root] if self._root else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                found.extend((distance, item) for item in node[1])
+            for edge, child in node[2].items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        found.sort(key=lambda match: match[0])
+        return found
@@ -0,0 +1,195 @@
+# phrase_index.py
+import gzip
+import json
+import os
+import re
+from collections import Counter
+from autocomplete import AutocompleteIndex
+
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "phrase_index.json.gz")
+START = "<s>"  # Marks the start of a line, so opening phrases are suggested too
+
+
+def tokenize_line(line):
+    return re.findall(r"[a-z0-9][a-z0-9/+.'-]*", line.lower())
+
+
+class PhraseIndex:
+    """Word n-gram counts over past findings, for inline completion.
+
+    On disk the index is compact: a gzip JSON file with the vocabulary and each
+    visit's findings as word numbers, plus a small journal of visits saved since
+    it was written. The counts are rebuilt from those when the index is loaded.
+    Saving a visit appends one journal line and updates the counts in place; the
+    journal is folded into the main file the next time the index is loaded.
+    """
+
+    MIN_COUNT = 2  # A phrase must have been written at least this often to be suggested
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self.journal_path = path + ".log"
+        self._visits = {}  # "patient_id|date" -> words of the findings, one tuple per line
+        self._next = {}    # (word,) or (word, word) -> Counter(next word)
+        self.words = AutocompleteIndex()  # All words, ranked by how often they are used
+        self.words.usage = Counter()
+
+    @classmethod
+    def load(cls, path=INDEX_PATH, history=None):
+        """Read the index from disk; history() supplies the visits when there is no file yet"""
+        index = cls(path)
+        if os.path.exists(path):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+            vocabulary = data["words"]
+            for key, lines in data["visits"].items():
+                index._set_visit(key, tuple(tuple(vocabulary[i] for i in line) for line in lines))
+        elif history is not None:
+            for visit in history():
+                index._set_visit(cls.visit_key(visit), cls._lines(visit.findings))
+
+        # Fold in visits saved since the file was written. The journal is moved
+        # aside first, so saves made meanwhile start a new journal.
+        replay_path = index.journal_path + ".replay"
+        if os.path.exists(index.journal_path):
+            os.replace(index.journal_path, replay_path)
+        if os.path.exists(replay_path) or not os.path.exists(path):
+            if os.path.exists(replay_path):
+                with open(replay_path, encoding="utf-8") as f:
+                    for line in f:
+                        key, findings = json.loads(line)
+                        if findings is None:
+                            index._remove_patient(key)
+                        else:
+                            index._set_visit(key, cls._lines(findings))
+            index.write()
+            if os.path.exists(replay_path):
+                os.remove(replay_path)
+        return index
+
+    @staticmethod
+    def visit_key(visit):
+        return f"{visit.patient_id}|{visit.visit_date}"
+
+    @classmethod
+    def journal_visit(cls, visit, path=INDEX_PATH):
+        """Record a saved visit on disk without loading the index"""
+        with open(path + ".log", "a", encoding="utf-8") as f:
+            f.write(json.dumps([cls.visit_key(visit), visit.findings]) + "\n")
+
+    @classmethod
+    def journal_patient_removal(cls, patient_id, path=INDEX_PATH):
+        """Record a deleted patient on disk without loading the index"""
+        with open(path + ".log", "a", encoding="utf-8") as f:
+            f.write(json.dumps([str(patient_id), None]) + "\n")
+
+    def update_visit(self, visit):
+        """Count a saved visit's findings, replacing an earlier save of it"""
+        self.journal_visit(visit, self.path)
+        self._set_visit(self.visit_key(visit), self._lines(visit.findings))
+
+    def remove_patient(self, patient_id):
+        """Stop counting every visit of a deleted patient"""
+        self.journal_patient_removal(patient_id, self.path)
+        self._remove_patient(str(patient_id))
+
+    def write(self):
+        """Write the compact form of the index (vocabulary + word numbers per visit)"""
+        numbers = {}
+        visits = {key: [[numbers.setdefault(word, len(numbers)) for word in line] for line in lines]
+                  for key, lines in self._visits.items()}
+        temp_path = self.path + ".tmp"
+        with gzip.open(temp_path, "wt", encoding="utf-8") as f:
+            json.dump({"words": list(numbers), "visits": visits}, f, separators=(",", ":"))
+        os.replace(temp_path, self.path)
+
+    def complete(self, line, max_words=4):
+        """Return the text that most likely follows line (the text before the cursor)"""
+        words = [START] + tokenize_line(line)
+        partial = ""
+        if line and not line[-1].isspace() and len(words) > 1:
+            partial = words.pop()
+
+        # The word being typed (or the next one)
+        candidates = self._continuations(words)
+        if partial:
+            matches = [word for word in candidates if word.startswith(partial) and word != partial]
+            if not matches:
+                matches = [word for word in self.words.complete(partial, limit=1) if word != partial]
+            if not matches:
+                return ""
+            suggestion = [matches[0]]
+        else:
+            suggestion = []
+
+        # Following words, only while one continuation clearly dominates
+        while len(suggestion) < max_words:
+            counts = self._next_counts(words + suggestion)
+            if not counts:
+                break
+            word, count = counts.most_common(1)[0]
+            if count < self.MIN_COUNT or count * 2 < sum(counts.values()):
+                break
+            suggestion.append(word)
+
+        if not suggestion:
+            return ""
+        text = " ".join(suggestion)[len(partial):]
+        if not partial and line and not line[-1].isspace():
+            text = " " + text
+        # Match the doctor's habit of writing findings in capitals
+        if any(c.isalpha() for c in line) and line == line.upper():
+            text = text.upper()
+        return text
+
+    def _continuations(self, words):
+        counts = self._next_counts(words)
+        return [word for word, _ in counts.most_common()] if counts else []
+
+    def _next_counts(self, words):
+        """Counts of the words after the last two words, backing off to the last one"""
+        for size in (2, 1):
+            if len(words) >= size:
+                counts = self._next.get(tuple(words[-size:]))
+                if counts:
+                    return counts
+        return None
+
+    def _remove_patient(self, patient_id):
+        prefix = f"{patient_id}|"
+        for key in [key for key in self._visits if key.startswith(prefix)]:
+            self._set_visit(key, ())
+
+    def _set_visit(self, key, lines):
+        old = self._visits.pop(key, None)
+        if old:
+            self._count(old, -1)
+        if lines:
+            self._visits[key] = lines
+            self._count(lines, 1)
+
+    def _count(self, lines, delta):
+        for line in lines:
+            words = (START,) + line
+            for i in range(1, len(words)):
+                word = words[i]
+                for size in (1, 2):
+                    if i - size < 0:
+                        continue
+                    context = words[i - size:i]
+                    counts = self._next.setdefault(context, Counter())
+                    counts[word] += delta
+                    if counts[word] <= 0:
+                        del counts[word]
+                        if not counts:
+                            del self._next[context]
+                self.words.usage[word] += delta
+                if self.words.usage[word] > 0:
+                    self.words.add(word)
+                else:
+                    del self.words.usage[word]
+                    self.words.remove(word)
+
+    @staticmethod
+    def _lines(findings):
+        return tuple(words for words in (tuple(tokenize_line(line)) for line in (findings or "").splitlines()) if words)
@@ -0,0 +1,84 @@
+# prescription_model.py
+from records import Prescription
+from treeview_sync import TreeviewSync
+
+
+class PrescriptionModel:
+    """The prescriptions of the visit being edited.
+
+    This list is the source of truth; the Treeview it is bound to is only a view
+    that receives each change as it happens. Saving and printing read the model
+    directly instead of going back to Tk for every cell.
+    """
+
+    def __init__(self, tree=None, on_change=None):
+        self.view = TreeviewSync(tree) if tree is not None else None
+        self.on_change = on_change  # Called after every change to the list
+        self._items = []     # Prescription records in display order
+        self._tree_ids = []  # Treeview item id of each record, same order
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    @property
+    def items(self):
+        return tuple(self._items)
+
+    def add(self, brand, generic, quantity, administration):
+        """Append one medication and show it in the tree"""
+        item = Prescription(brand, generic, quantity, administration)
+        tree_id = self._new_tree_id()
+        self._items.append(item)
+        self._tree_ids.append(tree_id)
+        if self.view is not None:
+            self.view.append(tree_id, item)
+        self._changed()
+        return item
+
+    def remove(self, tree_id):
+        """Remove the medication shown by the given tree item"""
+        if tree_id not in self._tree_ids:
+            return None
+        index = self._tree_ids.index(tree_id)
+        del self._tree_ids[index]
+        item = self._items.pop(index)
+        if self.view is not None:
+            self.view.remove(tree_id)
+        self._changed()
+        return item
+
+    def replace(self, items):
+        """Replace the whole list, e.g. when loading a previous checkup.
+
+        Rows that appear in both lists keep their tree item, so the tree only
+        receives the rows that actually changed.
+        """
+        reusable = {}
+        for tree_id, item in zip(self._tree_ids, self._items):
+            reusable.setdefault(item, []).append(tree_id)
+
+        self._items = [Prescription(*item) for item in items]
+        self._tree_ids = [reusable[item].pop(0) if reusable.get(item) else self._new_tree_id()
+                          for item in self._items]
+        if self.view is not None:
+            self.view.sync(list(zip(self._tree_ids, self._items)))
+        self._changed()
+
+    def clear(self):
+        self._items = []
+        self._tree_ids = []
+        if self.view is not None:
+            self.view.clear()
+        self._changed()
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
+
+    def _new_tree_id(self):
+        self._next_id += 1
+        return f"rx{self._next_id}"
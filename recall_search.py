@@ -0,0 +1,119 @@
+# recall_search.py
+import csv
+import tkinter as tk
+from datetime import datetime, timedelta
+from tkinter import ttk, messagebox, filedialog
+from db_helper import DatabaseHelper
+from medicine_catalog import get_catalog
+from virtual_list import VirtualList
+
+
+class RecallSearchWindow(tk.Toplevel):
+    """Find every patient who received a brand or generic between two dates.
+
+    Prescriptions are matched by medicine id through the (medicine_id,
+    visit_day) index, so renamed or corrected catalog entries are still found.
+    Prescriptions that name the medicine but could not be linked to it are
+    counted in the summary, so an incomplete result is visible. Results are
+    paged into a VirtualList and exported to CSV in chunks.
+    """
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("Drug Recall Search")
+        self.geometry("950x600")
+        self.configure(bg="#e6f7ff")
+        self.db = DatabaseHelper()
+        self.catalog = get_catalog()
+        self.medicine_ids = []
+        self.start_day = self.end_day = ""
+
+        # Search criteria
+        criteria = tk.Frame(self, bg="#e6f7ff")
+        criteria.pack(side="top", fill="x", padx=10, pady=5)
+        self.kind_var = tk.StringVar(value="brand")
+        tk.Radiobutton(criteria, text="Brand", variable=self.kind_var, value="brand", bg="#e6f7ff",
+                       command=self.update_suggestions).pack(side="left")
+        tk.Radiobutton(criteria, text="Generic", variable=self.kind_var, value="generic", bg="#e6f7ff",
+                       command=self.update_suggestions).pack(side="left")
+        self.name_var = tk.StringVar()
+        self.name_box = ttk.Combobox(criteria, textvariable=self.name_var, width=35)
+        self.name_box.pack(side="left", padx=5)
+        self.name_box.bind("<KeyRelease>", self.update_suggestions)
+
+        today = datetime.now().date()
+        tk.Label(criteria, text="From:", bg="#e6f7ff").pack(side="left", padx=(10, 0))
+        self.start_var = tk.StringVar(value=(today - timedelta(days=365)).strftime('%Y-%m-%d'))
+        ttk.Entry(criteria, textvariable=self.start_var, width=11).pack(side="left", padx=5)
+        tk.Label(criteria, text="To:", bg="#e6f7ff").pack(side="left")
+        self.end_var = tk.StringVar(value=today.strftime('%Y-%m-%d'))
+        ttk.Entry(criteria, textvariable=self.end_var, width=11).pack(side="left", padx=5)
+
+        tk.Button(criteria, text="Search", bg="#3498db", fg="white", padx=10,
+                  command=self.search).pack(side="left", padx=5)
+        tk.Button(criteria, text="Export CSV", bg="#2ecc71", fg="white", padx=10,
+                  command=self.export_csv).pack(side="left", padx=5)
+
+        self.summary_label = tk.Label(self, text="Choose a medicine and a date range", bg="#e6f7ff", anchor="w")
+        self.summary_label.pack(side="top", fill="x", padx=10)
+
+        self.results = VirtualList(
+            self,
+            columns=("ID", "Date", "Patient", "Phone", "Brand", "Generic", "Quantity"),
+            headings=("ID", "Visit Date", "Patient", "Phone", "Brand", "Generic", "Quantity"),
+            fetch_page=lambda offset, limit: self.db.get_recall_page(
+                self.medicine_ids, self.start_day, self.end_day, offset, limit),
+            count_rows=lambda: self.db.count_recall_hits(self.medicine_ids, self.start_day, self.end_day),
+        )
+        self.results.pack(side="top", fill="both", expand=True, padx=10, pady=5)
+        self.results.tree.column("ID", width=50)
+
+        self.update_suggestions()
+        self.name_box.focus_set()
+
+    def update_suggestions(self, event=None):
+        index = self.catalog.brand_index if self.kind_var.get() == "brand" else self.catalog.generic_index
+        self.name_box['values'] = index.complete(self.name_var.get())
+
+    def search(self):
+        name = self.name_var.get().strip()
+        kind = self.kind_var.get()
+        if not name:
+            messagebox.showwarning("Recall Search", "Please enter a brand or generic name.", parent=self)
+            return
+        medicines = [medicine for medicine in self.catalog.by_id.values()
+                     if (getattr(medicine, kind) or "").casefold() == name.casefold()]
+        try:
+            start = datetime.strptime(self.start_var.get().strip(), '%Y-%m-%d')
+            end = datetime.strptime(self.end_var.get().strip(), '%Y-%m-%d')
+        except ValueError:
+            messagebox.showwarning("Recall Search", "Dates must be written as YYYY-MM-DD.", parent=self)
+            return
+
+        self.medicine_ids = [medicine.id for medicine in medicines]
+        self.start_day, self.end_day = start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+        self.results.refresh()
+        summary = f"{self.results.total} prescriptions of {name} between {self.start_day} and {self.end_day}"
+        if not medicines:
+            summary += f" ('{name}' is not in the medicine list)"
+        unlinked = self.db.count_unlinked_prescriptions(kind, name, self.start_day, self.end_day)
+        if unlinked:
+            summary += (f". {unlinked} more prescription(s) name {name} but are not linked to a "
+                        f"medicine in the list and are NOT shown; the result may be incomplete")
+        self.summary_label.config(text=summary, fg="#e74c3c" if unlinked else "black")
+
+    def export_csv(self):
+        if not self.results.total:
+            messagebox.showinfo("Recall Search", "There are no results to export.", parent=self)
+            return
+        path = filedialog.asksaveasfilename(parent=self, defaultextension=".csv",
+                                            filetypes=[("CSV files", "*.csv")],
+                                            initialfile=f"recall_{self.name_var.get().strip()}.csv")
+        if not path:
+            return
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Visit Date", "Patient", "Phone", "Brand", "Generic", "Quantity"])
+            for hit in self.db.iter_recall_hits(self.medicine_ids, self.start_day, self.end_day):
+                writer.writerow(hit[1:])
+        messagebox.showinfo("Recall Search", f"Exported {self.results.total} rows to {path}", parent=self)
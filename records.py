@@ -0,0 +1,98 @@
+# records.py
+# Typed rows returned by DatabaseHelper. NamedTuples keep the memory footprint of a
+# plain tuple (no per-instance __dict__) and still unpack and index like one.
+from typing import NamedTuple
+
+
+class Patient(NamedTuple):
+    id: int
+    name: str
+    address: str
+    birthdate: str
+    cell: str
+    civil_status: str
+    occupation: str
+    referred: str
+    gender: str
+    phone: str
+
+
+class PatientName(NamedTuple):
+    id: int
+    name: str
+
+
+class Checkup(NamedTuple):
+    id: int
+    findings: str
+    lab_ids: str
+    date_of_visit: str
+    last_checkup_date: str
+    blood_pressure: str
+
+
+class Prescription(NamedTuple):
+    brand: str
+    generic: str
+    quantity: str
+    administration: str
+
+
+class Medicine(NamedTuple):
+    id: int
+    brand: str
+    generic: str
+    quantity: str
+    administration: str
+
+
+class Visit(NamedTuple):
+    patient_id: int
+    visit_date: str       # YYYY-MM-DD
+    findings: str
+    prescriptions: tuple  # Prescription records
+
+
+class Icd10Code(NamedTuple):
+    code: str
+    description: str
+
+
+class StockLevel(NamedTuple):
+    medicine_id: int
+    brand: str
+    generic: str
+    on_hand: int
+    reorder_level: int
+
+
+class StockEntry(NamedTuple):
+    id: int
+    change: int
+    kind: str           # receipt, dispense, reversal or adjustment
+    reference: str      # e.g. visit:12:2025-01-31 for dispenses
+    note: str
+    created_at: str
+
+
+class RecallHit(NamedTuple):
+    prescription_id: int
+    visit_day: str
+    patient_name: str
+    phone: str
+    brand: str
+    generic: str
+    quantity: str
+
+
+class QueueEntry(NamedTuple):
+    id: int
+    queue_number: int
+    patient_name: str
+    queue_time: str
+
+
+def row_factory(record_type):
+    """Return a sqlite3 row factory that builds record_type instances"""
+    make = record_type._make
+    return lambda cursor, row: make(row)
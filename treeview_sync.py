@@ -0,0 +1,68 @@
+# treeview_sync.py
+class TreeviewSync:
+    """Applies a list of rows to a ttk.Treeview as a diff.
+
+    Each row is (iid, values) or (iid, values, tags). Rows whose iid is already
+    shown are kept (and only touched when their values changed), missing rows
+    are inserted at their position, reordered rows are moved and rows that are no
+    longer wanted are removed with a single delete call. Tk only redraws once the
+    event loop is idle, so one sync() is one redraw however many rows change.
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self._values = {}  # iid -> values last pushed to the tree
+
+    def sync(self, rows):
+        tree = self.tree
+        wanted = [str(row[0]) for row in rows]
+        wanted_set = set(wanted)
+        shown = tree.get_children("")
+
+        # Remove everything that is no longer wanted in one call
+        stale = [iid for iid in shown if iid not in wanted_set]
+        if stale:
+            tree.delete(*stale)
+            for iid in stale:
+                self._values.pop(iid, None)
+
+        # Move kept rows whose relative order changed
+        order = [iid for iid in shown if iid in wanted_set]
+        kept = set(order)
+        for index, iid in enumerate(iid for iid in wanted if iid in kept):
+            if order[index] != iid:
+                order.remove(iid)
+                order.insert(index, iid)
+                tree.move(iid, "", index)
+
+        # Insert new rows at their position and update the changed ones
+        for index, (iid, row) in enumerate(zip(wanted, rows)):
+            values = tuple(row[1])
+            tags = row[2] if len(row) > 2 else ()
+            if iid not in kept:
+                tree.insert("", index, iid=iid, values=values, tags=tags)
+                self._values[iid] = values
+            elif self._values.get(iid) != values:
+                tree.item(iid, values=values, tags=tags)
+                self._values[iid] = values
+
+    def append(self, iid, values, tags=()):
+        """Add a single row at the end"""
+        iid = str(iid)
+        values = tuple(values)
+        self.tree.insert("", "end", iid=iid, values=values, tags=tags)
+        self._values[iid] = values
+
+    def remove(self, *iids):
+        """Remove rows by iid with a single delete call"""
+        iids = [str(iid) for iid in iids if self.tree.exists(iid)]
+        if iids:
+            self.tree.delete(*iids)
+        for iid in iids:
+            self._values.pop(iid, None)
+
+    def clear(self):
+        children = self.tree.get_children("")
+        if children:
+            self.tree.delete(*children)
+        self._values.clear()
@@ -0,0 +1,171 @@
+# virtual_list.py
+import tkinter as tk
+from tkinter import ttk
+from collections import OrderedDict
+from treeview_sync import TreeviewSync
+
+
+class VirtualList(tk.Frame):
+    """A Treeview that only materializes the rows currently on screen.
+
+    Rows come from fetch_page(offset, limit) and count_rows(), normally paged
+    database queries, so opening and scrolling cost the same for ten rows or a
+    hundred thousand. Recently used pages are kept in a small LRU cache.
+    """
+
+    PAGE_SIZE = 100
+    MAX_CACHED_PAGES = 20
+
+    def __init__(self, parent, columns, headings, fetch_page, count_rows, key=None, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.fetch_page = fetch_page
+        self.count_rows = count_rows
+        self.key = key or (lambda row: row[0])
+
+        self.total = 0
+        self.top = 0           # Index of the first visible row
+        self.visible_rows = 1
+        self.selected_key = None
+        self._pages = OrderedDict()
+        self._shown = {}       # item id -> row for the rows on screen
+
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", selectmode="browse")
+        for column, heading in zip(columns, headings):
+            self.tree.heading(column, text=heading)
+        self.tree_view = TreeviewSync(self.tree)
+
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll_by(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_by(3))
+        self.tree.bind("<Up>", lambda e: self.move_selection(-1))
+        self.tree.bind("<Down>", lambda e: self.move_selection(1))
+        self.tree.bind("<Prior>", lambda e: self.scroll_by(-self.visible_rows) or "break")
+        self.tree.bind("<Next>", lambda e: self.scroll_by(self.visible_rows) or "break")
+
+    def refresh(self):
+        """Drop cached pages (e.g. after the filter changed) and redraw from the top"""
+        self._pages.clear()
+        self.total = self.count_rows()
+        self.top = 0
+        self.render()
+
+    def reload(self):
+        """Re-read the rows after an edit, keeping the scroll position and selection"""
+        self._pages.clear()
+        self.total = self.count_rows()
+        self.render()
+
+    def render(self):
+        self.top = max(0, min(self.top, self.total - self.visible_rows))
+        rows = self.rows_between(self.top, min(self.total, self.top + self.visible_rows))
+        self._shown = {str(self.key(row)): row for row in rows}
+        self.tree_view.sync([(self.key(row), row) for row in rows])
+
+        # Keep the selection on the same row while it is on screen
+        selected = str(self.selected_key)
+        if selected in self._shown:
+            if self.tree.selection() != (selected,):
+                self.tree.selection_set(selected)
+        elif self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+
+        if self.total:
+            self.scrollbar.set(self.top / self.total, (self.top + len(rows)) / self.total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def rows_between(self, start, end):
+        rows = []
+        index = start
+        while index < end:
+            page_number, offset = divmod(index, self.PAGE_SIZE)
+            page = self.get_page(page_number)
+            if offset >= len(page):
+                break
+            chunk = page[offset:offset + end - index]
+            rows.extend(chunk)
+            index += len(chunk)
+        return rows
+
+    def get_page(self, page_number):
+        if page_number in self._pages:
+            self._pages.move_to_end(page_number)
+            return self._pages[page_number]
+        page = self.fetch_page(page_number * self.PAGE_SIZE, self.PAGE_SIZE)
+        self._pages[page_number] = page
+        if len(self._pages) > self.MAX_CACHED_PAGES:
+            self._pages.popitem(last=False)
+        return page
+
+    def selected_row(self):
+        """Return the selected row, or None"""
+        selection = self.tree.selection()
+        if selection:
+            return self._shown.get(selection[0])
+        return None
+
+    def scroll_by(self, rows):
+        self.top += rows
+        self.render()
+
+    def scroll_to(self, index):
+        self.top = index
+        self.render()
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * self.total))
+        elif action == "scroll":
+            step = self.visible_rows if unit == "pages" else 1
+            self.scroll_by(int(amount) * step)
+
+    def on_mousewheel(self, event):
+        # Windows reports multiples of 120, macOS small deltas
+        delta = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        self.scroll_by(-3 * delta)
+        return "break"
+
+    def on_resize(self, event):
+        header = self.row_height  # The heading row is about one row tall
+        visible_rows = max(1, (event.height - header) // self.row_height)
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self.render()
+
+    def on_select(self, event=None):
+        selection = self.tree.selection()
+        if selection and selection[0] in self._shown:
+            self.selected_key = selection[0]
+
+    def move_selection(self, step):
+        """Arrow keys: move the selection and scroll when it leaves the window"""
+        rows = self.rows_between(self.top, min(self.total, self.top + self.visible_rows))
+        keys = [str(self.key(row)) for row in rows]
+        if not keys:
+            return "break"
+        selected = str(self.selected_key)
+        if selected in keys:
+            index = self.top + keys.index(selected) + step
+        else:
+            index = self.top if step > 0 else self.top + len(keys) - 1
+        index = max(0, min(self.total - 1, index))
+
+        # Scroll just enough to keep the newly selected row on screen
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + self.visible_rows:
+            self.top = index - self.visible_rows + 1
+
+        row = self.rows_between(index, index + 1)
+        if row:
+            self.selected_key = str(self.key(row[0]))
+        self.render()
+        return "break"